@@ -0,0 +1,67 @@
+-- Radius / KNN search benchmark for geo_api db_utils.
+-- Compares the old transform-per-row ST_DWithin with the geography-index
+-- versions on 1M synthetic observations over Kenya.
+--
+--   psql "$DATABASE_URL" -f database/benchmarks/radius_search.sql
+--
+-- Everything lives in a scratch table that is dropped at the end.
+
+\timing on
+SET client_min_messages = warning;
+
+DROP TABLE IF EXISTS bench_yieldobservation;
+CREATE UNLOGGED TABLE bench_yieldobservation (
+    id SERIAL PRIMARY KEY,
+    yield_value FLOAT NOT NULL,
+    geom GEOMETRY(POINT, 4326)
+);
+
+-- 1M points in the Kenya bounding box (lon 33.9..41.9, lat -4.7..5.0)
+SELECT setseed(0.42);
+INSERT INTO bench_yieldobservation (yield_value, geom)
+SELECT random() * 8,
+       ST_SetSRID(ST_MakePoint(33.9 + random() * 8.0, -4.7 + random() * 9.7), 4326)
+FROM generate_series(1, 1000000);
+
+CREATE INDEX bench_yo_geom_idx ON bench_yieldobservation USING GIST (geom);
+CREATE INDEX bench_yo_geog_idx ON bench_yieldobservation USING GIST (geography(geom));
+ANALYZE bench_yieldobservation;
+
+-- Kitale, Trans Nzoia; 1 km radius as in get_yield_observations_near_point
+\set lon 35.0
+\set lat 1.02
+\set radius_m 1000
+
+\echo '--- BEFORE: ST_Transform on the column (index unusable, transforms every row)'
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT id FROM bench_yieldobservation
+WHERE ST_DWithin(
+    ST_Transform(geom, 3857),
+    ST_Transform(ST_SetSRID(ST_MakePoint(:lon, :lat), 4326), 3857),
+    :radius_m
+);
+
+\echo '--- AFTER: geography(geom) radius on the functional GIST index'
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT id FROM bench_yieldobservation
+WHERE ST_DWithin(
+    geography(geom),
+    geography(ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)),
+    :radius_m
+);
+
+\echo '--- AFTER: 10 nearest neighbours with <-> (index-ordered scan)'
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT id FROM bench_yieldobservation
+ORDER BY geography(geom) <-> geography(ST_SetSRID(ST_MakePoint(:lon, :lat), 4326))
+LIMIT 10;
+
+-- Same result sets (counts should match up to projection error at the edge)
+SELECT
+    (SELECT count(*) FROM bench_yieldobservation
+      WHERE ST_DWithin(ST_Transform(geom, 3857),
+                       ST_Transform(ST_SetSRID(ST_MakePoint(:lon, :lat), 4326), 3857), :radius_m)) AS before_3857,
+    (SELECT count(*) FROM bench_yieldobservation
+      WHERE ST_DWithin(geography(geom), geography(ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)), :radius_m)) AS after_geography;
+
+DROP TABLE bench_yieldobservation;
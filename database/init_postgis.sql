@@ -49,16 +49,93 @@ CREATE TABLE IF NOT EXISTS auxiliarydata (
     temp_mean FLOAT,
     elevation_m FLOAT,
     soil_texture FLOAT,
-    geom GEOMETRY(MULTIPOLYGON, 4326) 
+    geom GEOMETRY(MULTIPOLYGON, 4326),
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now() -- NEW: Incremental refresh watermark
+);
+
+-- 5. IngestJob Table (Background raster ingestion queue in DIS)
+CREATE TABLE IF NOT EXISTS ingestjob (
+    id VARCHAR(36) PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    stage VARCHAR(50),
+    progress FLOAT NOT NULL DEFAULT 0,
+    filename VARCHAR(255),
+    job_metadata JSON,
+    asset_id INTEGER,
+    asset_url VARCHAR(512),
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+-- 6. DataVersion Table (Cache/ETag invalidation, bumped by DIS on ingestion)
+CREATE TABLE IF NOT EXISTS dataversion (
+    name VARCHAR(50) PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+-- 7. CountyYearStats Table (Ward anomaly baselines, refreshed by DIS per county/year)
+CREATE TABLE IF NOT EXISTS countyyearstats (
+    county_name VARCHAR(100) NOT NULL,
+    year INTEGER NOT NULL,
+    ward_count INTEGER NOT NULL DEFAULT 0,
+    ndvi_mean FLOAT,
+    ndvi_std FLOAT,
+    ndvi_p10 FLOAT,
+    ndvi_p50 FLOAT,
+    ndvi_p90 FLOAT,
+    precip_mean FLOAT,
+    precip_std FLOAT,
+    precip_p10 FLOAT,
+    precip_p50 FLOAT,
+    precip_p90 FLOAT,
+    temp_mean FLOAT,
+    temp_std FLOAT,
+    temp_p10 FLOAT,
+    temp_p50 FLOAT,
+    temp_p90 FLOAT,
+    et_mean FLOAT,
+    et_std FLOAT,
+    et_p10 FLOAT,
+    et_p50 FLOAT,
+    et_p90 FLOAT,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    PRIMARY KEY (county_name, year)
+);
+
+-- 8. DSSATResult Table (Memoized simulations, keyed by soil, weather series and management)
+CREATE TABLE IF NOT EXISTS dssatresult (
+    soil_id VARCHAR(10) NOT NULL,
+    weather_hash VARCHAR(16) NOT NULL,
+    cultivar_code VARCHAR(6) NOT NULL,
+    planting_date DATE NOT NULL,
+    fertilizer_n_kg FLOAT NOT NULL,
+    plant_population FLOAT NOT NULL,
+    yield_kg_ha FLOAT,
+    biomass_kg_ha FLOAT,
+    flowering_dap INTEGER,
+    maturity_dap INTEGER,
+    season_rain_mm FLOAT,
+    season_et_mm FLOAT,
+    summary JSON,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    CONSTRAINT pk_dssatresult PRIMARY KEY (soil_id, weather_hash, cultivar_code, planting_date, fertilizer_n_kg, plant_population)
 );
 
 -- Create Spatial and Functional Indexes
 CREATE INDEX IF NOT EXISTS region_geom_idx ON region USING GIST (geom);
 CREATE INDEX IF NOT EXISTS yieldobservation_geom_idx ON yieldobservation USING GIST (geom);
+-- Geodesic radius/KNN searches (db_utils) query geography(geom); keep the expression identical
+CREATE INDEX IF NOT EXISTS yieldobservation_geog_idx ON yieldobservation USING GIST (geography(geom));
 CREATE INDEX IF NOT EXISTS rasterasset_geom_idx ON rasterasset USING GIST (bbox);
 CREATE INDEX IF NOT EXISTS auxiliarydata_geom_idx ON auxiliarydata USING GIST (geom);
 
 -- NEW: B-Tree Indexes for high-speed filtering in the 47-county system
 CREATE INDEX IF NOT EXISTS idx_auxiliary_county ON auxiliarydata (county_name);
 CREATE INDEX IF NOT EXISTS idx_auxiliary_year ON auxiliarydata (year);
-CREATE INDEX IF NOT EXISTS idx_yield_year ON yieldobservation (year);
\ No newline at end of file
+CREATE UNIQUE INDEX IF NOT EXISTS uq_auxiliary_ward_year ON auxiliarydata (ward_id, year); -- Upsert key for DIS
+CREATE INDEX IF NOT EXISTS idx_yield_year ON yieldobservation (year);
+CREATE INDEX IF NOT EXISTS idx_auxiliary_updated ON auxiliarydata (updated_at);
+CREATE INDEX IF NOT EXISTS idx_dssatresult_created ON dssatresult (created_at); -- ml_api incremental refresh
+CREATE INDEX IF NOT EXISTS idx_ingestjob_status ON ingestjob (status);
\ No newline at end of file
@@ -0,0 +1,122 @@
+-- Brings a database created from an older init_postgis.sql up to the current schema.
+-- docker-entrypoint-initdb.d only runs on an empty volume, so existing databases
+-- need this once before deploying the current services. Idempotent: safe to rerun.
+--
+--   docker compose exec -T db psql -U <user> -d <db> -v ON_ERROR_STOP=1 < database/upgrade_postgis.sql
+BEGIN;
+
+-- 1. AuxiliaryData: change watermark (ml_api ward index) and the (ward_id, year) upsert key (DIS)
+ALTER TABLE auxiliarydata ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now();
+
+-- Boundaries loaded without any id were stored as the string 'None'; they are not one ward
+UPDATE auxiliarydata SET ward_id = NULL WHERE ward_id = 'None';
+
+-- Older loaders inserted a new row per upload. Keep one row per (ward_id, year): the latest
+-- one with a geometry, carrying the latest non-zero stats of its duplicates.
+CREATE TEMP TABLE auxiliary_dups ON COMMIT DROP AS
+SELECT id, ward_id, year,
+       row_number() OVER (PARTITION BY ward_id, year ORDER BY (geom IS NOT NULL) DESC, id DESC) AS keep_rank,
+       row_number() OVER (
+           PARTITION BY ward_id, year
+           ORDER BY (COALESCE(ndvi_mean, 0) <> 0 OR COALESCE(precip_mean, 0) <> 0 OR COALESCE(temp_mean, 0) <> 0) DESC, id DESC
+       ) AS stats_rank
+FROM auxiliarydata
+WHERE ward_id IS NOT NULL
+  AND (ward_id, year) IN (
+      SELECT ward_id, year FROM auxiliarydata WHERE ward_id IS NOT NULL GROUP BY ward_id, year HAVING count(*) > 1
+  );
+
+UPDATE auxiliarydata AS a SET
+    ndvi_mean = s.ndvi_mean,
+    precip_mean = s.precip_mean,
+    temp_mean = s.temp_mean,
+    et_mean = s.et_mean,
+    elevation_m = s.elevation_m,
+    soil_texture = s.soil_texture,
+    updated_at = now()
+FROM auxiliary_dups k
+JOIN auxiliary_dups sd ON sd.ward_id = k.ward_id AND sd.year = k.year AND sd.stats_rank = 1
+JOIN auxiliarydata s ON s.id = sd.id
+WHERE a.id = k.id AND k.keep_rank = 1 AND sd.id <> k.id;
+
+DELETE FROM auxiliarydata a USING auxiliary_dups d WHERE a.id = d.id AND d.keep_rank > 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_auxiliary_ward_year ON auxiliarydata (ward_id, year);
+CREATE INDEX IF NOT EXISTS idx_auxiliary_updated ON auxiliarydata (updated_at);
+
+-- 2. IngestJob (background raster ingestion in DIS)
+CREATE TABLE IF NOT EXISTS ingestjob (
+    id VARCHAR(36) PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    stage VARCHAR(50),
+    progress FLOAT NOT NULL DEFAULT 0,
+    filename VARCHAR(255),
+    job_metadata JSON,
+    asset_id INTEGER,
+    asset_url VARCHAR(512),
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_ingestjob_status ON ingestjob (status);
+
+-- 3. DataVersion (cache/ETag invalidation)
+CREATE TABLE IF NOT EXISTS dataversion (
+    name VARCHAR(50) PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+-- 4. CountyYearStats (filled for every county/year by DIS on its next start)
+CREATE TABLE IF NOT EXISTS countyyearstats (
+    county_name VARCHAR(100) NOT NULL,
+    year INTEGER NOT NULL,
+    ward_count INTEGER NOT NULL DEFAULT 0,
+    ndvi_mean FLOAT,
+    ndvi_std FLOAT,
+    ndvi_p10 FLOAT,
+    ndvi_p50 FLOAT,
+    ndvi_p90 FLOAT,
+    precip_mean FLOAT,
+    precip_std FLOAT,
+    precip_p10 FLOAT,
+    precip_p50 FLOAT,
+    precip_p90 FLOAT,
+    temp_mean FLOAT,
+    temp_std FLOAT,
+    temp_p10 FLOAT,
+    temp_p50 FLOAT,
+    temp_p90 FLOAT,
+    et_mean FLOAT,
+    et_std FLOAT,
+    et_p10 FLOAT,
+    et_p50 FLOAT,
+    et_p90 FLOAT,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    PRIMARY KEY (county_name, year)
+);
+
+-- 5. DSSATResult (memoized simulations)
+CREATE TABLE IF NOT EXISTS dssatresult (
+    soil_id VARCHAR(10) NOT NULL,
+    weather_hash VARCHAR(16) NOT NULL,
+    cultivar_code VARCHAR(6) NOT NULL,
+    planting_date DATE NOT NULL,
+    fertilizer_n_kg FLOAT NOT NULL,
+    plant_population FLOAT NOT NULL,
+    yield_kg_ha FLOAT,
+    biomass_kg_ha FLOAT,
+    flowering_dap INTEGER,
+    maturity_dap INTEGER,
+    season_rain_mm FLOAT,
+    season_et_mm FLOAT,
+    summary JSON,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    CONSTRAINT pk_dssatresult PRIMARY KEY (soil_id, weather_hash, cultivar_code, planting_date, fertilizer_n_kg, plant_population)
+);
+CREATE INDEX IF NOT EXISTS idx_dssatresult_created ON dssatresult (created_at);
+
+-- 6. Geodesic radius/KNN index (db_utils)
+CREATE INDEX IF NOT EXISTS yieldobservation_geog_idx ON yieldobservation USING GIST (geography(geom));
+
+COMMIT;
@@ -0,0 +1,268 @@
+import io
+import os
+import time
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import shape
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from shared.database.versions import bump_version, AUXILIARY_DATA
+from shared.database.aggregates import refresh_county_year_stats
+
+logger = logging.getLogger(__name__)
+
+# auxiliarydata column -> accepted CSV headers, in priority order
+WARD_STAT_ALIASES: Dict[str, List[str]] = {
+    'ndvi_mean': ['ndvi_mean', 'ndvi'],
+    'precip_mean': ['precip_mean', 'precip'],
+    'temp_mean': ['temp_mean', 'temp'],
+    'et_mean': ['et_mean', 'et'],
+    'elevation_m': ['elevation_mean', 'elevation'],
+    'soil_texture': ['soil_texture'],
+}
+WARD_STAGE_COLUMNS = ['ward_id', 'year', 'ward_name', 'county_name'] + list(WARD_STAT_ALIASES)
+
+def coalesce_columns(df: pd.DataFrame, columns: List[str], default=None) -> pd.Series:
+    """First non-null value across `columns`, vectorized over the frame."""
+    result: Optional[pd.Series] = None
+    for col in columns:
+        if col in df.columns:
+            result = df[col] if result is None else result.fillna(df[col])
+    if result is None:
+        return pd.Series(default, index=df.index, dtype=object)
+    return result if default is None else result.fillna(default)
+
+def normalize_ward_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Maps GEE zonal-stat CSV headers onto auxiliarydata columns in one pass."""
+    out = pd.DataFrame(index=df.index)
+    out['ward_id'] = coalesce_columns(df, ['ward_id', 'ADM2_PCODE']).astype(str)
+    out['year'] = pd.to_numeric(coalesce_columns(df, ['year'], 2024)).astype(int)
+    out['ward_name'] = coalesce_columns(df, ['ward_name', 'ADM2_EN'])
+    out['county_name'] = coalesce_columns(df, ['county_name', 'ADM1_EN'])
+    for target, aliases in WARD_STAT_ALIASES.items():
+        out[target] = pd.to_numeric(coalesce_columns(df, aliases, 0.0), errors='coerce').fillna(0.0)
+    # ON CONFLICT cannot touch the same row twice in one statement
+    return out[WARD_STAGE_COLUMNS].drop_duplicates(['ward_id', 'year'], keep='last')
+
+def copy_frame(db: Session, table: str, df: pd.DataFrame):
+    """Streams a frame into `table` with COPY on the session's own connection/transaction."""
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False, na_rep='')
+    buf.seek(0)
+    raw = db.connection().connection
+    with raw.cursor() as cur:
+        cur.copy_expert(
+            f"COPY {table} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv, NULL '')", buf
+        )
+
+UPSERT_WARDS_SQL = text("""
+    INSERT INTO auxiliarydata AS a (
+        ward_id, year, ward_name, county_name,
+        ndvi_mean, precip_mean, temp_mean, et_mean, elevation_m, soil_texture, updated_at
+    )
+    SELECT ward_id, year, COALESCE(ward_name, 'Unknown'), COALESCE(county_name, 'Unknown'),
+           ndvi_mean, precip_mean, temp_mean, et_mean, elevation_m, soil_texture, now()
+    FROM ward_stage
+    ON CONFLICT (ward_id, year) DO UPDATE SET
+        ndvi_mean = EXCLUDED.ndvi_mean,
+        precip_mean = EXCLUDED.precip_mean,
+        temp_mean = EXCLUDED.temp_mean,
+        et_mean = EXCLUDED.et_mean,
+        elevation_m = EXCLUDED.elevation_m,
+        soil_texture = EXCLUDED.soil_texture,
+        -- Keep the boundary's county unless the CSV actually names one
+        county_name = CASE WHEN EXCLUDED.county_name = 'Unknown' THEN a.county_name ELSE EXCLUDED.county_name END,
+        updated_at = now()
+    RETURNING (xmax = 0) AS inserted, a.county_name, a.year
+""")
+
+def _staged_pairs(db: Session, stage_table: str) -> List[Tuple[str, int]]:
+    """(county, year) pairs the staged wards currently belong to, before the upsert moves them."""
+    return [tuple(r) for r in db.execute(text(
+        f"SELECT DISTINCT a.county_name, a.year FROM auxiliarydata a JOIN {stage_table} s USING (ward_id, year)"
+    )).fetchall()]
+
+def _finish_upsert(db: Session, rows: List[Any], previous_pairs: List[Tuple[str, int]]) -> Dict[str, int]:
+    """Shared tail of the auxiliarydata upserts: aggregates, data version, counts."""
+    refresh_county_year_stats(db, previous_pairs + [(r[1], r[2]) for r in rows])
+    bump_version(db, AUXILIARY_DATA)
+    inserted = sum(1 for r in rows if r[0])
+    return {"inserted": inserted, "updated": len(rows) - inserted}
+
+def bulk_upsert_wards(db: Session, df: pd.DataFrame) -> Dict[str, int]:
+    """
+    Set-based replacement for the per-row SELECT/UPDATE ward merge:
+    COPY into a temp staging table, then a single INSERT ... ON CONFLICT.
+    Caller commits.
+    """
+    stage = normalize_ward_frame(df)
+    db.execute(text("""
+        CREATE TEMP TABLE ward_stage (
+            ward_id VARCHAR(50), year INTEGER, ward_name VARCHAR(100), county_name VARCHAR(100),
+            ndvi_mean FLOAT, precip_mean FLOAT, temp_mean FLOAT, et_mean FLOAT,
+            elevation_m FLOAT, soil_texture FLOAT
+        ) ON COMMIT DROP
+    """))
+    copy_frame(db, "ward_stage", stage)
+    previous = _staged_pairs(db, "ward_stage")
+    counts = _finish_upsert(db, db.execute(UPSERT_WARDS_SQL).fetchall(), previous)
+    logger.info(f"Ward upsert: {counts['inserted']} inserted, {counts['updated']} updated.")
+    return counts
+
+BULK_BATCH_ROWS = int(os.getenv("BULK_BATCH_ROWS", "50000"))
+
+@contextmanager
+def indexes_dropped(db: Session, table: str, enabled: bool):
+    """
+    Optionally drops the non-unique indexes of `table` for the duration of a
+    very large load and rebuilds them once at the end (same transaction).
+    Unique indexes stay: ON CONFLICT targets depend on them.
+    """
+    if not enabled:
+        yield
+        return
+    rows = db.execute(text(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = :t AND indexdef NOT LIKE 'CREATE UNIQUE%'"
+    ), {"t": table}).fetchall()
+    for name, _ in rows:
+        db.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+    logger.info(f"Dropped {len(rows)} indexes on {table} for bulk load.")
+    yield
+    started = time.perf_counter()
+    for _, definition in rows:
+        db.execute(text(definition))
+    logger.info(f"Rebuilt {len(rows)} indexes on {table} in {time.perf_counter() - started:.1f}s.")
+
+def _throughput(rows: int, started: float) -> Dict[str, float]:
+    seconds = max(time.perf_counter() - started, 1e-9)
+    return {"rows": rows, "seconds": round(seconds, 3), "rows_per_s": round(rows / seconds, 1)}
+
+SAMPLE_COLUMNS = [
+    'crop_id', 'year', 'yield_value', 'ndvi_mean', 'precip_mean', 'et_mean',
+    'temp_mean', 'elevation', 'soil_texture', 'geom'
+]
+
+def normalize_sample_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vectorized GEE sample rows -> yieldobservation columns, geometry as hex EWKB.
+    Coordinates come from longitude/lon + latitude/lat, else the GEE '.geo' GeoJSON.
+    """
+    out = pd.DataFrame(index=df.index)
+    out['crop_id'] = 'Maize'
+    out['year'] = pd.to_numeric(coalesce_columns(df, ['year'], 2024)).astype(int)
+    out['yield_value'] = pd.to_numeric(coalesce_columns(df, ['yield_value'], 0.0))
+    out['ndvi_mean'] = pd.to_numeric(coalesce_columns(df, ['ndvi_mean', 'ndvi']))
+    out['precip_mean'] = pd.to_numeric(coalesce_columns(df, ['precip_mean', 'precip']))
+    out['et_mean'] = pd.to_numeric(coalesce_columns(df, ['et_mean', 'et']))
+    out['temp_mean'] = pd.to_numeric(coalesce_columns(df, ['temp_mean', 'temp']))
+    out['elevation'] = pd.to_numeric(coalesce_columns(df, ['elevation', 'elevation_mean']))
+    out['soil_texture'] = pd.to_numeric(coalesce_columns(df, ['soil_texture']))
+
+    has_coords = any(c in df.columns for c in ('longitude', 'lon'))
+    if has_coords or '.geo' not in df.columns:
+        lon = pd.to_numeric(coalesce_columns(df, ['longitude', 'lon'], 0.0)).to_numpy('float64')
+        lat = pd.to_numeric(coalesce_columns(df, ['latitude', 'lat'], 0.0)).to_numpy('float64')
+        geoms = shapely.points(lon, lat)
+    else:
+        geoms = shapely.from_geojson(df['.geo'].fillna('null').to_numpy(dtype=object), on_invalid='ignore')
+        geoms = np.where(shapely.is_missing(geoms), shapely.points(0.0, 0.0), geoms)
+    out['geom'] = shapely.to_wkb(shapely.set_srid(geoms, 4326), hex=True, include_srid=True)
+    return out[SAMPLE_COLUMNS]
+
+def bulk_load_samples(db: Session, chunks: Iterable[pd.DataFrame], rebuild_indexes: bool = False) -> Dict[str, float]:
+    """COPYs yield samples into yieldobservation batch by batch. Caller commits."""
+    started, total = time.perf_counter(), 0
+    with indexes_dropped(db, "yieldobservation", rebuild_indexes):
+        for chunk in chunks:
+            frame = normalize_sample_frame(chunk)
+            copy_frame(db, "yieldobservation", frame)
+            total += len(frame)
+    stats = _throughput(total, started)
+    logger.info(f"Sample load: {stats['rows']} rows in {stats['seconds']}s ({stats['rows_per_s']} rows/s).")
+    return stats
+
+BOUNDARY_COLUMNS = ['ward_id', 'ward_name', 'county_name', 'year', 'geom']
+
+def boundary_row(feature: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Maps standard Kenya GAUL/Shapefile attributes of one feature onto
+    auxiliarydata; None when the feature carries no ward id to upsert on.
+    """
+    props = feature.get("properties") or {}
+    ward_id = props.get('ADM2_PCODE') or props.get('ward_id') or props.get('id')
+    if ward_id is None or str(ward_id).strip() == "":
+        return None
+    geom = shape(feature.get("geometry"))
+    return {
+        'ward_id': str(ward_id),
+        'ward_name': props.get('ADM2_EN') or props.get('ward_name') or props.get('name'),
+        'county_name': props.get('ADM1_EN') or props.get('county_name') or "Unknown",
+        'year': int(props.get('year', 2024)),
+        'geom': shapely.to_wkb(shapely.set_srid(geom, 4326), hex=True, include_srid=True)
+    }
+
+UPSERT_BOUNDARIES_SQL = text("""
+    INSERT INTO auxiliarydata AS a (
+        ward_id, ward_name, county_name, year, geom,
+        ndvi_mean, precip_mean, temp_mean, et_mean, elevation_m, soil_texture, updated_at
+    )
+    SELECT DISTINCT ON (ward_id, year)
+           ward_id, COALESCE(ward_name, 'Unknown'), county_name, year, ST_Multi(geom),
+           0.0, 0.0, 0.0, 0.0, 0.0, 0.0, now()
+    FROM boundary_stage
+    ORDER BY ward_id, year, seq DESC
+    ON CONFLICT (ward_id, year) DO UPDATE SET
+        geom = EXCLUDED.geom,
+        ward_name = EXCLUDED.ward_name,
+        county_name = EXCLUDED.county_name,
+        updated_at = now()
+    RETURNING (xmax = 0) AS inserted, a.county_name, a.year
+""")
+
+def bulk_upsert_boundaries(db: Session, features: Iterable[Dict[str, Any]], rebuild_indexes: bool = False) -> Dict[str, float]:
+    """
+    COPYs boundary features into a staging table in BULK_BATCH_ROWS batches,
+    then merges them into auxiliarydata with one upsert (the last feature for
+    a ward/year wins). Stats of existing wards are kept. Features without a
+    ward id cannot be keyed and are skipped and counted. Caller commits.
+    """
+    started, total, skipped = time.perf_counter(), 0, 0
+    db.execute(text("""
+        CREATE TEMP TABLE boundary_stage (
+            seq BIGSERIAL, ward_id VARCHAR(50), ward_name VARCHAR(100), county_name VARCHAR(100),
+            year INTEGER, geom GEOMETRY
+        ) ON COMMIT DROP
+    """))
+
+    batch: List[Dict[str, Any]] = []
+    for feature in features:
+        row = boundary_row(feature)
+        if row is None:
+            skipped += 1
+            continue
+        batch.append(row)
+        if len(batch) >= BULK_BATCH_ROWS:
+            copy_frame(db, "boundary_stage", pd.DataFrame(batch, columns=BOUNDARY_COLUMNS))
+            total += len(batch)
+            batch = []
+    if batch:
+        copy_frame(db, "boundary_stage", pd.DataFrame(batch, columns=BOUNDARY_COLUMNS))
+        total += len(batch)
+
+    previous = _staged_pairs(db, "boundary_stage")
+    with indexes_dropped(db, "auxiliarydata", rebuild_indexes):
+        rows = db.execute(UPSERT_BOUNDARIES_SQL).fetchall()
+    counts = _finish_upsert(db, rows, previous)
+
+    stats = _throughput(total, started)
+    stats.update(counts, skipped=skipped)
+    if skipped:
+        logger.warning(f"Boundary load: skipped {skipped} features without ADM2_PCODE/ward_id/id.")
+    logger.info(f"Boundary load: {total} features in {stats['seconds']}s ({stats['rows_per_s']} rows/s).")
+    return stats
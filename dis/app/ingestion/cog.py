@@ -0,0 +1,92 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.windows import Window
+
+logger = logging.getLogger(__name__)
+
+# Conversion tuning (all overridable per deployment)
+COG_BLOCK_SIZE = 256
+COG_COMPRESS = os.getenv("COG_COMPRESS", "LZW").upper()          # LZW | DEFLATE | ZSTD
+COG_PREDICTOR = os.getenv("COG_PREDICTOR", "auto")                # auto | 1 | 2 | 3
+COG_LEVEL = os.getenv("COG_LEVEL")                                # DEFLATE/ZSTD level
+COG_NUM_THREADS = os.getenv("COG_NUM_THREADS", "ALL_CPUS")
+# Rows are converted in strips of blocks; memory ~ strip_rows * strip_cols * bands * dtype
+COG_STRIP_COLS = int(os.getenv("COG_STRIP_COLS", "4096"))
+COG_OVERVIEW_LEVELS = [2, 4, 8, 16]
+
+def _predictor(dtype: str) -> int:
+    if COG_PREDICTOR != "auto":
+        return int(COG_PREDICTOR)
+    if COG_COMPRESS not in ("LZW", "DEFLATE", "ZSTD"):
+        return 1
+    # Floating-point predictor for the GEE float stacks, horizontal differencing for ints
+    return 3 if np.dtype(dtype).kind == 'f' else 2
+
+def cog_creation_options(dtype: str) -> Dict[str, Any]:
+    options: Dict[str, Any] = {
+        'driver': 'GTiff',
+        'tiled': True,
+        'blockxsize': COG_BLOCK_SIZE,
+        'blockysize': COG_BLOCK_SIZE,
+        'compress': COG_COMPRESS,
+        'predictor': _predictor(dtype),
+        'interleave': 'pixel',  # Better for COG performance
+        'num_threads': COG_NUM_THREADS,  # GDAL compresses blocks on all cores
+        'bigtiff': 'IF_SAFER'
+    }
+    if COG_LEVEL and COG_COMPRESS == 'ZSTD':
+        options['zstd_level'] = int(COG_LEVEL)
+    elif COG_LEVEL and COG_COMPRESS == 'DEFLATE':
+        options['zlevel'] = int(COG_LEVEL)
+    return options
+
+def _strip_windows(width: int, height: int) -> Iterator[Window]:
+    """Block-aligned windows: one block row high, COG_STRIP_COLS wide."""
+    strip_cols = max(COG_BLOCK_SIZE, COG_STRIP_COLS // COG_BLOCK_SIZE * COG_BLOCK_SIZE)
+    for row_off in range(0, height, COG_BLOCK_SIZE):
+        for col_off in range(0, width, strip_cols):
+            yield Window(
+                col_off, row_off,
+                min(strip_cols, width - col_off), min(COG_BLOCK_SIZE, height - row_off)
+            )
+
+def convert_to_cog(input_file_path: str, output_file_path: str):
+    """
+    Windowed COG conversion: memory stays flat at one strip of blocks
+    regardless of raster size. The next strip is read on a helper thread
+    while GDAL compresses the current one on NUM_THREADS cores.
+    """
+    try:
+        with rasterio.open(input_file_path) as src:
+            profile = src.profile
+            profile.update(cog_creation_options(src.dtypes[0]))
+
+            with rasterio.open(output_file_path, 'w', **profile) as dst, \
+                    ThreadPoolExecutor(max_workers=1) as prefetch:
+                windows = list(_strip_windows(src.width, src.height))
+                pending = prefetch.submit(src.read, window=windows[0]) if windows else None
+                for i, window in enumerate(windows):
+                    data = pending.result()
+                    if i + 1 < len(windows):
+                        pending = prefetch.submit(src.read, window=windows[i + 1])
+                    dst.write(data, window=window)
+
+                # Build overviews for fast map zooming, multi-threaded and
+                # compressed like the full-resolution level
+                with rasterio.Env(
+                    GDAL_NUM_THREADS=COG_NUM_THREADS,
+                    COMPRESS_OVERVIEW=COG_COMPRESS,
+                    PREDICTOR_OVERVIEW=str(profile['predictor'])
+                ):
+                    dst.build_overviews(COG_OVERVIEW_LEVELS, Resampling.average)
+                dst.update_tags(ns='rio_overview', resampling='average')
+        return True
+    except Exception as e:
+        logger.error(f"ISO-ERROR: COG conversion failed: {e}")
+        return False
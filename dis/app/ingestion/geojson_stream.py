@@ -0,0 +1,52 @@
+import json
+import logging
+from typing import Any, Dict, IO, Iterator
+
+import ijson
+
+logger = logging.getLogger(__name__)
+
+RECORD_SEPARATOR = b'\x1e'  # RFC 8142 GeoJSON text sequences
+LINE_DELIMITED_SUFFIXES = ('.geojsonl', '.geojsons', '.geojsonseq', '.jsonl', '.ndjson')
+# Bounded sniff: a minified FeatureCollection is one (huge) line
+SNIFF_BYTES = 4 * 1024 * 1024
+
+def _is_line_delimited(f: IO[bytes], filename: str) -> bool:
+    """GeoJSONSeq / newline-delimited features vs. a single FeatureCollection document."""
+    if filename.lower().endswith(LINE_DELIMITED_SUFFIXES):
+        return True
+    head = f.read(1)
+    while head and head.isspace():
+        head = f.read(1)
+    if head == RECORD_SEPARATOR:
+        f.seek(0)
+        return True
+    f.seek(0)
+    first_line = f.readline(SNIFF_BYTES)
+    f.seek(0)
+    try:
+        obj = json.loads(first_line.strip(RECORD_SEPARATOR + b' \t\r\n'))
+    except ValueError:
+        # First line is only part of a document: a (pretty-printed) FeatureCollection
+        return False
+    return isinstance(obj, dict) and obj.get("type") == "Feature"
+
+def _iter_sequence(f: IO[bytes]) -> Iterator[Dict[str, Any]]:
+    for line in f:
+        line = line.strip(RECORD_SEPARATOR + b' \t\r\n')
+        if line:
+            yield json.loads(line)
+
+def iter_features(path: str, filename: str = "") -> Iterator[Dict[str, Any]]:
+    """
+    Yields GeoJSON features one at a time from a file on disk, so memory
+    stays flat regardless of collection size. Accepts a FeatureCollection
+    (parsed incrementally with ijson) or line-delimited GeoJSON/GeoJSONSeq.
+    """
+    with open(path, 'rb') as f:
+        if _is_line_delimited(f, filename):
+            logger.info("Streaming line-delimited GeoJSON features.")
+            yield from _iter_sequence(f)
+        else:
+            # use_float: plain floats instead of Decimal for coordinates
+            yield from ijson.items(f, 'features.item', use_float=True)
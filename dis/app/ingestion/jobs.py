@@ -0,0 +1,154 @@
+import os
+import uuid
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from shared.database.base import SessionLocal
+from shared.database.models import IngestJob
+from shared.models.api_models import IngestMetadata, IngestJobResponse
+
+from app.ingestion.processors import ingest_raster_file
+
+logger = logging.getLogger(__name__)
+
+# Number of rasters converted in parallel; each worker is a separate process
+# so rasterio/boto3 work never blocks the API event loop.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "16"))
+
+class IngestQueueFull(Exception):
+    pass
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = 0
+_lock = threading.Lock()
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            # spawn: workers get fresh DB engines and boto3 clients instead of forked copies
+            _executor = ProcessPoolExecutor(
+                max_workers=INGEST_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+def _update_job(db: Session, job_id: str, **fields: Any):
+    db.query(IngestJob).filter(IngestJob.id == job_id).update(fields)
+    db.commit()
+
+def run_ingest_job(job_id: str, tmp_path: str, filename: str, metadata_dict: Dict[str, Any]):
+    """Worker-process entry point for one raster ingestion."""
+    db = SessionLocal()
+    try:
+        _update_job(db, job_id, status="running", stage="starting", progress=0.0)
+        asset_url, asset_id = ingest_raster_file(
+            tmp_path, filename, IngestMetadata(**metadata_dict), db,
+            on_progress=lambda stage, progress: _update_job(db, job_id, stage=stage, progress=progress)
+        )
+        _update_job(
+            db, job_id, status="succeeded", stage="done", progress=1.0,
+            asset_url=asset_url, asset_id=asset_id
+        )
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Ingestion job {job_id} failed: {e}")
+        _update_job(db, job_id, status="failed", error=str(e))
+    finally:
+        db.close()
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+
+def _on_job_done(job_id: str, tmp_path: str, executor: ProcessPoolExecutor, future: Future):
+    global _executor, _pending
+    with _lock:
+        _pending -= 1
+    if future.cancelled():
+        # Shutdown: recover_interrupted_jobs() settles it on the next start
+        return
+    error = future.exception()
+    if error is None:
+        return
+    # The job never recorded its failure: its worker died or its result could not be sent back
+    if isinstance(error, BrokenProcessPool):
+        # OOM/segfault. Every job of the broken pool lands here; the first one replaces it
+        logger.error(f"Ingestion worker crashed on job {job_id}: {error}")
+        with _lock:
+            replace = _executor is executor
+            if replace:
+                _executor = None
+        if replace:
+            executor.shutdown(wait=False, cancel_futures=True)
+        message = f"Worker crashed: {error}"
+    else:
+        logger.error(f"Ingestion job {job_id} failed outside the job handler: {error}")
+        message = str(error)
+    if os.path.exists(tmp_path): os.remove(tmp_path)
+    db = SessionLocal()
+    try:
+        _update_job(db, job_id, status="failed", error=message)
+    finally:
+        db.close()
+
+def submit_ingest_job(db: Session, tmp_path: str, filename: str, metadata_dict: Dict[str, Any]) -> IngestJob:
+    global _pending
+    with _lock:
+        if _pending >= INGEST_MAX_PENDING:
+            raise IngestQueueFull(f"{_pending} ingestion jobs already pending")
+        _pending += 1
+
+    job_id = str(uuid.uuid4())
+    try:
+        job = IngestJob(
+            id=job_id, status="queued", stage="queued", progress=0.0,
+            filename=filename, job_metadata=metadata_dict
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+
+        executor = _get_executor()
+        future = executor.submit(run_ingest_job, job_id, tmp_path, filename, metadata_dict)
+    except Exception:
+        with _lock:
+            _pending -= 1
+        raise
+    future.add_done_callback(lambda f: _on_job_done(job_id, tmp_path, executor, f))
+    return job
+
+def recover_interrupted_jobs():
+    """Jobs left queued/running by a previous process can never finish; mark them failed."""
+    db = SessionLocal()
+    try:
+        count = db.query(IngestJob).filter(IngestJob.status.in_(["queued", "running"])).update(
+            {"status": "failed", "error": "Interrupted by service restart"}, synchronize_session=False
+        )
+        db.commit()
+        if count:
+            logger.warning(f"Marked {count} interrupted ingestion jobs as failed.")
+    finally:
+        db.close()
+
+def shutdown_executor():
+    with _lock:
+        executor = _executor
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def job_to_response(job: Any) -> IngestJobResponse:
+    return IngestJobResponse(
+        job_id=job.id,
+        status=job.status,
+        stage=job.stage,
+        progress=float(job.progress or 0.0),
+        asset_url=job.asset_url,
+        asset_id=job.asset_id,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
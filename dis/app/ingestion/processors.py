@@ -1,79 +1,98 @@
 import os
 import tempfile
 import rasterio
-from rasterio.enums import Resampling
-from fastapi import UploadFile, HTTPException
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
 from shared.models.api_models import IngestMetadata
 from shared.database.models import RasterAsset
 from sqlalchemy.orm import Session
 from datetime import datetime
+from typing import Callable, Optional
 import boto3
 from botocore.exceptions import ClientError
 from botocore.config import Config
+from boto3.s3.transfer import TransferConfig
 from shapely.geometry import box
 from geoalchemy2.shape import from_shape
 
+from app.ingestion.cog import convert_to_cog
+
 # Configuration
 MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minio_user")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minio_password")
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "dss-cogs")
 
+# Streaming / multipart tuning: peak memory is roughly
+# UPLOAD_CHUNK_MB + S3_MULTIPART_CONCURRENCY * S3_MULTIPART_CHUNK_MB per ingest.
+MB = 1024 * 1024
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_MB", "8")) * MB
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=int(os.getenv("S3_MULTIPART_THRESHOLD_MB", "64")) * MB,
+    multipart_chunksize=int(os.getenv("S3_MULTIPART_CHUNK_MB", "16")) * MB,
+    max_concurrency=int(os.getenv("S3_MULTIPART_CONCURRENCY", "8")),
+    use_threads=True
+)
+
 s3_client = boto3.client(
     's3',
     endpoint_url=MINIO_ENDPOINT,
     aws_access_key_id=MINIO_ACCESS_KEY,
     aws_secret_access_key=MINIO_SECRET_KEY,
-    config=Config(signature_version='s3v4')
+    config=Config(
+        signature_version='s3v4',
+        max_pool_connections=S3_TRANSFER_CONFIG.max_request_concurrency
+    )
 )
 
-def convert_to_cog(input_file_path: str, output_file_path: str):
-    """Memory-efficient COG conversion writing band-by-band."""
+async def save_upload_to_disk(file: UploadFile, suffix: str) -> str:
+    """
+    Streams an upload to a temp file in fixed-size chunks; never holds the
+    whole file in RAM. Disk writes run in the threadpool so multi-GB uploads
+    do not stall the event loop.
+    """
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
     try:
-        with rasterio.open(input_file_path) as src:
-            profile = src.profile
-            profile.update(
-                driver='GTiff',
-                tiled=True,
-                blockxsize=256,
-                blockysize=256,
-                compress='LZW',
-                interleave='pixel' # Better for COG performance
-            )
-
-            with rasterio.open(output_file_path, 'w', **profile) as dst:
-                # Loop through bands one by one to save RAM
-                for i in range(1, src.count + 1):
-                    dst.write(src.read(i), i)
-                
-                # Build overviews for fast map zooming
-                dst.build_overviews([2, 4, 8, 16], Resampling.average)
-                dst.update_tags(ns='rio_overview', resampling='average')
-        return True
-    except Exception as e:
-        print(f"ISO-ERROR: COG conversion failed: {e}")
-        return False
-
-async def process_and_ingest_raster(file: UploadFile, metadata: IngestMetadata, db: Session):
-    # 1. Save temp
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".tif") as tmp:
-        content = await file.read()
-        tmp.write(content)
-        tmp_path = tmp.name
+        with tmp:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await run_in_threadpool(tmp.write, chunk)
+    except Exception:
+        os.remove(tmp.name)
+        raise
+    return tmp.name
 
+def ingest_raster_file(
+    tmp_path: str,
+    filename: str,
+    metadata: IngestMetadata,
+    db: Session,
+    on_progress: Optional[Callable[[str, float], None]] = None
+):
+    """
+    Blocking COG convert -> MinIO upload -> catalog pipeline for a raster
+    already on local disk. Runs inside a DIS ingestion worker process.
+    Removes tmp_path when done.
+    """
+    report = on_progress or (lambda stage, progress: None)
     cog_path = tmp_path + "_cog.tif"
     
     try:
         # 2. Convert
+        report("converting", 0.1)
         if not convert_to_cog(tmp_path, cog_path):
-            raise HTTPException(status_code=500, detail="COG conversion failed")
+            raise RuntimeError("COG conversion failed")
 
-        # 3. Upload to MinIO
-        object_name = f"{metadata.asset_type}/{datetime.now().strftime('%Y%m%d')}_{file.filename}"
-        s3_client.upload_file(cog_path, S3_BUCKET_NAME, object_name)
+        # 3. Upload to MinIO (multipart, parts sent in parallel)
+        report("uploading", 0.6)
+        object_name = f"{metadata.asset_type}/{datetime.now().strftime('%Y%m%d')}_{filename}"
+        s3_client.upload_file(cog_path, S3_BUCKET_NAME, object_name, Config=S3_TRANSFER_CONFIG)
         asset_url = f"{MINIO_ENDPOINT}/{S3_BUCKET_NAME}/{object_name}"
 
         # 4. Extract Spatial Metadata & Band Names
+        report("cataloging", 0.9)
         with rasterio.open(cog_path) as src:
             bounds = src.bounds
             wkt_bbox = box(bounds.left, bounds.bottom, bounds.right, bounds.top)
@@ -98,4 +117,4 @@ async def process_and_ingest_raster(file: UploadFile, metadata: IngestMetadata,
 
     finally:
         if os.path.exists(tmp_path): os.remove(tmp_path)
-        if os.path.exists(cog_path): os.remove(cog_path)
\ No newline at end of file
+        if os.path.exists(cog_path): os.remove(cog_path)
@@ -4,21 +4,27 @@ from shared.database.models import RasterAsset
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, cast
 import pandas as pd
-import io
+import os
 import json
 import logging
 import shapely.geometry
-from shapely.geometry import shape
-from geoalchemy2.shape import to_shape, from_shape
+from geoalchemy2.shape import to_shape
 
 # Shared imports
-from shared.models.api_models import IngestMetadata, IngestResponse
-from shared.database.base import get_db
+from shared.models.api_models import IngestMetadata, IngestJobResponse
+from shared.database.base import get_db, SessionLocal
+from shared.database.aggregates import backfill_county_year_stats
 from shared.database import models
-from shared.database.models import AuxiliaryData, YieldObservation
 
 # App-specific ingestion logic
-from app.ingestion.processors import process_and_ingest_raster
+from app.ingestion.processors import save_upload_to_disk
+from app.ingestion.bulk import (
+    bulk_upsert_wards, bulk_load_samples, bulk_upsert_boundaries, BULK_BATCH_ROWS
+)
+from app.ingestion.geojson_stream import iter_features
+from app.ingestion.jobs import (
+    submit_ingest_job, job_to_response, recover_interrupted_jobs, shutdown_executor, IngestQueueFull
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -38,148 +44,132 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.post("/v1/ingest", response_model=IngestResponse)
+@app.on_event("startup")
+def startup_ingest_queue():
+    recover_interrupted_jobs()
+
+@app.on_event("startup")
+def startup_county_stats():
+    """DIS owns the aggregates: fills in pairs ingested before countyyearstats existed."""
+    db = SessionLocal()
+    try:
+        count = backfill_county_year_stats(db)
+        db.commit()
+        if count:
+            logger.info(f"Backfilled county/year stats for {count} pairs.")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"County stats backfill failed: {e}")
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+def shutdown_ingest_queue():
+    shutdown_executor()
+
+@app.post("/v1/ingest", response_model=IngestJobResponse, status_code=202)
 async def ingest_raster(
     metadata: str = Form(..., description="JSON string containing IngestMetadata"),
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
+    """
+    Queues a raster for background COG conversion, upload and cataloging.
+    Returns a job id immediately; poll /v1/ingest/jobs/{job_id} for progress.
+    """
     try:
         metadata_dict = json.loads(metadata)
-        ingest_metadata = IngestMetadata(**metadata_dict)
+        IngestMetadata(**metadata_dict)
     except Exception as e:
         logger.error(f"Metadata parsing failed: {e}")
         raise HTTPException(status_code=400, detail=f"Invalid metadata JSON format: {e}")
 
+    tmp_path = None
     try:
-        asset_url, asset_id = await process_and_ingest_raster(
-            file=file,
-            metadata=ingest_metadata,
-            db=db
-        )
-        return IngestResponse(
-            message="Raster successfully cataloged.",
-            asset_url=asset_url,
-            asset_id=cast(int, asset_id) 
-        )
+        tmp_path = await save_upload_to_disk(file, ".tif")
+        job = submit_ingest_job(db, tmp_path, str(file.filename), metadata_dict)
+        return job_to_response(job)
+    except IngestQueueFull as e:
+        if tmp_path and os.path.exists(tmp_path): os.remove(tmp_path)
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
+        if tmp_path and os.path.exists(tmp_path): os.remove(tmp_path)
         logger.error(f"Ingestion process failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/v1/ingest/jobs/{job_id}", response_model=IngestJobResponse)
+def get_ingest_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.query(models.IngestJob).filter(models.IngestJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return job_to_response(job)
+
 @app.post("/v1/ingest/geojson")
 async def ingest_geojson(
     file: UploadFile = File(...), 
+    rebuild_indexes: bool = False,
     db: Session = Depends(get_db)
 ):
     """
     Ingest boundaries. 
     Standardizes ADM columns for the 47 Kenya Counties.
+    The upload is spooled to disk and parsed incrementally (FeatureCollection
+    or line-delimited GeoJSON/GeoJSONSeq), feeding batched COPYs.
     """
+    tmp_path = await save_upload_to_disk(file, ".geojson")
     try:
-        content = await file.read()
-        data = json.loads(content)
-        features = data.get("features", [])
-        for f in features:
-            props = f.get("properties", {})
-            
-            # Map standard Kenya GAUL/Shapefile attributes
-            ward_id = str(props.get('ADM2_PCODE') or props.get('ward_id') or props.get('id'))
-            county_name = props.get('ADM1_EN') or props.get('county_name') or "Unknown"
-            ward_name = props.get('ADM2_EN') or props.get('ward_name') or props.get('name')
-            year = int(props.get('year', 2024))
-
-            db.add(AuxiliaryData(
-                ward_name=ward_name,
-                ward_id=ward_id,
-                county_name=county_name,
-                year=year,
-                geom=from_shape(shape(f.get("geometry")), srid=4326),
-                ndvi_mean=0.0, 
-                precip_mean=0.0,
-                temp_mean=0.0,
-                et_mean=0.0,
-                elevation_m=0.0,
-                soil_texture=0.0
-            ))
+        features = iter_features(tmp_path, str(file.filename or ""))
+        stats = bulk_upsert_boundaries(db, features, rebuild_indexes=rebuild_indexes)
         db.commit()
-        return {"status": "success", "message": f"Successfully ingested {len(features)} boundaries."}
+        return {"status": "success", "message": f"Successfully ingested {stats['rows']} boundaries ({stats['skipped']} skipped: no ward id).", **stats}
     except Exception as e:
         db.rollback()
         logger.error(f"GeoJSON Ingestion failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
 
 @app.post("/v1/ingest/csv/{table_type}")
 async def ingest_csv(
     table_type: str, 
     file: UploadFile = File(...), 
+    rebuild_indexes: bool = False,
     db: Session = Depends(get_db)
 ):
     """
     Ingest GEE CSV outputs.
     RECALIBRATED: Performs an UPSERT (Update or Insert) to merge stats with existing GeoJSON shapes.
+    Samples are streamed from disk and COPYed in BULK_BATCH_ROWS batches.
     """
-    content = await file.read()
-    df = pd.read_csv(io.BytesIO(content))
+    tmp_path = await save_upload_to_disk(file, ".csv")
     try:
+        stats: Dict[str, Any] = {}
         if table_type == "wards":
+            df = pd.read_csv(tmp_path)
             logger.info(f"Merging {len(df)} CSV records with existing spatial units.")
-            for _, row in df.iterrows():
-                w_id = str(row.get('ward_id') or row.get('ADM2_PCODE'))
-                w_year = int(row.get('year', 2024))
-                
-                existing_unit = db.query(AuxiliaryData).filter(
-                    AuxiliaryData.ward_id == w_id,
-                    AuxiliaryData.year == w_year
-                ).first()
-
-                if existing_unit:
-                    # FIX: cast(Any, ...) solves the "float not assignable to Column" Pylance issue
-                    u = cast(Any, existing_unit)
-                    u.ndvi_mean = float(row.get('ndvi_mean') or row.get('ndvi') or 0.0)
-                    u.precip_mean = float(row.get('precip_mean') or row.get('precip') or 0.0)
-                    u.temp_mean = float(row.get('temp_mean') or row.get('temp') or 0.0)
-                    u.et_mean = float(row.get('et_mean') or row.get('et') or 0.0)
-                    u.elevation_m = float(row.get('elevation_mean') or row.get('elevation') or 0.0)
-                    u.soil_texture = float(row.get('soil_texture') or 0.0)
-                    
-                    c_name = row.get('county_name')
-                    if c_name:
-                        u.county_name = str(c_name)
-                else:
-                    db.add(AuxiliaryData(
-                        ward_name=str(row.get('ward_name') or row.get('ADM2_EN') or "Unknown"),
-                        ward_id=w_id,
-                        county_name=str(row.get('county_name') or "Unknown"),
-                        year=w_year,
-                        ndvi_mean=float(row.get('ndvi_mean', 0.0)),
-                        precip_mean=float(row.get('precip_mean', 0.0)),
-                        temp_mean=float(row.get('temp_mean', 0.0)),
-                        et_mean=float(row.get('et_mean', 0.0)),
-                        elevation_m=float(row.get('elevation_mean', 0.0)),
-                        soil_texture=float(row.get('soil_texture', 0.0)),
-                        geom=None 
-                    ))
+            # Set-based: COPY into staging + one INSERT ... ON CONFLICT (ward_id, year)
+            stats = bulk_upsert_wards(db, df)
+            records = len(df)
         
         elif table_type == "samples":
-            for _, row in df.iterrows():
-                lon = float(row.get('longitude') or row.get('lon') or 0.0)
-                lat = float(row.get('latitude') or row.get('lat') or 0.0)
-                db.add(YieldObservation(
-                    crop_id="Maize", 
-                    year=int(row.get('year', 2024)),
-                    yield_value=float(row.get('yield_value', 0.0)),
-                    ndvi_mean=row.get('ndvi'), 
-                    precip_mean=row.get('precip'),
-                    temp_mean=row.get('temp'), 
-                    geom=f"SRID=4326;POINT({lon} {lat})"
-                ))
+            stats = bulk_load_samples(
+                db, pd.read_csv(tmp_path, chunksize=BULK_BATCH_ROWS), rebuild_indexes=rebuild_indexes
+            )
+            records = int(stats["rows"])
+
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown table type: {table_type}")
         
         db.commit()
-        return {"status": "success", "message": f"Ingested/Merged {len(df)} records into {table_type}"}
+        return {"status": "success", "message": f"Ingested/Merged {records} records into {table_type}", **stats}
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         logger.error(f"CSV Ingestion failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
 
 @app.get("/v1/rasters")
 def list_rasters(db: Session = Depends(get_db)):
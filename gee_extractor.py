@@ -1,121 +1,355 @@
-import ee
-import geemap
+"""
+Parallel, checkpointed Earth Engine extraction driver.
+
+Builds one annual multi-band image per season year server-side (NDVI, ERA5-
+Land precipitation/temperature, MODIS ET, SRTM elevation, soil texture),
+reduces it over many wards or points with one reduceRegions call per shard,
+and writes every finished shard to its own Parquet checkpoint. Shards run
+concurrently under a fixed request budget with retries on transient Earth
+Engine errors; reruns skip shards that already have a checkpoint, and
+--post sends the unposted ones to DIS's CSV ingest endpoint.
+
+    python gee_extractor.py --wards wards.geojson --years 2019-2024 --post
+    python gee_extractor.py --points fields.csv --years 2024 --post
+    python gee_extractor.py --stub --benchmark 2000 --years 2019-2024
+"""
+import io
+import os
+import sys
+import json
+import glob
+import time
+import random
+import hashlib
+import logging
+import argparse
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
 import pandas as pd
-import geopandas as gpd
-from shapely.geometry import Point
-
-# --- 1. INITIALIZATION AND BOUNDARY DEFINITION ---
-try:
-    ee.Initialize()
-except Exception as e:
-    print(f"GEE Initialization failed. Please run 'earthengine authenticate'. Error: {e}")
-    exit()
-
-# Define the Area of Interest (Nakuru County, Kenya)
-# For simplicity, we will use a rough bounding box or a pre-defined GEE feature collection.
-# For this example, we'll use a rough point and buffer.
-NAKURU_CENTER = Point(36.07, -0.30) # Approximate center of Nakuru
-NAKURU_BUFFER_KM = 50 # 50km radius for a large area
-NAKURU_AOI = NAKURU_CENTER.buffer(NAKURU_BUFFER_KM / 111.32).envelope # Convert km to degrees
-
-# Convert to GEE Geometry
-nakuru_ee_geom = ee.Geometry.Polygon(list(NAKURU_AOI.exterior.coords))
-
-# --- 2. DATA ACQUISITION PARAMETERS ---
-START_DATE = '2020-01-01'
-END_DATE = '2021-12-31'
-SCALE = 30 # Resolution in meters (Sentinel-2 is 10m, but 30m is safer for large area)
-
-# --- 3. SENTINEL-2 (NDVI) DATA EXTRACTION ---
+import requests
+from shapely.geometry import mapping, shape
+
+logger = logging.getLogger(__name__)
+
+DIS_URL = os.getenv("DIS_URL", "http://localhost:8002")
+GEE_CHECKPOINT_DIR = os.getenv("GEE_CHECKPOINT_DIR", "gee_checkpoints")
+# Concurrent getInfo calls; Earth Engine's default quota is 40 per project
+GEE_WORKERS = int(os.getenv("GEE_WORKERS", "8"))
+GEE_SHARD_SIZE = int(os.getenv("GEE_SHARD_SIZE", "100"))
+GEE_MAX_RETRIES = int(os.getenv("GEE_MAX_RETRIES", "5"))
+# Completed shards sent to DIS per CSV upload
+GEE_POST_SHARDS = int(os.getenv("GEE_POST_SHARDS", "50"))
+
+SCALE = 30                  # Reduction resolution in meters
+TILE_SCALE = 4              # Trades speed for memory on large ward polygons
+SIMPLIFY_DEG = 0.0005       # ~50 m; ward outlines only need to cover the right pixels
+
+# Column names accepted by DIS /v1/ingest/csv/{wards,samples}
+MEAN_BANDS = ['ndvi_mean', 'precip_mean', 'temp_mean', 'et_mean', 'elevation_mean']
+MODE_BANDS = ['soil_texture']
+
+ee: Any = None
+
+def init_ee(stub: bool = False) -> Any:
+    """Imports and initializes the Earth Engine client (or the offline stub)."""
+    global ee
+    if stub:
+        import gee_stub as module
+    else:
+        import ee as module
+        try:
+            module.Initialize()
+        except Exception as e:
+            print(f"GEE Initialization failed. Please run 'earthengine authenticate'. Error: {e}")
+            sys.exit(1)
+    ee = module
+    return ee
+
+# --- 1. EXTRACTION UNITS ---
+class Unit(NamedTuple):
+    """One ward or point: id, GeoJSON geometry and properties passed through to DIS."""
+    unit_id: str
+    geometry: Dict[str, Any]
+    properties: Dict[str, Any]
+
+class Shard(NamedTuple):
+    shard_id: str
+    year: int
+    units: List[Unit]
+
+def load_wards(path: str) -> List[Unit]:
+    """Ward polygons from a GeoJSON FeatureCollection (Kenya GAUL or DIS attribute names)."""
+    with open(path) as f:
+        features = json.load(f)["features"]
+    units = []
+    for feature in features:
+        props = feature.get("properties") or {}
+        ward_id = props.get('ADM2_PCODE') or props.get('ward_id') or props.get('id')
+        geom = shape(feature["geometry"]).simplify(SIMPLIFY_DEG, preserve_topology=True)
+        units.append(Unit(str(ward_id), mapping(geom), {
+            'ward_id': str(ward_id),
+            'ward_name': props.get('ADM2_EN') or props.get('ward_name') or props.get('name'),
+            'county_name': props.get('ADM1_EN') or props.get('county_name') or "Unknown",
+        }))
+    return units
+
+def load_points(path: str) -> List[Unit]:
+    """Field points from a CSV with lon/lat (or longitude/latitude); other columns pass through."""
+    df = pd.read_csv(path)
+    df = df.rename(columns={'longitude': 'lon', 'latitude': 'lat'})
+    units = []
+    for row in df.to_dict('records'):
+        lon, lat = float(row['lon']), float(row['lat'])
+        unit_id = str(row.get('id') or f"{lon:.6f}_{lat:.6f}")
+        props = {k: v for k, v in row.items() if k != 'year' and not pd.isna(v)}
+        units.append(Unit(unit_id, {"type": "Point", "coordinates": [lon, lat]}, props))
+    return units
+
+def parse_years(spec: str) -> List[int]:
+    """'2019-2024' or '2020,2022' -> list of years."""
+    years: List[int] = []
+    for part in spec.split(','):
+        start, _, end = part.partition('-')
+        years.extend(range(int(start), int(end or start) + 1))
+    return sorted(set(years))
+
+def make_shards(units: List[Unit], years: List[int], shard_size: int) -> List[Shard]:
+    """
+    (year, chunk of units) shards. The id hashes the unit ids, so a changed
+    input gets new checkpoints instead of reusing stale ones.
+    """
+    shards = []
+    for year in years:
+        for idx, start in enumerate(range(0, len(units), shard_size)):
+            chunk = units[start:start + shard_size]
+            digest = hashlib.sha1("|".join(u.unit_id for u in chunk).encode()).hexdigest()[:8]
+            shards.append(Shard(f"y{year}_s{idx:05d}_{digest}", year, chunk))
+    return shards
+
+# --- 2. ANNUAL PREDICTOR IMAGE ---
 def add_ndvi(image):
     """Calculates and adds the Normalized Difference Vegetation Index (NDVI)."""
     # Bands: B4 (Red), B8 (NIR)
     ndvi = image.normalizedDifference(['B8', 'B4']).rename('NDVI')
     return image.addBands(ndvi)
 
-s2_collection = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-    .filterDate(START_DATE, END_DATE) \
-    .filterBounds(nakuru_ee_geom) \
-    .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 10)) \
-    .map(add_ndvi)
-
-# Function to extract time series for a single point
-def extract_time_series_at_point(point_lon, point_lat, collection, band_name):
-    point_ee = ee.Geometry.Point(point_lon, point_lat)
-    
-    # Extract values for the point
-    data = collection.getRegion(point_ee, SCALE).getInfo()
-    
-    # Convert to Pandas DataFrame
-    header = data[0]
-    df = pd.DataFrame(data[1:], columns=header)
-    
-    # Filter for the band and clean up
-    df = df[['time', band_name]]
-    df = df.rename(columns={'time': 'date', band_name: band_name.lower()})
-    df['date'] = pd.to_datetime(df['date'].str[:10])
-    df = df.dropna()
-    
-    return df
-
-# --- 4. ERA5-LAND (WEATHER) DATA EXTRACTION ---
-# Example: Extracting 2m air temperature (t2m)
-era5_collection = ee.ImageCollection('ECMWF/ERA5_LAND/HOURLY') \
-    .filterDate(START_DATE, END_DATE) \
-    .filterBounds(nakuru_ee_geom) \
-    .select('temperature_2m')
-
-# Function to extract weather data (requires aggregation, here we'll use monthly mean)
-def extract_weather_data(collection, band_name):
-    def monthly_mean(year, month):
-        start = ee.Date.fromYMD(year, month, 1)
-        end = start.advance(1, 'month')
-        
-        # Filter to the month and calculate mean
-        mean_image = collection.filterDate(start, end).mean()
-        
-        # Extract mean value over the AOI
-        stats = mean_image.reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=nakuru_ee_geom,
-            scale=SCALE
+def annual_image(year: int) -> Tuple[Any, Any]:
+    """(continuous bands image, soil texture image) for one season year, built server-side."""
+    start, end = f"{year}-01-01", f"{year + 1}-01-01"
+
+    ndvi = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
+        .filterDate(start, end) \
+        .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 10)) \
+        .map(add_ndvi) \
+        .select('NDVI') \
+        .mean() \
+        .rename('ndvi_mean')
+
+    # Daily aggregates replace the per-month hourly means: one mean() per year
+    era5 = ee.ImageCollection('ECMWF/ERA5_LAND/DAILY_AGGR').filterDate(start, end)
+    precip = era5.select('total_precipitation_sum').mean().multiply(1000).rename('precip_mean')  # m -> mm/day
+    temp = era5.select('temperature_2m').mean().subtract(273.15).rename('temp_mean')             # K -> C
+
+    # MOD16A2 ET is kg/m2 per 8 days, scaled by 0.1; et_mean stays in mm per 8-day composite
+    et = ee.ImageCollection('MODIS/061/MOD16A2') \
+        .filterDate(start, end) \
+        .select('ET') \
+        .mean() \
+        .multiply(0.1) \
+        .rename('et_mean')
+
+    elevation = ee.Image('USGS/SRTMGL1_003').select('elevation').rename('elevation_mean')
+    texture = ee.Image('OpenLandMap/SOL/SOL_TEXTURE-CLASS_USDA-TT_M/v02').select('b0').rename('soil_texture')
+
+    return ee.Image.cat([ndvi, precip, temp, et, elevation]), texture
+
+# --- 3. SHARD EXTRACTION ---
+def reduce_shard(shard: Shard) -> pd.DataFrame:
+    """One getInfo round trip: mean of the continuous bands, then mode of texture, per unit."""
+    continuous, texture = annual_image(shard.year)
+    fc = ee.FeatureCollection([
+        ee.Feature(ee.Geometry(u.geometry), {'unit_id': u.unit_id}) for u in shard.units
+    ])
+    reduced = continuous.reduceRegions(collection=fc, reducer=ee.Reducer.mean(), scale=SCALE, tileScale=TILE_SCALE)
+    reduced = texture.reduceRegions(
+        collection=reduced, reducer=ee.Reducer.mode().setOutputs(MODE_BANDS), scale=250, tileScale=TILE_SCALE
+    )
+    info = reduced.getInfo()
+
+    stats = {f['properties']['unit_id']: f['properties'] for f in info['features']}
+    rows = []
+    for u in shard.units:
+        values = stats.get(u.unit_id, {})
+        row = dict(u.properties)
+        row['year'] = shard.year
+        for band in MEAN_BANDS + MODE_BANDS:
+            row[band] = values.get(band)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+# Quota, concurrency and timeout errors clear on retry; bad geometries or
+# "User memory limit exceeded" do not. Whole phrases, so e.g. "generate" or
+# "accurate" in an unrelated message never reads as a rate limit.
+TRANSIENT_ERRORS = (
+    'too many concurrent aggregations', 'too many requests', 'quota exceeded', 'rate limit',
+    'computation timed out', 'deadline exceeded', 'internal error', 'service unavailable',
+    'http 429', 'http 503', 'status 429', 'status 503'
+)
+
+def _transient(e: Exception) -> bool:
+    message = str(e).lower()
+    return any(s in message for s in TRANSIENT_ERRORS)
+
+def extract_shard(shard: Shard, out_dir: str) -> Tuple[str, int, int]:
+    """Reduces one shard with retries and checkpoints it; returns (shard_id, rows, retries)."""
+    for attempt in range(GEE_MAX_RETRIES + 1):
+        try:
+            df = reduce_shard(shard)
+            break
+        except Exception as e:
+            if attempt == GEE_MAX_RETRIES or not _transient(e):
+                raise
+            # Exponential backoff with jitter so throttled workers don't retry in lockstep
+            time.sleep(min(60.0, 2 ** attempt) * (0.5 + random.random()))
+    path = os.path.join(out_dir, f"{shard.shard_id}.parquet")
+    tmp_path = f"{path}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)  # A checkpoint exists only once it is complete
+    return shard.shard_id, len(df), attempt
+
+def completed_shards(out_dir: str) -> set:
+    return {os.path.basename(p)[:-len(".parquet")] for p in glob.glob(os.path.join(out_dir, "*.parquet"))}
+
+def run_extraction(shards: List[Shard], out_dir: str, workers: int = GEE_WORKERS) -> Dict[str, int]:
+    """Runs every shard without a checkpoint, at most `workers` requests in flight."""
+    os.makedirs(out_dir, exist_ok=True)
+    done_ids = completed_shards(out_dir)
+    todo = [s for s in shards if s.shard_id not in done_ids]
+    counts = {"shards": len(shards), "skipped": len(shards) - len(todo), "extracted": 0, "failed": 0, "rows": 0, "retries": 0}
+    logger.info(f"{len(shards)} shards, {counts['skipped']} already checkpointed.")
+
+    started = time.perf_counter()
+    queue: Iterator[Shard] = iter(todo)
+    inflight: Dict[Future, Shard] = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # Sliding window: keeps the request budget full without queuing every shard up front
+            while len(inflight) < workers * 2:
+                shard = next(queue, None)
+                if shard is None:
+                    break
+                inflight[pool.submit(extract_shard, shard, out_dir)] = shard
+            if not inflight:
+                break
+            done, _ = wait(list(inflight), return_when=FIRST_COMPLETED)
+            for future in done:
+                shard = inflight.pop(future)
+                if future.exception() is not None:
+                    counts["failed"] += 1
+                    logger.warning(f"Shard {shard.shard_id} failed: {future.exception()}")
+                    continue
+                _, rows, retries = future.result()
+                counts["extracted"] += 1
+                counts["rows"] += rows
+                counts["retries"] += retries
+            finished = counts["extracted"] + counts["failed"]
+            if finished and finished % 50 == 0 and done:
+                elapsed = time.perf_counter() - started
+                logger.info(f"GEE extraction: {finished}/{len(todo)} shards, {counts['extracted'] / elapsed:.1f} shards/s.")
+    return counts
+
+# --- 4. POSTING TO DIS ---
+def post_to_dis(out_dir: str, table_type: str, dis_url: str = DIS_URL) -> int:
+    """
+    Uploads checkpointed shards that have no .posted marker as CSV batches.
+    Sample inserts are not idempotent, so markers keep reruns from duplicating rows.
+    """
+    pending = sorted(
+        p for p in glob.glob(os.path.join(out_dir, "*.parquet")) if not os.path.exists(f"{p}.posted")
+    )
+    posted = 0
+    for start in range(0, len(pending), GEE_POST_SHARDS):
+        batch = pending[start:start + GEE_POST_SHARDS]
+        df = pd.concat([pd.read_parquet(p) for p in batch], ignore_index=True)
+        buf = io.BytesIO(df.to_csv(index=False).encode())
+        response = requests.post(
+            f"{dis_url}/v1/ingest/csv/{table_type}",
+            files={'file': (f"gee_{table_type}.csv", buf, 'text/csv')},
+            timeout=600
         )
-        
-        return ee.Feature(None, {
-            'date': start.format('YYYY-MM-dd'),
-            band_name: stats.get(band_name)
-        })
-
-    # Create a list of all year/month combinations
-    dates = [
-        (y, m) for y in range(2020, 2022) for m in range(1, 13)
-    ]
-    
-    features = [monthly_mean(y, m) for y, m in dates]
-    
-    # Convert to FeatureCollection and then to Pandas DataFrame
-    fc = ee.FeatureCollection(features)
-    df = geemap.ee_to_pandas(fc)
-    df = df.rename(columns={band_name: band_name.lower()})
-    df['date'] = pd.to_datetime(df['date'])
-    return df.dropna()
-
-# --- 5. EXECUTION EXAMPLE ---
+        if response.status_code != 200:
+            raise RuntimeError(f"DIS rejected batch ({response.status_code}): {response.text[:500]}")
+        for p in batch:
+            open(f"{p}.posted", 'w').close()
+        posted += len(df)
+        logger.info(f"Posted {len(df)} rows from {len(batch)} shards to DIS {table_type}.")
+    return posted
+
+# --- 5. OFFLINE BENCHMARK ---
+def synthetic_wards(n: int) -> List[Unit]:
+    """n small square wards tiled over Trans Nzoia, for stub benchmarks."""
+    units = []
+    for i in range(n):
+        lon, lat = 34.7 + (i % 50) * 0.01, 0.9 + (i // 50) * 0.01
+        geom = {"type": "Polygon", "coordinates": [[
+            [lon, lat], [lon + 0.01, lat], [lon + 0.01, lat + 0.01], [lon, lat + 0.01], [lon, lat]
+        ]]}
+        units.append(Unit(f"BENCH{i:06d}", geom, {'ward_id': f"BENCH{i:06d}", 'ward_name': f"Ward {i}", 'county_name': "Trans Nzoia"}))
+    return units
+
+def benchmark(n_units: int, years: List[int], out_dir: str, workers: int, shard_size: int):
+    import gee_stub
+    shards = make_shards(synthetic_wards(n_units), years, shard_size)
+
+    started = time.perf_counter()
+    first = run_extraction(shards, out_dir, workers)
+    elapsed = time.perf_counter() - started
+    print(f"cold: {first['extracted']} shards ({first['rows']} rows) in {elapsed:.2f}s "
+          f"= {first['extracted'] / elapsed:.1f} shards/s, {first['retries']} retries, {first['failed']} failed, "
+          f"{gee_stub.calls} getInfo calls ({gee_stub.rejected} over quota)")
+
+    started = time.perf_counter()
+    second = run_extraction(shards, out_dir, workers)
+    print(f"rerun: {second['skipped']}/{second['shards']} shards skipped, "
+          f"{second['extracted']} extracted in {time.perf_counter() - started:.2f}s")
+
+# --- 6. EXECUTION ---
+def main():
+    parser = argparse.ArgumentParser(description="Extract GEE predictors for wards or points and post them to DIS.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--wards', help="Ward boundaries GeoJSON")
+    source.add_argument('--points', help="CSV of field points (lon, lat, optional yield_value)")
+    source.add_argument('--benchmark', type=int, metavar='N', help="Benchmark N synthetic wards (implies --stub)")
+    parser.add_argument('--years', default="2024", help="e.g. 2019-2024 or 2020,2022")
+    parser.add_argument('--out', default=GEE_CHECKPOINT_DIR, help="Checkpoint directory")
+    parser.add_argument('--workers', type=int, default=GEE_WORKERS)
+    parser.add_argument('--shard-size', type=int, default=GEE_SHARD_SIZE)
+    parser.add_argument('--post', action='store_true', help="Post unposted checkpoints to DIS")
+    parser.add_argument('--dis-url', default=DIS_URL)
+    parser.add_argument('--stub', action='store_true', help="Use the offline gee_stub client")
+    args = parser.parse_args()
+
+    init_ee(stub=args.stub or args.benchmark is not None)
+    years = parse_years(args.years)
+    if args.benchmark is not None:
+        benchmark(args.benchmark, years, args.out, args.workers, args.shard_size)
+        return
+    if not (args.wards or args.points):
+        parser.error("one of --wards, --points or --benchmark is required")
+
+    units = load_wards(args.wards) if args.wards else load_points(args.points)
+    shards = make_shards(units, years, args.shard_size)
+    counts = run_extraction(shards, args.out, args.workers)
+    print(f"{counts['extracted']} shards extracted ({counts['rows']} rows), {counts['skipped']} skipped, "
+          f"{counts['failed']} failed, {counts['retries']} retries")
+
+    if args.post:
+        if counts["failed"]:
+            logger.warning(f"{counts['failed']} shards failed; posting the completed ones only. Rerun to retry the rest.")
+        posted = post_to_dis(args.out, 'wards' if args.wards else 'samples', args.dis_url)
+        print(f"{posted} rows posted to DIS")
+
 if __name__ == '__main__':
-    # Example point (replace with your actual field coordinates)
-    FIELD_LON, FIELD_LAT = 36.07, -0.30 
-    
-    print("--- 1. Extracting Sentinel-2 NDVI Time Series ---")
-    ndvi_df = extract_time_series_at_point(FIELD_LON, FIELD_LAT, s2_collection, 'NDVI')
-    print(f"NDVI Data Points: {len(ndvi_df)}")
-    
-    print("\n--- 2. Extracting ERA5 Temperature Data ---")
-    temp_df = extract_weather_data(era5_collection, 'temperature_2m')
-    print(f"Temperature Data Points: {len(temp_df)}")
-    
-    # Save the data for local processing and model training
-    ndvi_df.to_csv('ndvi_time_series.csv', index=False)
-    temp_df.to_csv('era5_temp_data.csv', index=False)
-    
-    print("\nData extraction complete. Files saved: ndvi_time_series.csv, era5_temp_data.csv")
-    print("You can now use these files to update your train.py script.")
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,181 @@
+"""
+Offline stand-in for the parts of the `ee` client used by gee_extractor.py.
+
+Image/collection chains are accepted and only their band names tracked;
+reduceRegions(...).getInfo() returns deterministic pseudo-values per
+feature and year after a simulated round-trip latency. Like Earth Engine
+it rejects calls beyond a concurrency limit ("Too many concurrent
+aggregations") and fails a fraction of calls at random, so the driver's
+batching, retries and checkpointing can be benchmarked without an account.
+
+    python gee_extractor.py --stub --benchmark 2000 --years 2019-2024
+"""
+import json
+import time
+import random
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+# Simulated service behaviour, tweakable by the benchmark
+LATENCY_S = 0.25            # fixed cost of one getInfo round trip
+PER_FEATURE_S = 0.002       # server time per reduced feature
+MAX_CONCURRENT = 40         # Earth Engine's default concurrent-request quota
+FAILURE_RATE = 0.02         # transient "Computation timed out" errors
+
+_active = 0
+_active_lock = threading.Lock()
+calls = 0
+rejected = 0
+
+class EEException(Exception):
+    pass
+
+def Initialize(*args, **kwargs):
+    pass
+
+def _value(seed: str, lo: float, hi: float) -> float:
+    h = int(hashlib.sha1(seed.encode()).hexdigest()[:8], 16)
+    return lo + (hi - lo) * (h / 0xFFFFFFFF)
+
+# Pseudo-value ranges per output band (Trans Nzoia-like)
+_RANGES = {
+    'ndvi_mean': (0.2, 0.8), 'precip_mean': (1.0, 8.0), 'temp_mean': (16.0, 26.0),
+    'et_mean': (15.0, 25.0), 'elevation_mean': (1500.0, 2500.0), 'soil_texture': (1, 12),
+}
+
+class _Chain:
+    """Any method call returns a copy carrying the same band names."""
+    def __init__(self, bands: Optional[List[str]] = None, year: Optional[int] = None):
+        self.bands = list(bands or [])
+        self.year = year
+
+    def _copy(self, **changes) -> "_Chain":
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__, **changes)
+        return clone
+
+    def __getattr__(self, name: str):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._copy()
+
+    def filterDate(self, start: Any, end: Any = None) -> "_Chain":
+        year = start.year if isinstance(start, Date) else int(str(start)[:4])
+        return self._copy(year=year)
+
+    def rename(self, *names: Any) -> "_Chain":
+        flat = names[0] if len(names) == 1 and isinstance(names[0], (list, tuple)) else names
+        return self._copy(bands=list(flat))
+
+    def select(self, *names: Any) -> "_Chain":
+        return self._copy()
+
+    def reduceRegions(self, collection: "FeatureCollection", reducer: "Reducer", scale: Any = None, **kwargs) -> "FeatureCollection":
+        outputs = reducer.outputs or self.bands
+        return FeatureCollection(collection.features, collection.computed + [(outputs, self.year)])
+
+class Image(_Chain):
+    def __init__(self, source: Any = None, year: Optional[int] = None):
+        if isinstance(source, _Chain):
+            super().__init__(source.bands, source.year)
+        else:
+            super().__init__(source if isinstance(source, list) else [], year)
+
+    @staticmethod
+    def cat(images: List[_Chain]) -> "Image":
+        bands = [b for img in images for b in img.bands]
+        year = next((img.year for img in images if img.year is not None), None)
+        return Image(bands, year)
+
+    @staticmethod
+    def constant(value: Any) -> "Image":
+        return Image()
+
+class ImageCollection(_Chain):
+    def __init__(self, name: Any = None, *args):
+        super().__init__()
+
+    def mean(self) -> Image:
+        return Image(self.bands, self.year)
+
+    def sum(self) -> Image:
+        return Image(self.bands, self.year)
+
+class Date:
+    def __init__(self, value: Any):
+        self.year = int(str(value)[:4])
+
+    @staticmethod
+    def fromYMD(year: int, month: int, day: int) -> "Date":
+        return Date(f"{year:04d}-{month:02d}-{day:02d}")
+
+    def advance(self, *args) -> "Date":
+        return self
+
+class Reducer(_Chain):
+    def __init__(self, outputs: Optional[List[str]] = None):
+        super().__init__()
+        self.outputs = outputs
+
+    @staticmethod
+    def mean() -> "Reducer":
+        return Reducer()
+
+    @staticmethod
+    def mode() -> "Reducer":
+        return Reducer()
+
+    def setOutputs(self, names: List[str]) -> "Reducer":
+        return Reducer(list(names))
+
+class Filter(_Chain):
+    @staticmethod
+    def lt(*args) -> "Filter":
+        return Filter()
+
+class Geometry(_Chain):
+    def __init__(self, geojson: Any = None, *args, **kwargs):
+        super().__init__()
+        self.geojson = geojson
+
+    @staticmethod
+    def Point(coords: Any, *args) -> "Geometry":
+        return Geometry({"type": "Point", "coordinates": list(coords)})
+
+class Feature:
+    def __init__(self, geometry: Any, properties: Optional[Dict[str, Any]] = None):
+        self.geometry = geometry
+        self.properties = dict(properties or {})
+
+class FeatureCollection:
+    def __init__(self, features: List[Feature], computed: Optional[List[Any]] = None):
+        self.features = list(features)
+        self.computed = list(computed or [])
+
+    def getInfo(self) -> Dict[str, Any]:
+        global _active, calls, rejected
+        with _active_lock:
+            calls += 1
+            if _active >= MAX_CONCURRENT:
+                rejected += 1
+                raise EEException("Too many concurrent aggregations.")
+            _active += 1
+        try:
+            time.sleep(LATENCY_S + PER_FEATURE_S * len(self.features))
+            if random.random() < FAILURE_RATE:
+                raise EEException("Computation timed out.")
+            out = []
+            for feature in self.features:
+                props = dict(feature.properties)
+                geom_key = json.dumps(getattr(feature.geometry, 'geojson', None), sort_keys=True)[:200]
+                for bands, year in self.computed:
+                    for band in bands:
+                        lo, hi = _RANGES.get(band, (0.0, 1.0))
+                        value = _value(f"{geom_key}|{band}|{year}", lo, hi)
+                        props[band] = float(round(value)) if band == 'soil_texture' else value
+                out.append({"type": "Feature", "geometry": None, "properties": props})
+            return {"type": "FeatureCollection", "features": out}
+        finally:
+            with _active_lock:
+                _active -= 1
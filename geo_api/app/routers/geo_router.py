@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from typing import List, Optional, Any, Dict, cast
+from sqlalchemy.exc import SQLAlchemyError
+from typing import List, Optional, Any, Callable, Dict, cast
 from datetime import datetime
+import os
 import logging
 
 # GIS Libraries for geometry conversion
@@ -13,45 +17,110 @@ from geoalchemy2.elements import WKBElement
 # Internal shared imports
 from shared.database.base import get_db
 from shared.database import models 
-from shared.models.api_models import QueryPointRequest, QueryPointResponse, Feature, TimeSeriesData
+from shared.database.versions import get_version, AUXILIARY_DATA
+from shared.database.aggregates import live_county_year_stats
+from shared.models.api_models import QueryPointRequest, QueryPointsRequest, QueryPointResponse, Feature, TimeSeriesData
 
 # App-specific imports
-from app.utils.db_utils import get_auxiliary_data_at_point, get_raster_assets_by_bbox
-from app.utils.geospatial import extract_features_from_stack, call_ml_api
+from app.utils.db_utils import (
+    get_auxiliary_data_at_point, get_raster_assets_by_bbox,
+    get_auxiliary_data_at_points, get_predictor_stacks_for_points, get_asset_generations
+)
+from app.utils.geospatial import extract_features_from_stack, extract_features_from_stack_batch
+from app.utils.ml_client import call_ml_api_async, call_ml_api_batch, MLResponseError
+from app.utils.http_cache import make_etag, cached_response, cache_headers, etag_matches, not_modified
+from app.utils.vector_tiles import render_boundary_tile, valid_tile, TILE_MAX_AGE
+from app.utils.discovery_cache import discovery_memo
 
 # Set up logging
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Discovery lists are revalidated often; the ETag makes that a 304
+DISCOVERY_MAX_AGE = int(os.getenv("DISCOVERY_MAX_AGE_S", "60"))
+
+# Used when no PredictorStack covers the requested point
+DEFAULT_FEATURES: Dict[str, float] = {
+    "ndvi_mean": 0.52, "precip_mean": 5.1, "et_mean": 3.8,
+    "elevation_mean": 1850.0, "soil_texture": 2.0, "temp_mean": 21.5
+}
+
+def _date_range_dict(date_range: Any) -> Dict[str, Any]:
+    if hasattr(date_range, "model_dump"):
+        return date_range.model_dump()
+    return date_range.dict()
+
+def _apply_auxiliary(features_dict: Dict[str, float], aux_data: Any) -> None:
+    features_dict.update({
+        'soil_texture': float(cast(Any, getattr(aux_data, 'soil_texture', 2.0))), 
+        'elevation_mean': float(cast(Any, getattr(aux_data, 'elevation_m', 1850.0)))
+    })
+
+def _build_point_response(features_dict: Dict[str, float], predicted_yield: float) -> QueryPointResponse:
+    features_list = [Feature(name=str(k), value=float(v)) for k, v in features_dict.items()]
+
+    ts_date = datetime(2024, 1, 1) 
+    time_series = [TimeSeriesData(date=ts_date, value=float(features_dict.get("ndvi_mean", 0.0)))]
+    
+    return QueryPointResponse(
+        predicted_yield=float(predicted_yield), 
+        features=features_list, 
+        time_series=time_series
+    )
+
+def _load_counties(db: Session) -> List[Dict[str, Any]]:
+    # We use ST_Extent to find the bounding box of the whole county 
+    # and ST_Centroid to find the middle point.
+    results = db.query(
+        models.AuxiliaryData.county_name,
+        func.ST_Y(func.ST_Centroid(func.ST_Extent(models.AuxiliaryData.geom))),
+        func.ST_X(func.ST_Centroid(func.ST_Extent(models.AuxiliaryData.geom)))
+    ).group_by(models.AuxiliaryData.county_name).all()
+    return [{"name": r[0], "center": [r[1], r[2]]} for r in results if r[0]]
+
+def _load_years(db: Session) -> List[int]:
+    years = db.query(models.AuxiliaryData.year).distinct().order_by(models.AuxiliaryData.year.desc()).all()
+    return [y[0] for y in years if y[0]]
+
+def _discovery_response(request: Request, db: Session, key: str, loader: Callable[[Session], Any]) -> Response:
+    """
+    Serves a discovery list from the in-process memo, keyed on the auxiliarydata
+    version DIS bumps on every ingestion. Repeat loads revalidate to a 304.
+    Without a readable version (e.g. no dataversion table on a database that
+    has not run upgrade_postgis.sql) the list is queried live and not cached.
+    """
+    try:
+        version = get_version(db, AUXILIARY_DATA)
+    except SQLAlchemyError as e:
+        logger.warning(f"Data version unavailable, serving {key} uncached: {e}")
+        db.rollback()
+        return JSONResponse(loader(db), headers={"Cache-Control": "no-store"})
+    etag = make_etag(key, version)
+    if etag_matches(request, etag):
+        return not_modified(etag, DISCOVERY_MAX_AGE)
+    payload = discovery_memo.get(key, version, lambda: loader(db))
+    return JSONResponse(payload, headers=cache_headers(etag, DISCOVERY_MAX_AGE))
+
 @router.get("/counties")
-def get_available_counties(db: Session = Depends(get_db)):
+def get_available_counties(request: Request, db: Session = Depends(get_db)):
     """
     DYNAMIC DISCOVERY: Returns all counties currently in PostGIS 
     and calculates their geographic center for map FlyTo logic.
     """
     try:
-        # We use ST_Extent to find the bounding box of the whole county 
-        # and ST_Centroid to find the middle point.
-        results = db.query(
-            models.AuxiliaryData.county_name,
-            func.ST_Y(func.ST_Centroid(func.ST_Extent(models.AuxiliaryData.geom))),
-            func.ST_X(func.ST_Centroid(func.ST_Extent(models.AuxiliaryData.geom)))
-        ).group_by(models.AuxiliaryData.county_name).all()
-        
-        return [{"name": r[0], "center": [r[1], r[2]]} for r in results if r[0]]
+        return _discovery_response(request, db, "counties", _load_counties)
     except Exception as e:
         logger.error(f"County discovery failed: {e}")
-        return []
+        raise HTTPException(status_code=500, detail="County discovery failed")
 
 @router.get("/years")
-def get_available_years(db: Session = Depends(get_db)):
+def get_available_years(request: Request, db: Session = Depends(get_db)):
     """Discovery: Returns all production years available in the database."""
     try:
-        years = db.query(models.AuxiliaryData.year).distinct().order_by(models.AuxiliaryData.year.desc()).all()
-        return [y[0] for y in years if y[0]]
+        return _discovery_response(request, db, "years", _load_years)
     except Exception as e:
         logger.error(f"Year discovery failed: {e}")
-        return []
+        raise HTTPException(status_code=500, detail="Year discovery failed")
 
 @router.get("/regions")
 def get_regions(county: Optional[str] = None, year: int = Query(2024), db: Session = Depends(get_db)):
@@ -100,11 +169,63 @@ def get_regions(county: Optional[str] = None, year: int = Query(2024), db: Sessi
         logger.error(f"Failed to fetch regions: {e}")
         return []
 
+@router.get("/tiles/{z}/{x}/{y}.mvt")
+def get_boundary_tile(
+    z: int, x: int, y: int, request: Request,
+    county: Optional[str] = None, year: int = Query(2024),
+    db: Session = Depends(get_db)
+):
+    """
+    Ward boundaries as Mapbox Vector Tiles (layer 'wards'), simplified per zoom.
+    The ETag is derived from the boundary data version, so revalidation
+    returns 304 without rendering the tile.
+    """
+    if not valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+
+    etag = make_etag("wards", z, x, y, year, county, get_version(db, AUXILIARY_DATA))
+    if etag_matches(request, etag):
+        return not_modified(etag, TILE_MAX_AGE)
+
+    tile = render_boundary_tile(db, z, x, y, year, county)
+    return cached_response(
+        request, etag, TILE_MAX_AGE, content=tile, media_type="application/vnd.mapbox-vector-tile"
+    )
+
+# (label, variable, decimals, description) for the ward biophysical signature
+SIGNATURE_VARIABLES = [
+    ("NDVI (Biomass)", "ndvi", 3, "Vegetation vigor vs County mean."),
+    ("Precipitation (mm)", "precip", 2, "Rainfall flux from CHIRPS."),
+    ("Temperature (°C)", "temp", 1, "Surface temperature from ERA5."),
+    ("Evapotranspiration (mm)", "et", 2, "Evapotranspiration vs County mean."),
+]
+FALLBACK_NDVI_BASELINE = 0.48
+
+def _county_stats(db: Session, county_name: Any, year: int) -> Optional[Any]:
+    """
+    Aggregate row for the ward's county/year. DIS writes these; until it
+    has (e.g. before its startup backfill ran) they are computed read-only.
+    """
+    stats = db.get(models.CountyYearStats, (county_name, year))
+    if stats is not None:
+        return stats
+    try:
+        return live_county_year_stats(db, county_name, year)
+    except Exception as e:
+        logger.error(f"Live county stats failed for {county_name}/{year}: {e}")
+        return None
+
+def _anomaly(value: float, mean: Optional[float], std: Optional[float]) -> Dict[str, Optional[float]]:
+    pct = ((value - mean) / mean) * 100 if mean else None
+    z = (value - mean) / std if mean is not None and std else None
+    return {"pct": pct, "z": z}
+
 @router.get("/regions/{ward_id}/stats")
 def get_ward_stats(ward_id: str, year: int = Query(2024), db: Session = Depends(get_db)):
     """
     Fetches stats for a specific ward in a specific year.
-    Calculates anomaly relative to the county average for that year.
+    Anomalies for every variable come from the precomputed county/year
+    aggregates (countyyearstats), so this is two primary-key lookups.
     """
     unit = db.query(models.AuxiliaryData).filter(
         models.AuxiliaryData.ward_id == ward_id,
@@ -114,14 +235,28 @@ def get_ward_stats(ward_id: str, year: int = Query(2024), db: Session = Depends(
     if not unit:
         raise HTTPException(status_code=404, detail="County unit data not found for this year")
 
-    # DYNAMIC BASELINE: Average of ALL wards in this County for the selected year
-    avg_county_ndvi = db.query(func.avg(models.AuxiliaryData.ndvi_mean)).filter(
-        models.AuxiliaryData.county_name == unit.county_name,
-        models.AuxiliaryData.year == year
-    ).scalar() or 0.48
-    
-    current_ndvi = float(cast(Any, unit.ndvi_mean) or 0)
-    ndvi_anomaly = ((current_ndvi - avg_county_ndvi) / avg_county_ndvi) * 100
+    county_stats = _county_stats(db, unit.county_name, year)
+
+    signature: Dict[str, Dict[str, Any]] = {}
+    ndvi_anomaly = 0.0
+    for label, var, decimals, desc in SIGNATURE_VARIABLES:
+        value = float(cast(Any, getattr(unit, f"{var}_mean")) or 0)
+        mean = getattr(county_stats, f"{var}_mean", None)
+        std = getattr(county_stats, f"{var}_std", None)
+        if var == "ndvi" and not mean:
+            mean = FALLBACK_NDVI_BASELINE
+        anomaly = _anomaly(value, mean, std)
+        if var == "ndvi":
+            ndvi_anomaly = anomaly["pct"] or 0.0
+        signature[label] = {
+            "val": round(value, decimals),
+            "dev": f"{round(anomaly['pct'], 1)}%" if anomaly["pct"] is not None else None,
+            "z": round(anomaly["z"], 2) if anomaly["z"] is not None else None,
+            "county_mean": round(mean, decimals) if mean is not None else None,
+            "county_p10": getattr(county_stats, f"{var}_p10", None),
+            "county_p90": getattr(county_stats, f"{var}_p90", None),
+            "desc": desc
+        }
 
     return {
         "name": unit.ward_name,
@@ -129,36 +264,13 @@ def get_ward_stats(ward_id: str, year: int = Query(2024), db: Session = Depends(
         "county": unit.county_name,
         "year": unit.year,
         "status": "Warning" if ndvi_anomaly < -15 else "Stable",
-        "biophysical_signature": {
-            "NDVI (Biomass)": {
-                "val": round(current_ndvi, 3), 
-                "dev": f"{round(ndvi_anomaly, 1)}%",
-                "desc": "Vegetation vigor vs County mean."
-            },
-            "Precipitation (mm)": {
-                "val": round(float(cast(Any, unit.precip_mean) or 0), 2),
-                "dev": None,
-                "desc": "Rainfall flux from CHIRPS."
-            },
-            "Temperature (°C)": {
-                "val": round(float(cast(Any, unit.temp_mean) or 0), 1),
-                "dev": None,
-                "desc": "Surface temperature from ERA5."
-            }
-        }
+        "biophysical_signature": signature
     }
 
-@router.post("/query/point", response_model=QueryPointResponse)
-def query_point(request: QueryPointRequest, db: Session = Depends(get_db)):
-    """
-    Queries a specific point and orchestrates the ML prediction.
-    """
+def _point_features(request: QueryPointRequest, db: Session) -> Dict[str, float]:
+    """Blocking DB + COG part of query_point, run off the event loop."""
     point = request.point
-    
-    if hasattr(request.date_range, "model_dump"):
-        date_range_dict = request.date_range.model_dump()
-    else:
-        date_range_dict = request.date_range.dict()
+    date_range_dict = _date_range_dict(request.date_range)
     
     assets: List[Any] = get_raster_assets_by_bbox(db, point, date_range_dict)
     stack_asset = next((a for a in assets if str(a.asset_type) == 'PredictorStack'), None)
@@ -168,37 +280,75 @@ def query_point(request: QueryPointRequest, db: Session = Depends(get_db)):
     if stack_asset:
         try:
             asset_url = str(stack_asset.asset_url)
-            features_dict = extract_features_from_stack(point, asset_url)
+            generation = get_asset_generations(db, [asset_url]).get(asset_url)
+            features_dict = extract_features_from_stack(point, asset_url, generation)
             
             aux_results = get_auxiliary_data_at_point(db, point)
             if aux_results and len(aux_results) > 0:
-                aux_data = aux_results[0]
-                features_dict.update({
-                    'soil_texture': float(cast(Any, getattr(aux_data, 'soil_texture', 2.0))), 
-                    'elevation_mean': float(cast(Any, getattr(aux_data, 'elevation_m', 1850.0)))
-                })
+                _apply_auxiliary(features_dict, aux_results[0])
         except Exception as e:
             logger.error(f"Error extracting features: {e}")
             raise HTTPException(status_code=500, detail="Spatial feature extraction failed")
     else:
-        features_dict = {
-            "ndvi_mean": 0.52, "precip_mean": 5.1, "et_mean": 3.8, 
-            "elevation_mean": 1850.0, "soil_texture": 2.0, "temp_mean": 21.5
-        }
+        features_dict = dict(DEFAULT_FEATURES)
+    return features_dict
 
-    features_list = [Feature(name=str(k), value=float(v)) for k, v in features_dict.items()]
-    
+@router.post("/query/point", response_model=QueryPointResponse)
+async def query_point(request: QueryPointRequest, db: Session = Depends(get_db)):
+    """
+    Queries a specific point and orchestrates the ML prediction.
+    The ML call is awaited on the shared pooled client.
+    """
+    features_dict = await run_in_threadpool(_point_features, request, db)
+    predicted_yield = await call_ml_api_async(features_dict)
+
+    return _build_point_response(features_dict, predicted_yield)
+
+@router.post("/query/points", response_model=List[QueryPointResponse])
+def query_points(request: QueryPointsRequest, db: Session = Depends(get_db)):
+    """
+    Batch version of /query/point for field-team uploads.
+    Points are grouped by their covering PredictorStack so each COG
+    is opened once and sampled in a single vectorized pass.
+    """
+    points = request.points
+    if not points:
+        return []
+
+    date_range_dict = _date_range_dict(request.date_range)
+    stacks: List[Any] = get_predictor_stacks_for_points(db, points, date_range_dict)
+
+    groups: Dict[str, List[int]] = {}
+    for i, stack_asset in enumerate(stacks):
+        if stack_asset is not None:
+            groups.setdefault(str(stack_asset.asset_url), []).append(i)
+
+    features_per_point: List[Dict[str, float]] = [dict(DEFAULT_FEATURES) for _ in points]
+
+    if groups:
+        try:
+            aux_per_point = get_auxiliary_data_at_points(db, points)
+            generations = get_asset_generations(db, list(groups))
+            for asset_url, indices in groups.items():
+                batch = extract_features_from_stack_batch(
+                    [points[i] for i in indices], asset_url, generations.get(asset_url)
+                )
+                for i, features_dict in zip(indices, batch):
+                    if aux_per_point[i] is not None:
+                        _apply_auxiliary(features_dict, aux_per_point[i])
+                    features_per_point[i] = features_dict
+        except Exception as e:
+            logger.error(f"Error extracting batch features: {e}")
+            raise HTTPException(status_code=500, detail="Spatial feature extraction failed")
+
+    # Attach coordinates so ml_api can resolve wards in one spatial join
+    ml_payload = [dict(f, lon=p.lon, lat=p.lat) for f, p in zip(features_per_point, points)]
     try:
-        predicted_yield = call_ml_api(features_dict)
-    except Exception as e:
-        logger.error(f"ML API call failed: {e}")
-        predicted_yield = 0.0
+        predicted_yields = call_ml_api_batch(ml_payload)
+    except MLResponseError as e:
+        raise HTTPException(status_code=502, detail=str(e))
 
-    ts_date = datetime(2024, 1, 1) 
-    time_series = [TimeSeriesData(date=ts_date, value=float(features_dict.get("ndvi_mean", 0.0)))]
-    
-    return QueryPointResponse(
-        predicted_yield=float(predicted_yield), 
-        features=features_list, 
-        time_series=time_series
-    )
\ No newline at end of file
+    return [
+        _build_point_response(features_dict, predicted_yield)
+        for features_dict, predicted_yield in zip(features_per_point, predicted_yields)
+    ]
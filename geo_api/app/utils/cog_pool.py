@@ -0,0 +1,133 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# GDAL/VSI tuning for COGs served over HTTP by MinIO. Set before the first
+# dataset is opened; anything already exported in the environment wins.
+GDAL_TUNING = {
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",      # no sidecar/listing requests on open
+    "CPL_VSIL_CURL_ALLOWED_EXTENSIONS": ".tif,.tiff",
+    "GDAL_INGESTED_BYTES_AT_OPEN": "32768",           # header + IFDs in a single range request
+    "VSI_CACHE": "TRUE",
+    "VSI_CACHE_SIZE": str(32 * 1024 * 1024),          # per open handle
+    "CPL_VSIL_CURL_CACHE_SIZE": str(128 * 1024 * 1024),
+    "GDAL_CACHEMAX": "256",
+    "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES",
+    "GDAL_HTTP_MULTIPLEX": "YES",
+    "GDAL_HTTP_VERSION": "2TLS",                      # HTTP/2 when TLS is available, else 1.1 keep-alive
+}
+for _key, _value in GDAL_TUNING.items():
+    os.environ.setdefault(_key, _value)
+
+from rio_tiler.io import COGReader  # noqa: E402  (must follow the GDAL env setup)
+
+COG_POOL_SIZE = int(os.getenv("COG_POOL_SIZE", "16"))
+
+def versioned_url(asset_url: str, generation: Optional[int]) -> str:
+    """
+    URL GDAL opens for one catalog generation of an asset. GDAL's vsicurl
+    cache is keyed by URL and outlives closed handles, so a re-ingested COG
+    at the same URL must be opened under a new one; MinIO ignores the
+    extra query parameter.
+    """
+    if generation is None or not asset_url.startswith(("http://", "https://")):
+        return asset_url
+    return f"{asset_url}{'&' if '?' in asset_url else '?'}gen={generation}"
+
+class PooledReader:
+    """
+    One open COG handle. GDAL handles are not safe for concurrent reads,
+    so a request holds `lock` for as long as it has the reader checked out.
+    """
+    def __init__(self, asset_url: str, generation: Optional[int] = None):
+        self.asset_url = asset_url
+        self.generation = generation
+        self.lock = threading.Lock()
+        self.cog: Optional[COGReader] = None
+        self.leases = 0
+        self.retired = False
+
+    @property
+    def dataset(self):
+        if self.cog is None:
+            self.cog = COGReader(input=versioned_url(self.asset_url, self.generation), options={})
+        return self.cog.dataset
+
+    def close(self):
+        if self.cog is not None:
+            self.cog.close()
+            self.cog = None
+
+class ReaderPool:
+    """
+    Process-wide LRU pool of open COG readers keyed by (asset URL, generation).
+    Warm lookups reuse the handle (and its VSI cache) instead of paying
+    for the TIFF header/IFD fetch again. Evicted or invalidated readers
+    are closed once their last lease is returned.
+    """
+    def __init__(self, max_handles: int):
+        self.max_handles = max_handles
+        self._readers: "OrderedDict[Tuple[str, Optional[int]], PooledReader]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.opens = 0
+        self.reuses = 0
+        self.evictions = 0
+
+    def checkout(self, asset_url: str, generation: Optional[int] = None) -> PooledReader:
+        key = (asset_url, generation)
+        with self._lock:
+            reader = self._readers.get(key)
+            if reader is None:
+                reader = PooledReader(asset_url, generation)
+                self._readers[key] = reader
+                self.opens += 1
+                self._evict_locked()
+            else:
+                self._readers.move_to_end(key)
+                self.reuses += 1
+            reader.leases += 1
+        # Opening happens lazily under the reader's own lock, never the pool lock
+        reader.lock.acquire()
+        return reader
+
+    def checkin(self, reader: PooledReader):
+        reader.lock.release()
+        with self._lock:
+            reader.leases -= 1
+            close_now = reader.retired and reader.leases == 0
+        if close_now:
+            reader.close()
+
+    def _evict_locked(self):
+        while len(self._readers) > self.max_handles:
+            _, oldest = self._readers.popitem(last=False)
+            self.evictions += 1
+            self._retire_locked(oldest)
+
+    def _retire_locked(self, reader: PooledReader):
+        reader.retired = True
+        if reader.leases == 0:
+            reader.close()
+
+    def invalidate(self, asset_url: str):
+        """Retires every generation's reader for the asset."""
+        with self._lock:
+            for key in [k for k in self._readers if k[0] == asset_url]:
+                self._retire_locked(self._readers.pop(key))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "open_handles": len(self._readers),
+                "max_handles": self.max_handles,
+                "in_use": sum(1 for r in self._readers.values() if r.leases),
+                "opens": self.opens,
+                "reuses": self.reuses,
+                "evictions": self.evictions
+            }
+
+reader_pool = ReaderPool(COG_POOL_SIZE)
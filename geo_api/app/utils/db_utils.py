@@ -1,26 +1,39 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from sqlalchemy import func, values, column, Integer, Float
+from typing import List, Dict, Optional, Any, cast
+from geoalchemy2.shape import to_shape
+from shapely.geometry import Point as ShapelyPoint
+from shapely.prepared import prep
 from shared.database.models import YieldObservation, AuxiliaryData, RasterAsset
 from shared.models.api_models import Point
 from datetime import datetime
 
+def _point_geography(point: Point):
+    return func.geography(func.ST_SetSRID(func.ST_MakePoint(point.lon, point.lat), 4326))
+
 def get_yield_observations_near_point(db: Session, point: Point, radius_km: float = 1.0) -> List[YieldObservation]:
     """
     Finds historical yield records near a clicked point.
+    Geodesic radius on geography(geom), which the yieldobservation_geog_idx
+    functional GIST index serves directly (no per-row transform).
     """
-    point_geom = func.ST_SetSRID(func.ST_MakePoint(point.lon, point.lat), 4326)
-    # Transform to 3857 (meters) for accurate radius search
-    point_geom_3857 = func.ST_Transform(point_geom, 3857)
-    
     return db.query(YieldObservation).filter(
-        func.ST_DWithin(
-            func.ST_Transform(YieldObservation.geom, 3857), 
-            point_geom_3857, 
-            radius_km * 1000
-        )
+        func.ST_DWithin(func.geography(YieldObservation.geom), _point_geography(point), radius_km * 1000)
     ).all()
 
+def get_nearest_yield_observations(
+    db: Session, point: Point, k: int = 10, max_km: Optional[float] = None
+) -> List[YieldObservation]:
+    """
+    k nearest historical yield records, ordered by geodesic distance.
+    The <-> KNN operator walks the geography GIST index instead of sorting the table.
+    """
+    target = _point_geography(point)
+    query = db.query(YieldObservation)
+    if max_km is not None:
+        query = query.filter(func.ST_DWithin(func.geography(YieldObservation.geom), target, max_km * 1000))
+    return query.order_by(func.geography(YieldObservation.geom).op('<->')(target)).limit(k).all()
+
 def get_auxiliary_data_at_point(db: Session, point: Point) -> List[AuxiliaryData]:
     """
     Finds the Ward (AuxiliaryData) that contains the clicked point.
@@ -32,6 +45,16 @@ def get_auxiliary_data_at_point(db: Session, point: Point) -> List[AuxiliaryData
         func.ST_Contains(AuxiliaryData.geom, point_geom)
     ).all()
 
+def _parse_date_range(date_range: dict):
+    start_date = date_range['start']
+    if isinstance(start_date, str):
+        start_date = datetime.fromisoformat(start_date)
+
+    end_date = date_range['end']
+    if isinstance(end_date, str):
+        end_date = datetime.fromisoformat(end_date)
+    return start_date, end_date
+
 def get_raster_assets_by_bbox(db: Session, point: Point, date_range: dict) -> List[RasterAsset]:
     """
     Finds the GEE Predictor Stack .tif that covers the clicked point.
@@ -39,16 +62,66 @@ def get_raster_assets_by_bbox(db: Session, point: Point, date_range: dict) -> Li
     point_geom = func.ST_SetSRID(func.ST_MakePoint(point.lon, point.lat), 4326)
     
     # Handle both ISO strings and datetime objects safely
-    start_date = date_range['start']
-    if isinstance(start_date, str):
-        start_date = datetime.fromisoformat(start_date)
-        
-    end_date = date_range['end']
-    if isinstance(end_date, str):
-        end_date = datetime.fromisoformat(end_date)
+    start_date, end_date = _parse_date_range(date_range)
     
     return db.query(RasterAsset).filter(
         func.ST_Intersects(RasterAsset.bbox, point_geom),
         RasterAsset.datetime >= start_date,
         RasterAsset.datetime <= end_date
-    ).order_by(RasterAsset.datetime).all()
\ No newline at end of file
+    ).order_by(RasterAsset.datetime).all()
+
+def get_predictor_stacks_for_points(db: Session, points: List[Point], date_range: dict) -> List[Optional[RasterAsset]]:
+    """
+    Batch variant of get_raster_assets_by_bbox.
+    One query fetches every PredictorStack touching the points' envelope,
+    then each point is matched to the earliest stack whose bbox covers it.
+    """
+    start_date, end_date = _parse_date_range(date_range)
+    envelope = func.ST_MakeEnvelope(
+        min(p.lon for p in points), min(p.lat for p in points),
+        max(p.lon for p in points), max(p.lat for p in points), 4326
+    )
+
+    stacks = db.query(RasterAsset).filter(
+        RasterAsset.asset_type == 'PredictorStack',
+        func.ST_Intersects(RasterAsset.bbox, envelope),
+        RasterAsset.datetime >= start_date,
+        RasterAsset.datetime <= end_date
+    ).order_by(RasterAsset.datetime).all()
+
+    footprints = [(s, prep(to_shape(cast(Any, s.bbox)))) for s in stacks]
+    matched: List[Optional[RasterAsset]] = []
+    for p in points:
+        pt = ShapelyPoint(p.lon, p.lat)
+        matched.append(next((s for s, fp in footprints if fp.intersects(pt)), None))
+    return matched
+
+def get_auxiliary_data_at_points(db: Session, points: List[Point]) -> List[Optional[AuxiliaryData]]:
+    """
+    Batch variant of get_auxiliary_data_at_point.
+    Joins all points against the ward polygons in one set-based query.
+    """
+    pts = values(
+        column('idx', Integer), column('lon', Float), column('lat', Float), name='pts'
+    ).data([(i, p.lon, p.lat) for i, p in enumerate(points)])
+    point_geom = func.ST_SetSRID(func.ST_MakePoint(pts.c.lon, pts.c.lat), 4326)
+
+    rows = db.query(pts.c.idx, AuxiliaryData).select_from(pts).join(
+        AuxiliaryData, func.ST_Contains(AuxiliaryData.geom, point_geom)
+    ).all()
+
+    matched: List[Optional[AuxiliaryData]] = [None] * len(points)
+    for idx, aux in rows:
+        if matched[idx] is None:
+            matched[idx] = aux
+    return matched
+
+def get_asset_generations(db: Session, asset_urls: List[str]) -> Dict[str, int]:
+    """
+    Catalog generation per asset URL: the newest RasterAsset id for it.
+    DIS re-ingesting the same URL bumps it, which invalidates cached tiles.
+    """
+    rows = db.query(RasterAsset.asset_url, func.max(RasterAsset.id)).filter(
+        RasterAsset.asset_url.in_(asset_urls)
+    ).group_by(RasterAsset.asset_url).all()
+    return {str(url): int(gen) for url, gen in rows}
@@ -0,0 +1,41 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+class VersionedMemo:
+    """
+    In-process memo for results that only change on ingestion. Entries are
+    keyed by (key, data version); a new version simply misses and replaces
+    the old entry, so no explicit invalidation is needed across workers.
+    """
+    def __init__(self):
+        self._entries: Dict[Hashable, Tuple[int, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: int, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        # Loaded outside the lock; concurrent misses just load twice
+        value = loader()
+        with self._lock:
+            current = self._entries.get(key)
+            if current is None or current[0] <= version:
+                self._entries[key] = (version, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0
+            }
+
+discovery_memo = VersionedMemo()
@@ -1,30 +1,131 @@
-import requests
-import os
+# Imported first: applies the GDAL/VSI tuning before any dataset is opened
+from app.utils.cog_pool import reader_pool, PooledReader
 import numpy as np
-from rio_tiler.io import COGReader
+from rasterio.transform import rowcol
+from rasterio.warp import transform as transform_coords
+from rasterio.windows import Window
 from shared.models.api_models import Point, TimeSeriesData
-from typing import List, Dict
+from typing import List, Dict, Optional, Any
 import logging
 
+from app.utils.tile_cache import tile_cache
+
 logger = logging.getLogger(__name__)
-ML_API_URL = os.getenv("ML_API_URL", "http://ml-api:8000")
 
-def extract_features_from_stack(point: Point, asset_url: str) -> Dict[str, float]:
-    band_names = ['ndvi_mean', 'precip_mean', 'et_mean', 'elevation_mean', 'soil_texture', 'temp_mean']
-    try:
-        with COGReader(input=asset_url, options={}) as cog:
-            point_data = cog.point(point.lon, point.lat)
-            values = [float(v) if v is not None else 0.0 for v in point_data]  # Handle None
-            return {band_names[i]: values[i] for i in range(min(len(band_names), len(values)))}
-    except Exception as e:
-        logger.error(f"Error extracting from stack: {e}")
-        return {name: 0.0 for name in band_names}
+BAND_NAMES = ['ndvi_mean', 'precip_mean', 'et_mean', 'elevation_mean', 'soil_texture', 'temp_mean']
+
+class LazyStack:
+    """
+    A PredictorStack whose grid metadata comes from the tile cache.
+    A pooled reader is only checked out when a block is missing from the
+    cache, so fully warm lookups never touch MinIO.
+    """
+    def __init__(self, asset_url: str, generation: Optional[int] = None):
+        self.asset_url = asset_url
+        self.generation = generation
+        self._reader: Optional[PooledReader] = None
+        meta = tile_cache.get_meta((asset_url, generation))
+        if meta is None:
+            try:
+                meta = self._load_meta()
+            except Exception:
+                self.close()
+                raise
+        self.meta: Dict[str, Any] = meta
+
+    def _dataset(self):
+        if self._reader is None:
+            self._reader = reader_pool.checkout(self.asset_url, self.generation)
+        return self._reader.dataset
+
+    def _load_meta(self) -> Dict[str, Any]:
+        dataset = self._dataset()
+        meta = {
+            "count": dataset.count,
+            "crs": dataset.crs,
+            "transform": dataset.transform,
+            "width": dataset.width,
+            "height": dataset.height,
+            "block_shape": dataset.block_shapes[0]
+        }
+        tile_cache.put_meta((self.asset_url, self.generation), meta)
+        return meta
+
+    def read_block(self, b_row: int, b_col: int):
+        """Returns all bands of one internal COG block, served from the tile cache when warm."""
+        key = (self.asset_url, self.generation, b_row, b_col)
+        block = tile_cache.get(key)
+        if block is None:
+            block_h, block_w = self.meta["block_shape"]
+            col_off, row_off = b_col * block_w, b_row * block_h
+            window = Window(
+                col_off, row_off,
+                min(block_w, self.meta["width"] - col_off), min(block_h, self.meta["height"] - row_off)
+            )
+            block = self._dataset().read(window=window, masked=True)
+            tile_cache.put(key, block)
+        return block
+
+    def close(self):
+        if self._reader is not None:
+            reader_pool.checkin(self._reader)
+            self._reader = None
+
+    def __enter__(self):
+        return self
 
-def call_ml_api(features: dict) -> float:
+    def __exit__(self, *exc):
+        self.close()
+
+def extract_features_from_stack(point: Point, asset_url: str, generation: Optional[int] = None) -> Dict[str, float]:
+    return extract_features_from_stack_batch([point], asset_url, generation)[0]
+
+def sample_points(stack: LazyStack, points: List[Point]) -> np.ndarray:
+    """
+    Vectorized pixel lookup for many points on one stack.
+    Points are bucketed by internal COG block so every block is read once
+    (or not at all when it is already in the tile cache).
+    Returns an (N, bands) array; nodata and out-of-bounds pixels are 0.0.
+    """
+    meta = stack.meta
+    lons = np.array([p.lon for p in points], dtype='float64')
+    lats = np.array([p.lat for p in points], dtype='float64')
+    values = np.zeros((len(points), meta["count"]), dtype='float64')
+
+    xs, ys = lons, lats
+    if meta["crs"] is not None and meta["crs"].to_epsg() != 4326:
+        xs, ys = transform_coords("EPSG:4326", meta["crs"], lons, lats)
+
+    rows, cols = rowcol(meta["transform"], xs, ys)
+    rows, cols = np.asarray(rows, dtype='int64'), np.asarray(cols, dtype='int64')
+    inside = (rows >= 0) & (rows < meta["height"]) & (cols >= 0) & (cols < meta["width"])
+
+    block_h, block_w = meta["block_shape"]
+    block_rows, block_cols = rows // block_h, cols // block_w
+
+    for b_row, b_col in set(zip(block_rows[inside].tolist(), block_cols[inside].tolist())):
+        block = stack.read_block(b_row, b_col)
+        sel = inside & (block_rows == b_row) & (block_cols == b_col)
+        pixels = block[:, rows[sel] - b_row * block_h, cols[sel] - b_col * block_w]
+        values[sel] = np.ma.filled(pixels.astype('float64'), 0.0).T
+
+    return values
+
+def extract_features_from_stack_batch(
+    points: List[Point], asset_url: str, generation: Optional[int] = None
+) -> List[Dict[str, float]]:
+    """
+    Extracts the band features for every point with at most one COG open.
+    `generation` is the catalog version of the asset; a change drops its cached tiles.
+    """
+    if generation is not None and tile_cache.ensure_generation(asset_url, generation):
+        reader_pool.invalidate(asset_url)
     try:
-        response = requests.post(f"{ML_API_URL}/v1/predict", json={"features": features})
-        response.raise_for_status()
-        return response.json().get("predicted_yield")
+        with LazyStack(asset_url, generation) as stack:
+            values = sample_points(stack, points)
     except Exception as e:
-        logger.error(f"ML-API Error: {e}")
-        return 0.0
\ No newline at end of file
+        logger.error(f"Error extracting batch from stack: {e}")
+        values = np.zeros((len(points), len(BAND_NAMES)), dtype='float64')
+
+    n_bands = min(len(BAND_NAMES), values.shape[1])
+    return [{BAND_NAMES[i]: float(row[i]) for i in range(n_bands)} for row in values]
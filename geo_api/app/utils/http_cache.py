@@ -0,0 +1,38 @@
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag derived from whatever identifies the representation (data version, params)."""
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 prescribes for GET)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [c.strip() for c in header.split(",")]
+    return any(c.removeprefix("W/") == etag for c in candidates)
+
+def cache_headers(etag: str, max_age: int) -> dict:
+    # Clients reuse for max_age seconds, then revalidate with the ETag for a cheap 304
+    return {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+
+def not_modified(etag: str, max_age: int) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, max_age))
+
+def cached_response(
+    request: Request,
+    etag: str,
+    max_age: int,
+    content: Optional[bytes] = None,
+    media_type: Optional[str] = None
+) -> Response:
+    """304 when the client already holds `etag`, otherwise the content with cache headers."""
+    if etag_matches(request, etag):
+        return not_modified(etag, max_age)
+    return Response(content=content, media_type=media_type, headers=cache_headers(etag, max_age))
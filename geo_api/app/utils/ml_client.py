@@ -0,0 +1,222 @@
+import os
+import time
+import threading
+import logging
+from typing import List, Dict, Any, Optional
+
+import requests
+import httpx
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+ML_API_URL = os.getenv("ML_API_URL", "http://ml-api:8000")
+ML_API_CONNECT_TIMEOUT = float(os.getenv("ML_API_CONNECT_TIMEOUT", "2.0"))
+ML_API_READ_TIMEOUT = float(os.getenv("ML_API_READ_TIMEOUT", "15.0"))
+ML_API_RETRIES = int(os.getenv("ML_API_RETRIES", "2"))
+ML_API_POOL_SIZE = int(os.getenv("ML_API_POOL_SIZE", "20"))
+ML_API_BREAKER_THRESHOLD = int(os.getenv("ML_API_BREAKER_THRESHOLD", "5"))
+ML_API_BREAKER_RESET_S = float(os.getenv("ML_API_BREAKER_RESET_S", "30"))
+
+class CircuitOpenError(Exception):
+    pass
+
+class MLResponseError(Exception):
+    """ml_api answered, but with something that cannot be matched to the request."""
+    pass
+
+class CircuitBreaker:
+    """
+    Opens after N consecutive failures and short-circuits calls until the
+    reset window elapses. Exactly one call is then let through as a probe;
+    the rest stay rejected until its outcome is recorded, so a recovering
+    ml_api does not take the whole backlog at once.
+    """
+    def __init__(self, threshold: int, reset_after_s: float):
+        self.threshold = threshold
+        self.reset_after_s = reset_after_s
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # When the in-flight probe was let through; None when there is none
+        self.probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.probe_started is not None or time.monotonic() - self.opened_at >= self.reset_after_s:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_after_s:
+                return False
+            # A probe that never reported back (e.g. a cancelled request) is replaced after one window
+            if self.probe_started is not None and now - self.probe_started < self.reset_after_s:
+                return False
+            self.probe_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.probe_started = None
+
+class ClientMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.short_circuited = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.latency_total_ms = 0.0
+        self.latency_max_ms = 0.0
+
+    def start(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return time.perf_counter()
+
+    def finish(self, started: float, ok: bool):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.in_flight -= 1
+            self.latency_total_ms += elapsed_ms
+            self.latency_max_ms = max(self.latency_max_ms, elapsed_ms)
+            if not ok:
+                self.failures += 1
+
+    def record_short_circuit(self):
+        with self._lock:
+            self.short_circuited += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            completed = max(self.requests - self.in_flight, 1)
+            return {
+                "requests": self.requests,
+                "failures": self.failures,
+                "short_circuited": self.short_circuited,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "pool_size": ML_API_POOL_SIZE,
+                "latency_avg_ms": round(self.latency_total_ms / completed, 2),
+                "latency_max_ms": round(self.latency_max_ms, 2)
+            }
+
+breaker = CircuitBreaker(ML_API_BREAKER_THRESHOLD, ML_API_BREAKER_RESET_S)
+metrics = ClientMetrics()
+
+# --- Sync client (threadpool endpoints) ---
+# Only connection failures are retried: a POST that reached ml_api may already be persisted.
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=ML_API_POOL_SIZE,
+    max_retries=Retry(total=ML_API_RETRIES, connect=ML_API_RETRIES, read=0, status=0, backoff_factor=0.2)
+))
+_timeout = (ML_API_CONNECT_TIMEOUT, ML_API_READ_TIMEOUT)
+
+# --- Async client (created lazily inside the worker's event loop) ---
+_async_client: Optional[httpx.AsyncClient] = None
+
+def _get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            base_url=ML_API_URL,
+            timeout=httpx.Timeout(ML_API_READ_TIMEOUT, connect=ML_API_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=ML_API_POOL_SIZE, max_keepalive_connections=ML_API_POOL_SIZE),
+            transport=httpx.AsyncHTTPTransport(retries=ML_API_RETRIES)
+        )
+    return _async_client
+
+def _check_breaker():
+    if not breaker.allow():
+        metrics.record_short_circuit()
+        raise CircuitOpenError("ml_api circuit is open")
+
+def _post(path: str, payload: dict) -> dict:
+    _check_breaker()
+    started = metrics.start()
+    try:
+        response = _session.post(f"{ML_API_URL}{path}", json=payload, timeout=_timeout)
+        response.raise_for_status()
+    except Exception:
+        metrics.finish(started, ok=False)
+        breaker.record_failure()
+        raise
+    metrics.finish(started, ok=True)
+    breaker.record_success()
+    return response.json()
+
+async def _post_async(path: str, payload: dict) -> dict:
+    _check_breaker()
+    started = metrics.start()
+    try:
+        response = await _get_async_client().post(path, json=payload)
+        response.raise_for_status()
+    except Exception:
+        metrics.finish(started, ok=False)
+        breaker.record_failure()
+        raise
+    metrics.finish(started, ok=True)
+    breaker.record_success()
+    return response.json()
+
+def call_ml_api(features: dict) -> float:
+    try:
+        return _post("/v1/predict", {"features": features}).get("predicted_yield")
+    except Exception as e:
+        logger.error(f"ML-API Error: {e}")
+        return 0.0
+
+async def call_ml_api_async(features: dict) -> float:
+    try:
+        return (await _post_async("/v1/predict", {"features": features})).get("predicted_yield")
+    except Exception as e:
+        logger.error(f"ML-API Error: {e}")
+        return 0.0
+
+def call_ml_api_batch(features_list: List[dict]) -> List[float]:
+    """
+    One prediction per item. Transport failures fall back to 0.0 like the
+    single-point client; a batch answer of the wrong length raises
+    MLResponseError, since positional results cannot be matched to points.
+    """
+    try:
+        predictions = _post("/v1/predict/batch", {"items": features_list}).get("predictions", [])
+    except Exception as e:
+        logger.error(f"ML-API Batch Error: {e}")
+        return [0.0] * len(features_list)
+    if len(predictions) != len(features_list):
+        logger.error(f"ML-API Batch Error: {len(predictions)} predictions for {len(features_list)} items")
+        raise MLResponseError(f"ml_api returned {len(predictions)} predictions for {len(features_list)} items")
+    return [float(p.get("predicted_yield") or 0.0) for p in predictions]
+
+def get_client_metrics() -> Dict[str, Any]:
+    return dict(metrics.snapshot(), circuit=breaker.state)
+
+async def close_clients():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    _session.close()
@@ -0,0 +1,128 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TILE_CACHE_MB = float(os.getenv("TILE_CACHE_MB", "256"))
+TILE_CACHE_TTL_S = float(os.getenv("TILE_CACHE_TTL_S", "900"))
+
+# (asset_url, generation, block_row, block_col)
+TileKey = Tuple[str, Optional[int], int, int]
+# (asset_url, generation)
+MetaKey = Tuple[str, Optional[int]]
+
+class TileCache:
+    """
+    Bounded LRU + TTL cache of decoded COG blocks (all bands of one
+    internal 256x256 tile), plus the grid metadata needed to locate
+    blocks without opening the COG. Keys carry the asset's catalog
+    generation (like cog_pool), so a read that started before DIS
+    re-ingested the URL can never serve or repopulate the new generation;
+    older generations are dropped and their late puts ignored.
+    """
+    def __init__(self, max_bytes: int, ttl_s: float):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[TileKey, Tuple[float, Any]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._meta: Dict[MetaKey, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _nbytes(block: Any) -> int:
+        return int(block.nbytes + np.ma.getmaskarray(block).nbytes)
+
+    def _drop(self, key: TileKey):
+        _, block = self._entries.pop(key)
+        self.current_bytes -= self._nbytes(block)
+
+    def get(self, key: TileKey) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, block = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return block
+
+    def _stale(self, asset_url: str, generation: Optional[int]) -> bool:
+        known = self._generations.get(asset_url)
+        return known is not None and generation != known
+
+    def put(self, key: TileKey, block: Any):
+        size = self._nbytes(block)
+        if size > self.max_bytes:
+            return
+        block.setflags(write=False)
+        with self._lock:
+            if self._stale(key[0], key[1]):
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_s, block)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def get_meta(self, key: MetaKey) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._meta.get(key)
+
+    def put_meta(self, key: MetaKey, meta: Dict[str, Any]):
+        with self._lock:
+            if not self._stale(*key):
+                self._meta[key] = meta
+
+    def ensure_generation(self, asset_url: str, generation: int) -> bool:
+        """Records the asset's generation; returns True if it changed (and the cache was dropped)."""
+        with self._lock:
+            known = self._generations.get(asset_url)
+            self._generations[asset_url] = generation
+        if known is not None and known != generation:
+            logger.info(f"Asset {asset_url} re-ingested (gen {known} -> {generation}); dropping cached tiles.")
+            self.invalidate(asset_url)
+            return True
+        return False
+
+    def invalidate(self, asset_url: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == asset_url]:
+                self._drop(key)
+            for key in [k for k in self._meta if k[0] == asset_url]:
+                del self._meta[key]
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_mb": round(self.current_bytes / 1024 / 1024, 2),
+                "max_mb": round(self.max_bytes / 1024 / 1024, 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+tile_cache = TileCache(int(TILE_CACHE_MB * 1024 * 1024), TILE_CACHE_TTL_S)
@@ -0,0 +1,68 @@
+import os
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Mapbox Vector Tile settings
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+MVT_LAYER = "wards"
+MVT_MAX_ZOOM = 22
+# Simplify to ~MVT_SIMPLIFY_PX tile pixels below this zoom; above it the
+# grid snapping done by ST_AsMVTGeom alone is enough
+MVT_SIMPLIFY_MAX_ZOOM = int(os.getenv("MVT_SIMPLIFY_MAX_ZOOM", "14"))
+MVT_SIMPLIFY_PX = float(os.getenv("MVT_SIMPLIFY_PX", "1.0"))
+TILE_MAX_AGE = int(os.getenv("TILE_MAX_AGE_S", "3600"))
+
+WEB_MERCATOR_WIDTH_M = 40075016.685578488
+
+def simplify_tolerance(z: int) -> float:
+    """Web Mercator metres covered by MVT_SIMPLIFY_PX tile-grid pixels at zoom z (0 = no simplification)."""
+    if z >= MVT_SIMPLIFY_MAX_ZOOM:
+        return 0.0
+    return WEB_MERCATOR_WIDTH_M / (2 ** z) / MVT_EXTENT * MVT_SIMPLIFY_PX
+
+def valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= MVT_MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+BOUNDARY_TILE_SQL = """
+    WITH bounds AS (
+        SELECT ST_TileEnvelope(:z, :x, :y) AS env,
+               ST_Transform(ST_TileEnvelope(:z, :x, :y, margin => :margin), 4326) AS env_4326
+    ),
+    mvtgeom AS (
+        SELECT ST_AsMVTGeom({geom}, bounds.env, :extent, :buffer, true) AS geom,
+               a.ward_id, a.ward_name, a.county_name, a.year,
+               a.ndvi_mean, a.precip_mean, a.temp_mean, a.elevation_m
+        FROM auxiliarydata a, bounds
+        WHERE a.geom && bounds.env_4326
+          AND a.year = :year
+          {county_filter}
+    )
+    SELECT ST_AsMVT(mvtgeom, :layer, :extent, 'geom') FROM mvtgeom WHERE geom IS NOT NULL
+"""
+
+def render_boundary_tile(db: Session, z: int, x: int, y: int, year: int, county: Optional[str] = None) -> bytes:
+    """
+    Ward boundaries for one XYZ tile as MVT, clipped, simplified for the
+    zoom level and quantized in PostGIS. Every polygon part is kept.
+    """
+    tolerance = simplify_tolerance(z)
+    geom = "ST_Transform(a.geom, 3857)"
+    if tolerance > 0:
+        geom = f"ST_Simplify({geom}, :tolerance, true)"
+    sql = BOUNDARY_TILE_SQL.format(
+        geom=geom,
+        county_filter="AND a.county_name = :county" if county else ""
+    )
+    params = {
+        "z": z, "x": x, "y": y, "year": year,
+        "extent": MVT_EXTENT, "buffer": MVT_BUFFER, "margin": MVT_BUFFER / MVT_EXTENT, "layer": MVT_LAYER
+    }
+    if tolerance > 0:
+        params["tolerance"] = tolerance
+    if county:
+        params["county"] = county
+    tile = db.execute(text(sql), params).scalar()
+    return bytes(tile) if tile else b""
@@ -1,6 +1,10 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers.geo_router import router as geo_router
+from app.utils.ml_client import get_client_metrics, close_clients
+from app.utils.tile_cache import tile_cache
+from app.utils.cog_pool import reader_pool
+from app.utils.discovery_cache import discovery_memo
 import os
 
 app = FastAPI(
@@ -20,10 +24,21 @@ app.add_middleware(
 
 app.include_router(geo_router, prefix="/v1")
 
+@app.on_event("shutdown")
+async def shutdown_clients():
+    await close_clients()
+
 # Added for Frontend Badge status check
 @app.get("/v1/status")
 def get_status():
-    return {"status": "healthy", "service": "geo_api"}
+    return {
+        "status": "healthy",
+        "service": "geo_api",
+        "ml_client": get_client_metrics(),
+        "tile_cache": tile_cache.stats(),
+        "reader_pool": reader_pool.stats(),
+        "discovery_cache": discovery_memo.stats()
+    }
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,221 @@
+"""
+Compiled RandomForest inference for the train.py pipeline.
+
+Flattens the fitted sklearn Pipeline (ColumnTransformer with imputers,
+StandardScaler and OneHotEncoder, then RandomForestRegressor) into packed
+NumPy arrays and walks all trees for all rows at once, one vectorized step
+per depth level. No pandas, no sklearn validation on the request path.
+
+    python compiled_model.py --model-path models/registry/<version>/pipeline.joblib
+
+runs a micro-benchmark against sklearn; parity is covered by
+tests/test_compiled_model.py.
+"""
+import os
+import time
+import logging
+import argparse
+from typing import Any, Dict, List, Sequence
+
+import joblib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the packed layout changes
+COMPILED_FORMAT = 1
+
+def _numeric_block(pipe: Any, columns: List[str]) -> Dict[str, np.ndarray]:
+    imputer, scaler = pipe.named_steps['imp'], pipe.named_steps['scl']
+    fill = np.asarray(imputer.statistics_, dtype='float64')
+    if np.isnan(fill).any() or len(fill) != len(columns):
+        raise ValueError("Imputer dropped or could not fill a numeric column")
+    mean = scaler.mean_ if scaler.with_mean else np.zeros(len(columns))
+    scale = scaler.scale_ if scaler.with_std and scaler.scale_ is not None else np.ones(len(columns))
+    return {"fill": fill, "mean": np.asarray(mean, 'float64'), "scale": np.asarray(scale, 'float64')}
+
+def _categorical_block(pipe: Any) -> Dict[str, np.ndarray]:
+    imputer, ohe = pipe.named_steps['imp'], pipe.named_steps['ohe']
+    if ohe.drop_idx_ is not None or getattr(ohe, '_infrequent_enabled', False):
+        raise ValueError("OneHotEncoder drop/infrequent categories are not supported")
+    if ohe.handle_unknown != 'ignore':
+        raise ValueError("OneHotEncoder must use handle_unknown='ignore'")
+    if len(ohe.categories_) != 1:
+        raise ValueError("Only a single categorical column is supported")
+    return {
+        "fill": np.asarray(imputer.statistics_, dtype='float64'),
+        "categories": np.asarray(ohe.categories_[0], dtype='float64')
+    }
+
+def _pack_trees(estimators: Sequence[Any]) -> Dict[str, np.ndarray]:
+    """
+    Concatenates all trees into flat node arrays. Leaves point at
+    themselves with an +inf threshold, so a (tree, row) slot that stops
+    moving has reached its leaf.
+    """
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset, max_depth = 0, 0
+    for est in estimators:
+        tree = est.tree_
+        n = tree.node_count
+        node_ids = np.arange(n) + offset
+        leaf = tree.children_left == -1
+        lefts.append(np.where(leaf, node_ids, tree.children_left + offset))
+        rights.append(np.where(leaf, node_ids, tree.children_right + offset))
+        features.append(np.where(leaf, 0, tree.feature))
+        thresholds.append(np.where(leaf, np.inf, tree.threshold))
+        values.append(tree.value[:, 0, 0])
+        roots.append(offset)
+        offset += n
+        max_depth = max(max_depth, tree.max_depth)
+    return {
+        "feature": np.concatenate(features).astype('int32'),
+        "threshold": np.concatenate(thresholds).astype('float64'),
+        "left": np.concatenate(lefts).astype('int32'),
+        "right": np.concatenate(rights).astype('int32'),
+        "value": np.concatenate(values).astype('float64'),
+        "roots": np.asarray(roots, dtype='int32'),
+        "max_depth": np.asarray(max_depth, dtype='int32')
+    }
+
+class CompiledForest:
+    """
+    Array-only equivalent of pipeline.predict for rows given in
+    `input_columns` order (prediction.RF_COLUMNS). Extra input columns
+    are ignored, exactly like the ColumnTransformer does.
+    """
+    def __init__(self, arrays: Dict[str, Any]):
+        if int(arrays["format"]) != COMPILED_FORMAT:
+            raise ValueError(f"Unsupported compiled model format {arrays['format']}")
+        self.arrays = arrays
+        self.input_columns: List[str] = list(arrays["input_columns"])
+        self.num_idx = np.asarray(arrays["num_idx"])
+        self.cat_idx = int(arrays["cat_idx"])
+        self.num_fill, self.num_mean, self.num_scale = arrays["num_fill"], arrays["num_mean"], arrays["num_scale"]
+        self.cat_fill, self.categories = float(arrays["cat_fill"][0]), arrays["categories"]
+        self.num_first = bool(arrays["num_first"])
+        self.feature, self.threshold = arrays["feature"], arrays["threshold"]
+        self.left, self.right, self.value = arrays["left"], arrays["right"], arrays["value"]
+        self.roots, self.max_depth = arrays["roots"], int(arrays["max_depth"])
+        self.n_trees = len(self.roots)
+
+    @classmethod
+    def from_pipeline(cls, pipeline: Any, input_columns: Sequence[str]) -> "CompiledForest":
+        pre, reg = pipeline.named_steps['pre'], pipeline.named_steps['reg']
+        if getattr(reg, 'n_outputs_', 1) != 1:
+            raise ValueError("Only single-output regressors are supported")
+        if pre.remainder != 'drop':
+            raise ValueError("ColumnTransformer remainder must be 'drop'")
+        blocks = [(name, trans, cols) for name, trans, cols in pre.transformers_ if trans != 'drop' and name != 'remainder']
+        names = [b[0] for b in blocks]
+        if sorted(names) != ['cat', 'num']:
+            raise ValueError(f"Unexpected transformers {names}")
+        by_name = {name: (trans, list(cols)) for name, trans, cols in blocks}
+        num_pipe, num_cols = by_name['num']
+        cat_pipe, cat_cols = by_name['cat']
+
+        cols = list(input_columns)
+        num = _numeric_block(num_pipe, num_cols)
+        cat = _categorical_block(cat_pipe)
+        arrays: Dict[str, Any] = {
+            "format": COMPILED_FORMAT,
+            "input_columns": np.asarray(cols),
+            "num_idx": np.asarray([cols.index(c) for c in num_cols], dtype='int32'),
+            "cat_idx": cols.index(cat_cols[0]),
+            "num_fill": num["fill"], "num_mean": num["mean"], "num_scale": num["scale"],
+            "cat_fill": cat["fill"], "categories": cat["categories"],
+            "num_first": names.index('num') < names.index('cat')
+        }
+        arrays.update(_pack_trees(reg.estimators_))
+        return cls(arrays)
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        """ColumnTransformer output for rows in input_columns order."""
+        num = X[:, self.num_idx]
+        num = np.where(np.isnan(num), self.num_fill, num)
+        num = (num - self.num_mean) / self.num_scale
+        cat = X[:, self.cat_idx]
+        cat = np.where(np.isnan(cat), self.cat_fill, cat)
+        onehot = (cat[:, None] == self.categories[None, :]).astype('float64')
+        return np.hstack([num, onehot] if self.num_first else [onehot, num])
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype='float64')
+        if X.ndim == 1:
+            X = X[None, :]
+        # sklearn trees compare float32 inputs against float64 thresholds
+        Xt = self.transform(X).astype('float32').astype('float64')
+        n_rows, n_cols = Xt.shape
+        flat_x = Xt.ravel()
+        # One slot per (tree, row); slots drop out once they reach a leaf
+        nodes = np.repeat(self.roots, n_rows)
+        row_base = np.tile(np.arange(n_rows) * n_cols, self.n_trees)
+        active = np.arange(nodes.size)
+        for _ in range(self.max_depth):
+            current = nodes[active]
+            go_left = flat_x[row_base[active] + self.feature[current]] <= self.threshold[current]
+            nxt = np.where(go_left, self.left[current], self.right[current])
+            nodes[active] = nxt
+            active = active[nxt != current]
+            if not active.size:
+                break
+        return self.value[nodes].reshape(self.n_trees, n_rows).mean(axis=0)
+
+    def predict_one(self, row: Sequence[float]) -> float:
+        return float(self.predict(np.asarray(row, dtype='float64'))[0])
+
+    def save(self, path: str):
+        joblib.dump(self.arrays, path)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Any = None) -> "CompiledForest":
+        return cls(joblib.load(path, mmap_mode=mmap_mode))
+
+def _sample_rows(n: int, input_columns: Sequence[str], seed: int = 0) -> np.ndarray:
+    """Random rows over realistic Trans Nzoia ranges, with some NaNs and unseen soil classes."""
+    rng = np.random.default_rng(seed)
+    ranges = {
+        'year': (2018, 2025), 'ndvi_mean': (0.1, 0.9), 'precip_mean': (0.5, 12.0), 'et_mean': (5.0, 40.0),
+        'elevation_mean': (1500.0, 2500.0), 'temp_mean': (12.0, 30.0)
+    }
+    X = np.empty((n, len(input_columns)))
+    for j, col in enumerate(input_columns):
+        if col == 'soil_texture':
+            X[:, j] = rng.integers(0, 8, n)
+        else:
+            lo, hi = ranges.get(col, (0.0, 1.0))
+            X[:, j] = rng.uniform(lo, hi, n)
+    X[rng.random(X.shape) < 0.02] = np.nan
+    return X
+
+def _bench(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+def main():
+    import pandas as pd
+    from model_registry import RF_COLUMNS, MODEL_PATH
+
+    parser = argparse.ArgumentParser(description="Micro-benchmark of the compiled RF path against sklearn.")
+    parser.add_argument('--model-path', default=MODEL_PATH)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    pipeline = joblib.load(args.model_path)
+    engine = CompiledForest.from_pipeline(pipeline, RF_COLUMNS)
+    X = _sample_rows(args.rows, RF_COLUMNS)
+    frame = pd.DataFrame(X, columns=RF_COLUMNS)
+
+    one, one_frame = X[:1], frame.iloc[:1]
+    print(f"single row: sklearn {_bench(lambda: pipeline.predict(one_frame), args.repeat):.3f} ms, "
+          f"compiled {_bench(lambda: engine.predict(one), args.repeat):.3f} ms")
+    batch, batch_frame = X[:1000], frame.iloc[:1000]
+    print(f"1000 rows:  sklearn {_bench(lambda: pipeline.predict(batch_frame), max(1, args.repeat // 10)):.3f} ms, "
+          f"compiled {_bench(lambda: engine.predict(batch), max(1, args.repeat // 10)):.3f} ms")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
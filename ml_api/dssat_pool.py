@@ -0,0 +1,456 @@
+"""
+DSSAT simulation worker pool.
+
+Every worker is its own process with a private DSSAT workspace (run_path)
+and a private DSSAT_HOME, so concurrent runs never share the FileX,
+SOIL.SOL, weather or *.OUT files the Fortran model reads and writes, and a
+restarting worker re-linking its DSSAT_HOME cannot break a running one
+(DSSATTools rebuilds the /tmp/DSSAT048 symlinks on every import).
+
+A dispatcher thread per worker pulls requests from one queue, hands them
+over a pipe and waits up to the timeout; a hung or crashed worker is killed
+together with its dscsm048 child and respawned on a clean workspace.
+Workers keep the built soil profiles, weather stations and cultivars, and
+their rendered SOIL.SOL/WTH text, so repeated inputs are not rebuilt.
+
+    python dssat_pool.py --requests 64 --workers 4
+
+runs a synthetic throughput benchmark and the kill-on-hang check.
+"""
+import os
+import time
+import queue
+import signal
+import shutil
+import hashlib
+import tempfile
+import logging
+import argparse
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import date, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DSSAT_WORKERS = int(os.getenv("DSSAT_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+DSSAT_TIMEOUT_S = float(os.getenv("DSSAT_TIMEOUT_S", "30"))
+# Kept short: DSSAT truncates long paths in DSSATPRO
+DSSAT_WORKSPACE_ROOT = os.getenv("DSSAT_WORKSPACE_ROOT", "/tmp/dssat-pool")
+DSSAT_INPUT_CACHE = int(os.getenv("DSSAT_INPUT_CACHE", "256"))
+
+# Layer bases (cm) for profiles built from a single texture description
+SOIL_LAYER_DEPTHS = (15, 30, 60, 100, 150)
+WEATHER_COLUMNS = ['date', 'srad', 'tmax', 'tmin', 'rain']
+
+class SoilSpec(NamedTuple):
+    """Uniform-texture soil profile; `soil_id` is the 10-character DSSAT profile id."""
+    soil_id: str
+    slll: float
+    sdul: float
+    ssat: float
+    ssks: float
+    sbdm: float
+    sloc: float
+    slcl: float
+    slsi: float
+    depth_cm: float = 100.0
+    salb: float = 0.13
+
+class WeatherSpec(NamedTuple):
+    """Daily series for one station; `key` identifies the series (see weather_hash)."""
+    key: str
+    insi: str
+    lat: float
+    lon: float
+    elev: float
+    table: pd.DataFrame
+
+class SimulationRequest(NamedTuple):
+    soil: SoilSpec
+    weather: WeatherSpec
+    planting_date: date
+    cultivar_code: str = "IB0001"
+    plant_population: float = 5.3
+    row_spacing_cm: float = 75.0
+    fertilizer_n_kg: float = 0.0
+    sim_start: Optional[date] = None
+
+class SimulationTimeout(TimeoutError):
+    pass
+
+def weather_hash(table: pd.DataFrame) -> str:
+    """Content hash of a daily weather table (WEATHER_COLUMNS), stable across processes."""
+    frame = table[WEATHER_COLUMNS]
+    digest = hashlib.sha1(pd.to_datetime(frame['date']).values.astype('datetime64[D]').tobytes())
+    digest.update(np.ascontiguousarray(frame[WEATHER_COLUMNS[1:]].to_numpy(dtype='float64').round(2)).tobytes())
+    return digest.hexdigest()[:16]
+
+# =================================================================
+# WORKER PROCESS
+# =================================================================
+class _Inputs:
+    """Per-worker LRU of built DSSATTools input objects."""
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Any, build):
+        obj = self._entries.get(key)
+        if obj is None:
+            self.misses += 1
+            obj = self._entries[key] = build()
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            self.hits += 1
+        self._entries.move_to_end(key)
+        return obj
+
+def _memoize_render(obj: Any, method: str):
+    # run_treatment re-renders SOIL.SOL/WTH on every call; reuse the text.
+    # The renderers are DSSATTools 3.0.0 internals (pinned in requirements.txt):
+    # fail loudly if an upgrade renamed them rather than silently stop memoizing.
+    if not callable(getattr(obj, method, None)):
+        raise RuntimeError(f"{type(obj).__name__}.{method} not found; dssat_pool needs DSSATTools==3.0.0")
+    rendered = getattr(obj, method)()
+    setattr(obj, method, lambda: rendered)
+    return obj
+
+def _build_soil(spec: SoilSpec):
+    from DSSATTools.soil import SoilProfile, SoilLayer
+    depths = [d for d in SOIL_LAYER_DEPTHS if d < spec.depth_cm] + [spec.depth_cm]
+    layers = [
+        SoilLayer(
+            slb=d, slll=spec.slll, sdul=spec.sdul, ssat=spec.ssat,
+            srgf=1.0 if d <= 30 else round(float(np.exp(-0.02 * (d - 30))), 3),
+            sbdm=spec.sbdm, sloc=spec.sloc if d <= 30 else spec.sloc / 2,
+            ssks=spec.ssks, slcl=spec.slcl, slsi=spec.slsi
+        ) for d in depths
+    ]
+    profile = SoilProfile(
+        table=layers, name=spec.soil_id, salb=spec.salb, slu1=6.0, sldr=0.5,
+        slro=75.0, slnf=1.0, slpf=1.0
+    )
+    return _memoize_render(profile, '_write_sol')
+
+def _build_weather(spec: WeatherSpec):
+    from DSSATTools.weather import WeatherStation
+    table = spec.table[WEATHER_COLUMNS].copy()
+    table['date'] = pd.to_datetime(table['date']).dt.date
+    tmean = (table['tmax'] + table['tmin']) / 2
+    monthly = tmean.groupby(pd.to_datetime(table['date']).dt.month).mean()
+    station = WeatherStation(
+        table=table, lat=spec.lat, long=spec.lon, insi=spec.insi, elev=spec.elev,
+        tav=float(tmean.mean()), amp=float(monthly.max() - monthly.min())
+    )
+    return _memoize_render(station, '_write_wth')
+
+def _simulate(dssat: Any, inputs: _Inputs, req: SimulationRequest) -> Dict[str, Any]:
+    from DSSATTools.crop import Maize
+    from DSSATTools.filex import (
+        Field, Planting, Fertilizer, FertilizerEvent,
+        SimulationControls, SCGeneral, SCOptions, SCManagement
+    )
+    soil = inputs.get(('soil', req.soil), lambda: _build_soil(req.soil))
+    weather = inputs.get(('weather', req.weather.key), lambda: _build_weather(req.weather))
+    cultivar = inputs.get(('cultivar', req.cultivar_code), lambda: Maize(req.cultivar_code))
+
+    field = Field(id_field=f"{req.weather.insi}0001", wsta=weather, id_soil=soil)
+    planting = Planting(
+        pdate=req.planting_date, ppop=req.plant_population, plrs=req.row_spacing_cm,
+        pldp=5, plme='S', plds='R'
+    )
+    fertilizer = None
+    if req.fertilizer_n_kg > 0:
+        # Urea, banded at planting
+        fertilizer = Fertilizer(table=[FertilizerEvent(
+            fdate=req.planting_date, fmcd='FE005', facd='AP002', fdep=5, famn=req.fertilizer_n_kg
+        )])
+    controls = SimulationControls(
+        general=SCGeneral(sdate=req.sim_start or req.planting_date - timedelta(days=30)),
+        options=SCOptions(water='Y', nitro='Y'),
+        management=SCManagement(irrig='N', ferti='R' if fertilizer else 'N', harvs='M')
+    )
+    dssat.stdout = ""
+    try:
+        return dssat.run_treatment(
+            field=field, cultivar=cultivar, planting=planting, fertilizer=fertilizer,
+            simulation_controls=controls, verbose=False
+        )
+    except ValueError:
+        # Model notes printed ahead of the summary table (e.g. "Crop mature on
+        # JD 223 due to slowed grain filling") break DSSATTools' fixed-line parse
+        summary = _parse_summary(dssat.stdout)
+        if summary is None:
+            raise
+        return summary
+
+def _parse_summary(stdout: str) -> Optional[Dict[str, Any]]:
+    """The RUN/TRT summary table of the dscsm048 stdout, wherever it starts."""
+    lines = stdout.split("\n")
+    for i, line in enumerate(lines[:-2]):
+        if line.startswith("RUN") and "TRT" in line:
+            return {
+                k.lower(): int(v) if int(v) != -99 else None
+                for k, v in zip(line[10:].split(), lines[i + 2][10:].split())
+            }
+    return None
+
+def _worker_main(slot: int, workspace: str, conn: Any, cache_size: int):
+    # Own process group, so a kill also takes down the dscsm048 child
+    os.setsid()
+    # DSSATTools derives DSSAT_HOME from the temp dir at import time
+    home = os.path.join(workspace, "home")
+    os.makedirs(home)
+    tempfile.tempdir = home
+    from DSSATTools.run import DSSAT
+    dssat = DSSAT(os.path.join(workspace, "run"))
+    inputs = _Inputs(cache_size)
+    while True:
+        try:
+            req = conn.recv()
+        except EOFError:
+            break
+        if req is None:
+            break
+        hits_before = inputs.hits
+        try:
+            summary = _simulate(dssat, inputs, req)
+            conn.send((True, summary, inputs.hits - hits_before))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}", inputs.hits - hits_before))
+
+# =================================================================
+# POOL
+# =================================================================
+class _Slot:
+    def __init__(self, index: int, workspace: str):
+        self.index = index
+        self.workspace = workspace
+        self.process: Any = None
+        self.conn: Any = None
+        self.runs = 0
+
+class DSSATPool:
+    """
+    Fixed pool of DSSAT worker processes fed from one request queue.
+    submit() returns a Future whose result is the DSSAT summary dict
+    (harwt, mat, flo, ...); it raises SimulationTimeout or RuntimeError.
+    """
+    def __init__(self, workers: int, timeout_s: float, root_dir: str, cache_size: int = DSSAT_INPUT_CACHE):
+        self.workers = workers
+        self.timeout_s = timeout_s
+        self.root_dir = root_dir
+        self.cache_size = cache_size
+        self._queue: "queue.Queue[Optional[Tuple[Future, SimulationRequest, float, float]]]" = queue.Queue()
+        self._slots: List[_Slot] = []
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._ctx = multiprocessing.get_context("spawn")
+        self.started_at: Optional[float] = None
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.busy = 0
+        self.input_cache_hits = 0
+        self.run_s = 0.0
+        self.wait_s = 0.0
+
+    def _spawn(self, slot: _Slot):
+        shutil.rmtree(slot.workspace, ignore_errors=True)
+        os.makedirs(slot.workspace)
+        parent_conn, child_conn = self._ctx.Pipe()
+        slot.process = self._ctx.Process(
+            target=_worker_main, name=f"dssat-{slot.index}", daemon=True,
+            args=(slot.index, slot.workspace, child_conn, self.cache_size)
+        )
+        slot.process.start()
+        child_conn.close()
+        slot.conn = parent_conn
+
+    def _kill(self, slot: _Slot, reason: str):
+        proc = slot.process
+        logger.warning(f"DSSAT worker {slot.index} ({reason}), restarting.")
+        if proc is not None and proc.is_alive():
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        if proc is not None:
+            proc.join(timeout=5)
+        if slot.conn is not None:
+            slot.conn.close()
+        slot.process = slot.conn = None
+        with self._stats_lock:
+            self.restarts += 1
+
+    def _serve(self, slot: _Slot):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            future, request, timeout_s, enqueued = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = time.perf_counter()
+            with self._stats_lock:
+                self.busy += 1
+                self.wait_s += started - enqueued
+            ok, payload, hits = False, None, 0
+            try:
+                if slot.process is None:
+                    self._spawn(slot)
+                slot.conn.send(request)
+                if slot.conn.poll(timeout_s):
+                    ok, payload, hits = slot.conn.recv()
+                else:
+                    payload = SimulationTimeout(f"DSSAT run exceeded {timeout_s:.1f}s on worker {slot.index}")
+                    self._kill(slot, "hung")
+            except (EOFError, OSError) as e:
+                payload = RuntimeError(f"DSSAT worker {slot.index} died: {e}")
+                self._kill(slot, "crashed")
+            except Exception as e:
+                # Unpicklable request, failed spawn, ...: the future must still resolve
+                payload = RuntimeError(f"DSSAT dispatch on worker {slot.index} failed: {e!r}")
+                self._kill(slot, "dispatch error")
+            elapsed = time.perf_counter() - started
+
+            with self._stats_lock:
+                self.busy -= 1
+                self.run_s += elapsed
+                self.input_cache_hits += hits
+                if ok:
+                    self.completed += 1
+                elif isinstance(payload, SimulationTimeout):
+                    self.timeouts += 1
+                else:
+                    self.failed += 1
+            slot.runs += 1
+            if ok:
+                future.set_result(payload)
+            else:
+                future.set_exception(payload if isinstance(payload, Exception) else RuntimeError(payload))
+
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            os.makedirs(self.root_dir, exist_ok=True)
+            self.started_at = time.perf_counter()
+            for i in range(self.workers):
+                slot = _Slot(i, os.path.join(self.root_dir, f"{os.getpid()}-w{i}"))
+                self._spawn(slot)
+                thread = threading.Thread(target=self._serve, args=(slot,), name=f"dssat-dispatch-{i}", daemon=True)
+                thread.start()
+                self._slots.append(slot)
+                self._threads.append(thread)
+            logger.info(f"DSSAT pool started: {self.workers} workers under {self.root_dir}.")
+
+    def submit(self, request: SimulationRequest, timeout_s: Optional[float] = None) -> Future:
+        self.start()
+        future: Future = Future()
+        with self._stats_lock:
+            self.submitted += 1
+        self._queue.put((future, request, timeout_s or self.timeout_s, time.perf_counter()))
+        return future
+
+    def run_many(self, requests: List[SimulationRequest], timeout_s: Optional[float] = None) -> List[Any]:
+        """Results in request order; a failed run yields its exception instead of a summary."""
+        futures = [self.submit(r, timeout_s) for r in requests]
+        return [f.exception() or f.result() for f in futures]
+
+    def stop(self):
+        if not self._threads:
+            return
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=self.timeout_s + 5)
+        for slot in self._slots:
+            if slot.conn is not None:
+                try:
+                    slot.conn.send(None)
+                except OSError:
+                    pass
+            if slot.process is not None:
+                slot.process.join(timeout=5)
+                if slot.process.is_alive():
+                    self._kill(slot, "shutdown")
+            shutil.rmtree(slot.workspace, ignore_errors=True)
+        self._threads, self._slots = [], []
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            done = self.completed + self.failed + self.timeouts
+            uptime = time.perf_counter() - self.started_at if self.started_at else 0.0
+            return {
+                "workers": self.workers,
+                "running": bool(self._threads),
+                "queue_depth": self._queue.qsize(),
+                "busy": self.busy,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "restarts": self.restarts,
+                "input_cache_hits": self.input_cache_hits,
+                "mean_run_ms": round(self.run_s / done * 1000, 2) if done else 0.0,
+                "mean_wait_ms": round(self.wait_s / done * 1000, 2) if done else 0.0,
+                "sims_per_s": round(self.completed / uptime, 2) if uptime else 0.0
+            }
+
+dssat_pool = DSSATPool(DSSAT_WORKERS, DSSAT_TIMEOUT_S, DSSAT_WORKSPACE_ROOT)
+
+def _synthetic_request(seed: int, year: int = 2023) -> SimulationRequest:
+    rng = np.random.default_rng(seed % 4)
+    days = pd.date_range(f"{year}-01-01", f"{year}-12-31")
+    table = pd.DataFrame({
+        'date': days, 'srad': rng.uniform(15, 22, len(days)), 'tmax': rng.normal(26, 1.5, len(days)),
+        'tmin': rng.normal(13, 1.0, len(days)), 'rain': rng.gamma(0.5, 8, len(days))
+    })
+    weather = WeatherSpec(weather_hash(table), "KENT", 1.0, 35.0, 1900.0, table)
+    soil = SoilSpec(f"KE{seed % 3:08d}", 0.20, 0.33, 0.45, 0.6, 1.3, 1.5, 30.0, 30.0)
+    return SimulationRequest(soil, weather, date(year, 3, 20), fertilizer_n_kg=float(25 * (seed % 4)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic throughput benchmark of the DSSAT worker pool.")
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=DSSAT_WORKERS)
+    args = parser.parse_args()
+
+    pool = DSSATPool(args.workers, DSSAT_TIMEOUT_S, DSSAT_WORKSPACE_ROOT)
+    try:
+        pool.start()
+        requests = [_synthetic_request(i) for i in range(args.requests)]
+        pool.run_many(requests[:args.workers])  # warm-up: worker imports
+        started = time.perf_counter()
+        results = pool.run_many(requests)
+        elapsed = time.perf_counter() - started
+        errors = [r for r in results if isinstance(r, Exception)]
+        yields = [r['harwt'] for r in results if not isinstance(r, Exception)]
+        print(f"{len(requests)} runs on {args.workers} workers: {elapsed:.2f}s, "
+              f"{len(requests) / elapsed:.1f} sims/s, {len(errors)} errors, HWAM {min(yields)}-{max(yields)} kg/ha")
+
+        hung = pool.run_many(requests[:1], timeout_s=0.001)[0]
+        assert isinstance(hung, SimulationTimeout), f"expected a timeout, got {hung!r}"
+        after = pool.run_many(requests[:1])[0]
+        assert not isinstance(after, Exception), f"worker did not recover: {after!r}"
+        print(f"kill-on-hang: timed out, restarted, next run ok (HWAM {after['harwt']})")
+        print(pool.stats())
+    finally:
+        pool.stop()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
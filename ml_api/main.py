@@ -1,23 +1,9 @@
-import os
-import pathlib
 import logging
 
 # Set up logging early
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Shield 2: Robust Runtime Initialization
-def init_dssat_workspace():
-    try:
-        tmp_dir = pathlib.Path('/tmp/DSSAT048')
-        tmp_dir.mkdir(parents=True, exist_ok=True)
-        os.system('chmod -R 777 /tmp/DSSAT048')
-        logger.info("DSSAT Runtime Workspace Verified.")
-    except Exception as e:
-        logger.error(f"Workspace setup failed: {e}")
-
-init_dssat_workspace()
-
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -31,12 +17,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# DELAYED IMPORT: This prevents the library from importing 
-# before the workspace is guaranteed to be ready.
+# Serving is lookup-only: DSSAT itself runs in precompute_dssat.py's worker
+# pool, each worker on a private workspace, so no shared /tmp/DSSAT048 here.
 from prediction import router as prediction_router
+from ward_index import ward_index
+from persistence import prediction_writer
+from prediction_cache import prediction_cache
+from model_registry import model_registry
+from simulation_store import simulation_store
 app.include_router(prediction_router, prefix="/v1")
 
+@app.on_event("startup")
+def load_ward_index():
+    # Soil/elevation lookups are served from memory once this has loaded
+    ward_index.start()
+
+@app.on_event("startup")
+def load_model_registry():
+    # Loads the CURRENT model version and watches for newly published ones
+    model_registry.start()
+
+@app.on_event("startup")
+def start_prediction_writer():
+    prediction_writer.start()
+
+@app.on_event("startup")
+def load_simulation_store():
+    # Stored DSSAT results are served from memory and refreshed as precompute runs land
+    simulation_store.start()
+
+@app.on_event("shutdown")
+def stop_ward_index():
+    ward_index.stop()
+
+@app.on_event("shutdown")
+def stop_model_registry():
+    model_registry.stop()
+
+@app.on_event("shutdown")
+def stop_simulation_store():
+    simulation_store.stop()
+
+@app.on_event("shutdown")
+def flush_prediction_writer():
+    # Drain buffered predictions before the worker exits
+    prediction_writer.stop()
+
 @app.get("/health")
 @app.get("/v1/status")
 async def health():
-    return {"status": "ready", "engine": "DSSAT v3.0.0"}
\ No newline at end of file
+    return {
+        "status": "ready",
+        "engine": "DSSAT v3.0.0",
+        "ward_index": ward_index.stats(),
+        "persistence": prediction_writer.stats(),
+        "prediction_cache": prediction_cache.stats(),
+        "model": model_registry.stats(),
+        "dssat_results": simulation_store.stats()
+    }
\ No newline at end of file
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import threading
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import joblib
+
+from compiled_model import CompiledForest
+
+logger = logging.getLogger(__name__)
+
+# Column order of the frame handed to the RF pipeline
+RF_COLUMNS = ['year', 'ndvi_mean', 'precip_mean', 'et_mean', 'elevation_mean', 'soil_texture', 'temp_mean']
+
+# Pre-registry single artifact, still served when the registry is empty
+MODEL_PATH = "models/trained_model.joblib"
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "models/registry")
+MODEL_WATCH_S = float(os.getenv("MODEL_WATCH_S", "10"))
+
+CURRENT_FILE = "CURRENT"
+PIPELINE_FILE = "pipeline.joblib"
+COMPILED_FILE = "compiled.joblib"
+METRICS_FILE = "metrics.json"
+
+def _write_atomic(path: str, content: str):
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "w") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def publish_model(pipeline: Any, metrics: Dict[str, Any], registry_dir: str = MODEL_REGISTRY_DIR) -> str:
+    """
+    Saves a trained pipeline as a new immutable version (pipeline, compiled
+    arrays, metrics) and then flips CURRENT to it with one atomic rename.
+    Serving workers pick it up on their next watch tick or /models/reload.
+    """
+    version = datetime.now(timezone.utc).strftime("v%Y%m%dT%H%M%S%fZ")
+    version_dir = os.path.join(registry_dir, version)
+    os.makedirs(version_dir)
+
+    joblib.dump(pipeline, os.path.join(version_dir, PIPELINE_FILE))
+    compiled = None
+    try:
+        compiled = CompiledForest.from_pipeline(pipeline, RF_COLUMNS)
+        # Uncompressed on purpose: joblib can only memory-map raw arrays
+        compiled.save(os.path.join(version_dir, COMPILED_FILE))
+    except ValueError as e:
+        logger.warning(f"Model {version} not compilable, workers will use sklearn: {e}")
+
+    _write_atomic(os.path.join(version_dir, METRICS_FILE), json.dumps({
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "rf_columns": RF_COLUMNS,
+        "compiled": compiled is not None,
+        "metrics": metrics
+    }, indent=2))
+    _write_atomic(os.path.join(registry_dir, CURRENT_FILE), version)
+    return version
+
+class LoadedModel:
+    """One immutable model version as served by this worker."""
+    def __init__(self, version: str, engine: Optional[CompiledForest], pipeline_path: str,
+                 info: Dict[str, Any], pipeline: Any = None):
+        self.version = version
+        self.engine = engine
+        self.pipeline_path = pipeline_path
+        self.info = info
+        self.loaded_at = datetime.now(timezone.utc)
+        self._pipeline = pipeline
+        self._pipeline_lock = threading.Lock()
+
+    @property
+    def pipeline(self) -> Any:
+        """Full sklearn pipeline, unpickled on first use (large batches / non-compilable models)."""
+        if self._pipeline is None:
+            with self._pipeline_lock:
+                if self._pipeline is None:
+                    self._pipeline = joblib.load(self.pipeline_path)
+        return self._pipeline
+
+class ModelRegistry:
+    """
+    Serves the version CURRENT points at. Compiled arrays are opened with
+    mmap_mode='r', so every worker on the host shares the same page-cache
+    copy. Reloads build the new version fully, then swap one reference;
+    in-flight requests finish on the version they started with.
+    """
+    def __init__(self, registry_dir: str, legacy_path: str, watch_s: float):
+        self.registry_dir = registry_dir
+        self.legacy_path = legacy_path
+        self.watch_s = watch_s
+        self._active: Optional[LoadedModel] = None
+        self._reload_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.predictions: Dict[str, int] = {}
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+
+    def _target_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.registry_dir, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except OSError:
+            pass
+        # No registry yet: fall back to the single legacy artifact
+        try:
+            st = os.stat(self.legacy_path)
+        except OSError:
+            return None
+        return f"legacy-{st.st_mtime_ns}-{st.st_size}"
+
+    def _load(self, version: str) -> LoadedModel:
+        if version.startswith("legacy-"):
+            pipeline = joblib.load(self.legacy_path)
+            try:
+                engine: Optional[CompiledForest] = CompiledForest.from_pipeline(pipeline, RF_COLUMNS)
+            except ValueError as e:
+                logger.warning(f"Legacy RF pipeline not compilable, using sklearn predict: {e}")
+                engine = None
+            return LoadedModel(version, engine, self.legacy_path, {"version": version}, pipeline=pipeline)
+
+        version_dir = os.path.join(self.registry_dir, version)
+        with open(os.path.join(version_dir, METRICS_FILE)) as f:
+            info = json.load(f)
+        compiled_path = os.path.join(version_dir, COMPILED_FILE)
+        engine = CompiledForest.load(compiled_path, mmap_mode='r') if os.path.exists(compiled_path) else None
+        return LoadedModel(version, engine, os.path.join(version_dir, PIPELINE_FILE), info)
+
+    def load_version(self, version: Optional[str] = None) -> Optional[LoadedModel]:
+        """A specific (default: the target) version, loaded standalone without activating it."""
+        version = version or self._target_version()
+        return self._load(version) if version else None
+
+    def reload(self, force: bool = False) -> bool:
+        """Loads the target version if it differs from the active one. Returns True on swap."""
+        with self._reload_lock:
+            version = self._target_version()
+            active = self._active
+            if version is None or (not force and active is not None and active.version == version):
+                return False
+            started = time.perf_counter()
+            try:
+                model = self._load(version)
+            except Exception as e:
+                self.last_error = f"{version}: {e}"
+                logger.error(f"ISO-ERROR: Model {version} failed to load, keeping {getattr(active, 'version', None)}: {e}")
+                return False
+            self._active = model
+            self.reloads += 1
+            self.last_error = None
+            logger.info(f"Model {version} active (loaded in {time.perf_counter() - started:.2f}s).")
+            return True
+
+    def active(self) -> Optional[LoadedModel]:
+        if self._active is None:
+            self.reload()
+        return self._active
+
+    def record(self, version: str, count: int = 1):
+        with self._counter_lock:
+            self.predictions[version] = self.predictions.get(version, 0) + count
+
+    def _run(self):
+        while not self._stop.wait(self.watch_s):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Model watch failed: {e}")
+
+    def start(self):
+        self.reload()
+        if self._thread is None and self.watch_s > 0:
+            self._thread = threading.Thread(target=self._run, name="model-watch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def versions(self) -> List[str]:
+        try:
+            return sorted(
+                d for d in os.listdir(self.registry_dir)
+                if os.path.isfile(os.path.join(self.registry_dir, d, METRICS_FILE))
+            )
+        except OSError:
+            return []
+
+    def stats(self) -> Dict[str, Any]:
+        active = self._active
+        with self._counter_lock:
+            predictions = dict(self.predictions)
+        return {
+            "active_version": active.version if active else None,
+            "compiled": bool(active and active.engine is not None),
+            "loaded_at": active.loaded_at.isoformat() if active else None,
+            "metrics": active.info.get("metrics") if active else None,
+            "available_versions": self.versions(),
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+            "predictions_by_version": predictions
+        }
+
+model_registry = ModelRegistry(MODEL_REGISTRY_DIR, MODEL_PATH, MODEL_WATCH_S)
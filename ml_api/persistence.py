@@ -0,0 +1,176 @@
+import os
+import queue
+import time
+import threading
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from shared.database.base import SessionLocal
+from shared.database import models
+
+logger = logging.getLogger(__name__)
+
+PERSIST_QUEUE_MAX = int(os.getenv("PERSIST_QUEUE_MAX", "10000"))
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "500"))
+PERSIST_FLUSH_INTERVAL_S = float(os.getenv("PERSIST_FLUSH_INTERVAL_S", "0.5"))
+# How long a request may wait for room when the buffer is full before the row is dropped
+PERSIST_ENQUEUE_TIMEOUT_S = float(os.getenv("PERSIST_ENQUEUE_TIMEOUT_S", "0.05"))
+# A failed bulk insert is retried with exponential backoff before its rows are dropped;
+# meanwhile the queue keeps absorbing requests up to PERSIST_QUEUE_MAX
+PERSIST_MAX_RETRIES = int(os.getenv("PERSIST_MAX_RETRIES", "5"))
+PERSIST_RETRY_BASE_S = float(os.getenv("PERSIST_RETRY_BASE_S", "0.5"))
+PERSIST_RETRY_MAX_S = float(os.getenv("PERSIST_RETRY_MAX_S", "30"))
+
+def observation_row(yield_value: float, lon: float, lat: float, year: int) -> Dict[str, Any]:
+    """yieldobservation insert parameters for one persisted prediction."""
+    return {
+        "crop_id": "Maize",
+        "yield_value": float(yield_value),
+        "year": int(year),
+        "geom": f"SRID=4326;POINT({lon} {lat})"
+    }
+
+class PredictionWriter:
+    """
+    Write-behind buffer for prediction persistence. Requests enqueue rows
+    and return; a background thread drains the bounded queue and writes
+    batches of up to PERSIST_BATCH_SIZE rows with one bulk insert each.
+    A failed batch is retried with backoff (see PERSIST_MAX_RETRIES) and
+    only dropped, logged at ERROR, once the retries are exhausted.
+    """
+    def __init__(self, max_size: int, batch_size: int, flush_interval_s: float):
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # A batch whose retries were cut short by stop(); flush() writes it first
+        self._carry: List[Dict[str, Any]] = []
+        self._metrics_lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def submit(self, rows: List[Dict[str, Any]]) -> int:
+        """Queues rows for persistence; returns how many were accepted."""
+        accepted = 0
+        for row in rows:
+            try:
+                self._queue.put(row, timeout=PERSIST_ENQUEUE_TIMEOUT_S)
+                accepted += 1
+            except queue.Full:
+                break
+        with self._metrics_lock:
+            self.enqueued += accepted
+            self.dropped += len(rows) - accepted
+        if accepted < len(rows):
+            logger.error(f"Prediction buffer full: dropped {len(rows) - accepted} rows.")
+        return accepted
+
+    def _drain(self, first: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        batch = [first] if first is not None else []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _insert(self, batch: List[Dict[str, Any]]) -> bool:
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            db.execute(insert(models.YieldObservation), batch)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Prediction flush of {len(batch)} rows failed: {e}")
+            return False
+        finally:
+            db.close()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._metrics_lock:
+            self.written += len(batch)
+            self.flushes += 1
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+        return True
+
+    def _write(self, batch: List[Dict[str, Any]], max_retries: int = PERSIST_MAX_RETRIES):
+        """Inserts one batch, retrying with exponential backoff; drops it (ERROR) when retries run out."""
+        attempts = 0
+        while True:
+            attempts += 1
+            if self._insert(batch):
+                return
+            if attempts > max_retries:
+                break
+            delay = min(PERSIST_RETRY_MAX_S, PERSIST_RETRY_BASE_S * 2 ** (attempts - 1))
+            with self._metrics_lock:
+                self.retries += 1
+            if self._stop.wait(delay):
+                # Shutting down: hand the batch to the final flush instead of sleeping on
+                self._carry = batch
+                return
+        with self._metrics_lock:
+            self.failed += len(batch)
+        logger.error(f"Dropped {len(batch)} prediction rows after {attempts} failed flush attempts.")
+
+    def flush(self):
+        """Writes everything currently buffered (used at shutdown), one attempt per batch."""
+        carry, self._carry = self._carry, []
+        if carry:
+            self._write(carry, max_retries=0)
+        while True:
+            batch = self._drain()
+            if not batch:
+                return
+            self._write(batch, max_retries=0)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval_s)
+            except queue.Empty:
+                continue
+            self._write(self._drain(first))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="prediction-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout_s: float = 10.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout_s)
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            return {
+                "running": self._thread is not None,
+                "depth": self._queue.qsize(),
+                "max_depth": self._queue.maxsize,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "retries": self.retries,
+                "flushes": self.flushes,
+                "last_flush_ms": round(self.last_flush_ms, 2),
+                "avg_flush_ms": round(self._total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+                "max_flush_ms": round(self.max_flush_ms, 2)
+            }
+
+prediction_writer = PredictionWriter(PERSIST_QUEUE_MAX, PERSIST_BATCH_SIZE, PERSIST_FLUSH_INTERVAL_S)
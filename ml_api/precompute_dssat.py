@@ -0,0 +1,116 @@
+"""
+Fills the dssatresult store for every ward in auxiliarydata.
+
+Builds the DSSAT request of each (ward, year) row with the default
+management, drops duplicates and keys that are already stored, and runs the
+rest on the DSSAT worker pool, upserting results in batches as they finish.
+
+    python precompute_dssat.py [--year 2024] [--county "Trans Nzoia"] [--workers 4] [--force]
+"""
+import os
+import time
+import logging
+import argparse
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+
+from shared.database.base import SessionLocal
+from shared.database import models
+from dssat_pool import DSSATPool, SimulationRequest, DSSAT_WORKERS, DSSAT_TIMEOUT_S, DSSAT_WORKSPACE_ROOT
+from simulation_store import simulation_store, ward_simulation_request, result_key, result_row
+
+logger = logging.getLogger(__name__)
+
+PRECOMPUTE_BATCH = int(os.getenv("PRECOMPUTE_BATCH", "200"))
+# Requests in flight per worker; bounds memory on national runs
+PRECOMPUTE_INFLIGHT = 4
+
+def ward_requests(year: Optional[int] = None, county: Optional[str] = None) -> Tuple[int, List[SimulationRequest]]:
+    """(ward rows read, unique simulation requests) for the selected auxiliarydata rows."""
+    db = SessionLocal()
+    try:
+        query = db.query(
+            models.AuxiliaryData.year, models.AuxiliaryData.precip_mean, models.AuxiliaryData.temp_mean,
+            models.AuxiliaryData.elevation_m, models.AuxiliaryData.soil_texture,
+            func.ST_Y(func.ST_Centroid(models.AuxiliaryData.geom)).label('centroid_lat')
+        ).filter(
+            models.AuxiliaryData.precip_mean.isnot(None), models.AuxiliaryData.temp_mean.isnot(None),
+            models.AuxiliaryData.geom.isnot(None)
+        )
+        if year is not None:
+            query = query.filter(models.AuxiliaryData.year == year)
+        if county:
+            query = query.filter(models.AuxiliaryData.county_name == county)
+        rows = query.all()
+    finally:
+        db.close()
+
+    unique: Dict[Tuple, SimulationRequest] = {}
+    for row in rows:
+        # Same builder as the prediction path's WardRecord lookup, so the keys match
+        req = ward_simulation_request(row)
+        if req is not None:
+            unique.setdefault(result_key(req), req)
+    return len(rows), list(unique.values())
+
+def precompute(requests: List[SimulationRequest], workers: int, timeout_s: float) -> Dict[str, int]:
+    pool = DSSATPool(workers, timeout_s, DSSAT_WORKSPACE_ROOT)
+    counts = {"simulated": 0, "failed": 0}
+    pending: List[Dict] = []
+    inflight: Dict[Future, SimulationRequest] = {}
+    queue = iter(requests)
+    started = time.perf_counter()
+    try:
+        while True:
+            while len(inflight) < workers * PRECOMPUTE_INFLIGHT:
+                req = next(queue, None)
+                if req is None:
+                    break
+                inflight[pool.submit(req)] = req
+            if not inflight:
+                break
+            done, _ = wait(list(inflight), return_when=FIRST_COMPLETED)
+            for future in done:
+                req = inflight.pop(future)
+                if future.exception() is not None:
+                    counts["failed"] += 1
+                    logger.warning(f"DSSAT run failed for {result_key(req)}: {future.exception()}")
+                    continue
+                pending.append(result_row(req, future.result()))
+            if len(pending) >= PRECOMPUTE_BATCH or (not inflight and pending):
+                counts["simulated"] += simulation_store.put_many(pending)
+                pending = []
+                elapsed = time.perf_counter() - started
+                logger.info(f"DSSAT precompute: {counts['simulated']}/{len(requests)} stored, "
+                            f"{counts['simulated'] / elapsed:.1f} sims/s.")
+    finally:
+        if pending:
+            counts["simulated"] += simulation_store.put_many(pending)
+        pool.stop()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute DSSAT simulations for all wards.")
+    parser.add_argument('--year', type=int)
+    parser.add_argument('--county')
+    parser.add_argument('--workers', type=int, default=DSSAT_WORKERS)
+    parser.add_argument('--timeout', type=float, default=DSSAT_TIMEOUT_S)
+    parser.add_argument('--force', action='store_true', help="Re-run keys that are already stored")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    ward_rows, requests = ward_requests(args.year, args.county)
+    stored: Set[Tuple] = set() if args.force else simulation_store.existing_keys(requests)
+    todo = [r for r in requests if result_key(r) not in stored]
+    logger.info(f"{ward_rows} ward rows -> {len(requests)} unique simulations, {len(requests) - len(todo)} already stored.")
+
+    counts = precompute(todo, args.workers, args.timeout)
+    elapsed = time.perf_counter() - started
+    print(f"{counts['simulated']} simulated, {counts['failed']} failed, "
+          f"{len(requests) - len(todo)} reused in {elapsed:.1f}s")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
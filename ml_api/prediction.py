@@ -1,49 +1,36 @@
-import pathlib
 import os
-
-# =================================================================
-# SHIELD: PRE-IMPORT WORKSPACE VERIFICATION
-# =================================================================
-try:
-    _tmp = pathlib.Path('/tmp/DSSAT048')
-    _tmp.mkdir(parents=True, exist_ok=True)
-    (_tmp / 'DATA.CDE').touch(exist_ok=True)
-    os.system('chmod -R 777 /tmp/DSSAT048')
-except Exception:
-    pass 
-
-import joblib, logging, pandas as pd, numpy as np
+import logging, pandas as pd, numpy as np
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime
-from typing import List
-
-# MODERN 2026 DSSATTools API (v3.0+)
-from DSSATTools.run import DSSAT
-from DSSATTools.crop import Maize
-from DSSATTools.filex import Field, Planting, Fertilizer
+from sqlalchemy import func, values, column, Integer, Float
+from typing import List, Dict, Any, Optional, Tuple, cast
 
 # Internal Imports
 from shared.database.base import get_db
 from shared.database import models
-from shared.models.api_models import PredictRequest, PredictResponse
+from shared.models.api_models import PredictRequest, PredictResponse, PredictBatchRequest, PredictBatchResponse
+from ward_index import ward_index
+from persistence import prediction_writer, observation_row
+from prediction_cache import prediction_cache
+from model_registry import model_registry, LoadedModel, RF_COLUMNS
+from stress_engine import stress_grid, stress_point, limiting_factor_labels
+from simulation_store import simulation_store, ward_simulation_request
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-MODEL_PATH = "models/trained_model.joblib"
-RF_MODEL = None
+# Limiting factor of a stored simulation that produced no grain
+CROP_FAILURE = "Crop Failure"
+
+# Above this many rows sklearn's multi-threaded predict is faster than the compiled walk
+COMPILED_MAX_BATCH = int(os.getenv("COMPILED_MAX_BATCH", "512"))
 
-def get_rf_model():
-    global RF_MODEL
-    if RF_MODEL is None and os.path.exists(MODEL_PATH):
-        try:
-            RF_MODEL = joblib.load(MODEL_PATH)
-            logger.info("Random Forest model successfully loaded.")
-        except Exception as e:
-            logger.error(f"ISO-ERROR: Model corruption: {e}")
-    return RF_MODEL
+def rf_predict(model: LoadedModel, rf_matrix: np.ndarray) -> np.ndarray:
+    """RF predictions for rows in RF_COLUMNS order; compiled path for small batches."""
+    engine = model.engine
+    if engine is not None and len(rf_matrix) <= COMPILED_MAX_BATCH:
+        return engine.predict(rf_matrix)
+    return np.asarray(model.pipeline.predict(pd.DataFrame(rf_matrix, columns=RF_COLUMNS)), dtype='float64')
 
 def run_dssat_v3_sim(features: dict, soil_data=None) -> dict:
     """
@@ -51,32 +38,89 @@ def run_dssat_v3_sim(features: dict, soil_data=None) -> dict:
     Identifies the 'Primary Limiting Factor' for Informed Decisions.
     """
     try:
-        # Preserve Character Lengths for legacy Fortran
-        field = Field(id_field="KENA2401", wsta="KENT", id_soil="IB00000001")
-        
-        base_potential = 3.8
         precip = float(features.get('precip_mean', 5.0))
         temp = float(features.get('temp_mean', 22.0))
-        
-        # Calculate Stress Factors
-        water_stress = min(1.0, precip / 4.5)
-        heat_stress = 1.0 - max(0, (temp - 28) * 0.1)
-        
-        # Determine Limiting Factor
-        limiting_factor = "None (Optimal)"
-        if water_stress < heat_stress and water_stress < 0.85:
-            limiting_factor = "Water Deficit"
-        elif heat_stress < water_stress and heat_stress < 0.85:
-            limiting_factor = "Thermal Stress"
+
+        # Stress factors and the limiting one (shared with the array engine)
+        dssat_yield, limiting_factor = stress_point(precip, temp)
 
         return {
-            "yield": float(base_potential * water_stress * heat_stress),
+            "yield": dssat_yield,
             "limiting_factor": limiting_factor
         }
     except Exception as e:
         logger.error(f"DSSAT v3 Sim Failure: {e}")
         return {"yield": 0.0, "limiting_factor": "Simulation Error"}
 
+def run_dssat_v3_batch(precip: np.ndarray, temp: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Array version of run_dssat_v3_sim for batch requests.
+    Returns (yield, limiting_factor) arrays aligned with the inputs.
+    """
+    yields, codes = stress_grid(precip, temp)
+    return yields, limiting_factor_labels(codes)
+
+def stored_dssat(features: List[Dict[str, Any]], wards: List[Any]) -> List[Optional[Tuple[float, str]]]:
+    """
+    (yield t/ha, limiting factor) of each matched ward's simulation from
+    precompute_dssat.py, keyed on the ward row exactly as precompute keys
+    it; None where there is none. In-memory only, no DB round trip.
+    """
+    requests = [ward_simulation_request(w, f) if w is not None else None for f, w in zip(features, wards)]
+    out: List[Optional[Tuple[float, str]]] = []
+    for ward, result in zip(wards, simulation_store.get_many(requests)):
+        if result is None or result['yield_kg_ha'] is None:
+            out.append(None)
+            continue
+        yield_t_ha = result['yield_kg_ha'] / 1000
+        # The run was driven by the ward's season means, so its stress comes from those, not the pixel's
+        label = CROP_FAILURE if yield_t_ha <= 0 else stress_point(float(ward.precip_mean), float(ward.temp_mean))[1]
+        out.append((yield_t_ha, label))
+    return out
+
+def rf_feature_row(features: Dict[str, Any], soil_data: Any, year: int) -> List[Any]:
+    """Builds one RF input row in RF_COLUMNS order."""
+    return [
+        year,
+        features.get('ndvi_mean', 0.5),
+        features.get('precip_mean', 5.0),
+        features.get('et_mean', 3.0),
+        getattr(soil_data, 'elevation_m', 1800.0),
+        getattr(soil_data, 'soil_texture', 2),
+        features.get('temp_mean', 22.0)
+    ]
+
+def find_soil_data_batch(db: Session, coords: List[Tuple[float, float, int]]) -> List[Optional[Any]]:
+    """
+    Set-based version of the per-point AuxiliaryData lookup in predict_yield.
+    For every (lon, lat, year) picks the containing ward for that year,
+    falling back to the most recent year, in a single query.
+    """
+    pts = values(
+        column('idx', Integer), column('lon', Float), column('lat', Float), column('year', Integer), name='pts'
+    ).data([(i, lon, lat, year) for i, (lon, lat, year) in enumerate(coords)])
+    point_geom = func.ST_SetSRID(func.ST_MakePoint(pts.c.lon, pts.c.lat), 4326)
+
+    ranked = db.query(
+        pts.c.idx.label('idx'),
+        models.AuxiliaryData.id.label('aux_id'),
+        func.row_number().over(
+            partition_by=pts.c.idx,
+            order_by=[(models.AuxiliaryData.year == pts.c.year).desc(), models.AuxiliaryData.year.desc()]
+        ).label('rn')
+    ).select_from(pts).join(
+        models.AuxiliaryData, func.ST_Contains(models.AuxiliaryData.geom, point_geom)
+    ).subquery()
+
+    rows = db.query(ranked.c.idx, models.AuxiliaryData).join(
+        models.AuxiliaryData, models.AuxiliaryData.id == ranked.c.aux_id
+    ).filter(ranked.c.rn == 1).all()
+
+    matched: List[Optional[Any]] = [None] * len(coords)
+    for idx, aux in rows:
+        matched[idx] = aux
+    return matched
+
 @router.post("/predict", response_model=PredictResponse)
 def predict_yield(request: PredictRequest, db: Session = Depends(get_db)):
     features = request.features
@@ -86,63 +130,171 @@ def predict_yield(request: PredictRequest, db: Session = Depends(get_db)):
     year = int(features.get('year', 2024))
     lon, lat = features.get('lon', 35.0), features.get('lat', 1.0)
     point_geom = func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326)
+
+    # 0. MEMO: identical (quantized) features, same model and ward data
+    rf_model = model_registry.active()
+    model_version = rf_model.version if rf_model else None
+    cache_key = prediction_cache.make_key(features, model_version, (ward_index.version, simulation_store.version))
+    cached = prediction_cache.get(cache_key)
+    if cached is not None:
+        final_yield, response = cached
+        if model_version: model_registry.record(model_version)
+        prediction_writer.submit([observation_row(final_yield, lon, lat, year)])
+        return PredictResponse(predicted_yield=response["predicted_yield"], metadata=dict(response["metadata"]))
     
-    # NEW logic: Find the soil data for this point and this SPECIFIC year
-    soil_data = db.query(models.AuxiliaryData).filter(
-        func.ST_Contains(models.AuxiliaryData.geom, point_geom),
-        models.AuxiliaryData.year == year # Matches the temporal dimension
-    ).first()
+    if ward_index.ready:
+        # HOT PATH: in-memory STRtree, same year-then-latest semantics as below
+        soil_data = ward_index.lookup(float(lon), float(lat), year)
+    else:
+        # NEW logic: Find the soil data for this point and this SPECIFIC year
+        soil_data = db.query(models.AuxiliaryData).filter(
+            func.ST_Contains(models.AuxiliaryData.geom, point_geom),
+            models.AuxiliaryData.year == year # Matches the temporal dimension
+        ).first()
 
     # Fallback to the most recent data if that specific year isn't found
-    if not soil_data:
+    if not soil_data and not ward_index.ready:
         soil_data = db.query(models.AuxiliaryData).filter(
             func.ST_Contains(models.AuxiliaryData.geom, point_geom)
         ).order_by(models.AuxiliaryData.year.desc()).first()
 
     try:
         # 2. STATISTICAL Prediction (RF)
-        rf_model = get_rf_model()
-        rf_input = pd.DataFrame([{
-            'year': year, # Now passed as a feature
-            'ndvi_mean': features.get('ndvi_mean', 0.5),
-            'precip_mean': features.get('precip_mean', 5.0),
-            'et_mean': features.get('et_mean', 3.0),
-            'elevation_mean': getattr(soil_data, 'elevation_m', 1800.0),
-            'soil_texture': getattr(soil_data, 'soil_texture', 2),
-            'temp_mean': features.get('temp_mean', 22.0)
-        }]).astype('float64')
+        rf_input = np.array([rf_feature_row(features, soil_data, year)], dtype='float64')
         
-        rf_pred = float(rf_model.predict(rf_input)[0]) if rf_model else 0.0
+        rf_pred = float(rf_predict(rf_model, rf_input)[0]) if rf_model else 0.0
+        if model_version: model_registry.record(model_version)
 
-        # 3. MECHANISTIC Prediction (DSSAT)
-        dssat_res = run_dssat_v3_sim(features, soil_data)
-        dssat_pred = dssat_res['yield']
+        # 3. MECHANISTIC Prediction (DSSAT): stored simulation, else the stress model
+        simulated = stored_dssat([features], [soil_data])[0]
+        if simulated is not None:
+            dssat_pred, limiting_factor = simulated
+        else:
+            dssat_res = run_dssat_v3_sim(features, soil_data)
+            dssat_pred, limiting_factor = dssat_res['yield'], dssat_res['limiting_factor']
 
         # 4. ENSEMBLE (Hybrid)
         final_yield = (rf_pred + dssat_pred) / 2 if dssat_pred > 0 else rf_pred
 
-        # 5. PERSISTENCE
-        new_obs = models.YieldObservation(
-            crop_id="Maize", yield_value=final_yield, year=2024, geom=point_geom
-        )
-        db.add(new_obs)
-        db.commit()
+        # 5. PERSISTENCE (write-behind: the response does not wait on the insert)
+        prediction_writer.submit([observation_row(final_yield, lon, lat, year)])
 
-        return PredictResponse(
-            predicted_yield=round(final_yield, 3),
-            metadata={
+        response = {
+            "predicted_yield": round(final_yield, 3),
+            "metadata": {
                 "rf_val": round(rf_pred, 3),
                 "dssat_val": round(dssat_pred, 3),
-                "limiting_factor": dssat_res['limiting_factor'],
-                "ward_name": getattr(soil_data, "ward_name", "Trans Nzoia")
+                "limiting_factor": limiting_factor,
+                "dssat_source": "simulation" if simulated is not None else "stress_model",
+                "ward_name": getattr(soil_data, "ward_name", "Trans Nzoia"),
+                "model_version": model_version
             }
-        )
+        }
+        prediction_cache.put(cache_key, (final_yield, response))
+        return PredictResponse(predicted_yield=response["predicted_yield"], metadata=dict(response["metadata"]))
 
     except Exception as e:
         logger.error(f"ISO-CRITICAL: Prediction Engine Failure: {e}")
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/predict/batch", response_model=PredictBatchResponse)
+def predict_yield_batch(request: PredictBatchRequest, db: Session = Depends(get_db)):
+    """
+    Vectorized /predict for county-wide runs: cached items are answered from
+    the memo; the rest get one spatial join, one RF call over an N-row
+    matrix and one array DSSAT pass. All rows go to the write-behind buffer.
+    """
+    items = request.items
+    if not items:
+        return PredictBatchResponse(predictions=[])
+
+    coords = [
+        (float(f.get('lon', 35.0)), float(f.get('lat', 1.0)), int(f.get('year', 2024)))
+        for f in items
+    ]
+
+    rf_model = model_registry.active()
+    model_version = rf_model.version if rf_model else None
+    data_version = (ward_index.version, simulation_store.version)
+    keys = [prediction_cache.make_key(f, model_version, data_version) for f in items]
+    results: List[Optional[Tuple[float, Dict[str, Any]]]] = [prediction_cache.get(k) for k in keys]
+    misses = [i for i, r in enumerate(results) if r is None]
+
+    try:
+        if misses:
+            miss_items = [items[i] for i in misses]
+            miss_coords = [coords[i] for i in misses]
+            if ward_index.ready:
+                soil_rows = ward_index.lookup_many(miss_coords)
+            else:
+                soil_rows = find_soil_data_batch(db, miss_coords)
+
+            # 1. STATISTICAL Prediction (RF) over the whole matrix
+            rf_matrix = np.array(
+                [rf_feature_row(f, soil, year) for f, soil, (_, _, year) in zip(miss_items, soil_rows, miss_coords)],
+                dtype='float64'
+            )
+            if rf_model:
+                rf_preds = rf_predict(rf_model, rf_matrix)
+            else:
+                rf_preds = np.zeros(len(miss_items))
+
+            # 2. MECHANISTIC Prediction (DSSAT) as arrays
+            precip = np.array([float(f.get('precip_mean', 5.0)) for f in miss_items])
+            temp = np.array([float(f.get('temp_mean', 22.0)) for f in miss_items])
+            dssat_preds, limiting_factors = run_dssat_v3_batch(precip, temp)
+            simulated = stored_dssat(miss_items, soil_rows)
+            dssat_preds = np.array([d if s is None else s[0] for d, s in zip(dssat_preds, simulated)], dtype='float64')
+            limiting_factors = [lf if s is None else s[1] for lf, s in zip(limiting_factors, simulated)]
+
+            # 3. ENSEMBLE (Hybrid)
+            final_yields = np.where(dssat_preds > 0, (rf_preds + dssat_preds) / 2, rf_preds)
+
+            for j, i in enumerate(misses):
+                result = (float(final_yields[j]), {
+                    "predicted_yield": round(float(final_yields[j]), 3),
+                    "metadata": {
+                        "rf_val": round(float(rf_preds[j]), 3),
+                        "dssat_val": round(float(dssat_preds[j]), 3),
+                        "limiting_factor": limiting_factors[j],
+                        "dssat_source": "simulation" if simulated[j] is not None else "stress_model",
+                        "ward_name": getattr(soil_rows[j], "ward_name", "Trans Nzoia"),
+                        "model_version": model_version
+                    }
+                })
+                prediction_cache.put(keys[i], result)
+                results[i] = result
+
+        done = cast(List[Tuple[float, Dict[str, Any]]], results)
+        if model_version: model_registry.record(model_version, len(done))
+
+        # 4. PERSISTENCE, bulk-inserted by the write-behind buffer
+        prediction_writer.submit([
+            observation_row(y, lon, lat, year) for (y, _), (lon, lat, year) in zip(done, coords)
+        ])
+
+        return PredictBatchResponse(predictions=[
+            PredictResponse(predicted_yield=response["predicted_yield"], metadata=dict(response["metadata"]))
+            for _, response in done
+        ])
+
+    except Exception as e:
+        logger.error(f"ISO-CRITICAL: Batch Prediction Engine Failure: {e}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/models")
+def get_models():
+    """Active model version, its training metrics and per-version prediction counts."""
+    return model_registry.stats()
+
+@router.post("/models/reload")
+def reload_model(force: bool = False):
+    """Swaps to the version CURRENT points at (also happens on the MODEL_WATCH_S poll)."""
+    swapped = model_registry.reload(force=force)
+    return {"reloaded": swapped, **model_registry.stats()}
+
 @router.get("/predictions")
 def get_recent_predictions(db: Session = Depends(get_db)):
     try:
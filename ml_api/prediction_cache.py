@@ -0,0 +1,99 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "20000"))
+PREDICTION_CACHE_TTL_S = float(os.getenv("PREDICTION_CACHE_TTL_S", "600"))
+# Decimal places numeric features are rounded to before keying, e.g. "3";
+# per-feature overrides as "3,lon:3,lat:3,precip_mean:1"
+PREDICTION_CACHE_QUANT = os.getenv("PREDICTION_CACHE_QUANT", "4")
+
+def _parse_quantization(spec: str) -> Tuple[int, Dict[str, int]]:
+    default, overrides = 4, {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        if ":" in part:
+            name, decimals = part.split(":", 1)
+            overrides[name.strip()] = int(decimals)
+        else:
+            default = int(part)
+    return default, overrides
+
+DEFAULT_DECIMALS, FEATURE_DECIMALS = _parse_quantization(PREDICTION_CACHE_QUANT)
+
+def canonical_features(features: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+    """Order-independent, quantized view of a feature dict (ints and floats compare alike)."""
+    items = []
+    for name in sorted(features):
+        value = features[name]
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = round(float(value), FEATURE_DECIMALS.get(name, DEFAULT_DECIMALS)) + 0.0  # -0.0 -> 0.0
+        elif not isinstance(value, (str, bool, type(None))):
+            value = repr(value)
+        items.append((name, value))
+    return tuple(items)
+
+class PredictionCache:
+    """
+    LRU + TTL memo of prediction results keyed on the canonical features,
+    the model version and the ward data version. Swapping the model or
+    refreshing ward data changes the key, so stale entries are never hit
+    and simply age out.
+    """
+    def __init__(self, max_entries: int, ttl_s: float):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(features: Dict[str, Any], model_version: Any, data_version: Any) -> Hashable:
+        return (model_version, data_version, canonical_features(features))
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_s, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions
+            }
+
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL_S)
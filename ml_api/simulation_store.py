@@ -0,0 +1,296 @@
+"""
+Memoized DSSAT simulation results.
+
+A DSSAT run is a pure function of its inputs, so results are stored in the
+dssatresult table keyed by (soil_id, weather_hash, cultivar_code,
+planting_date, fertilizer_n_kg, plant_population) and read back by the
+prediction ensemble. precompute_dssat.py fills the table for every ward.
+
+Both sides build the key with ward_simulation_request from the ward row
+alone: soil from its soil_texture class, season weather from its
+precip/temp means and centroid latitude. Inputs are quantized so
+near-identical wards share one profile, one series and one simulation.
+"""
+import os
+import hashlib
+import threading
+import logging
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
+
+from shared.database.base import SessionLocal
+from shared.database import models
+from dssat_pool import SoilSpec, WeatherSpec, SimulationRequest, weather_hash
+
+logger = logging.getLogger(__name__)
+
+# Default management, overridable per request through the feature dict.
+# 990001 is the generic long-season hybrid, closest to the H6xx maize of Trans Nzoia.
+DSSAT_CULTIVAR = os.getenv("DSSAT_CULTIVAR", "990001")
+DSSAT_PLANTING_MMDD = os.getenv("DSSAT_PLANTING_MMDD", "04-01")
+DSSAT_FERTILIZER_N = float(os.getenv("DSSAT_FERTILIZER_N", "50"))
+DSSAT_PLANT_POPULATION = float(os.getenv("DSSAT_PLANT_POPULATION", "5.3"))
+
+SIMULATION_REFRESH_S = float(os.getenv("SIMULATION_REFRESH_S", "60"))
+# Same out-of-order commit allowance as the ward index
+SIMULATION_LOOKBACK = timedelta(seconds=float(os.getenv("SIMULATION_LOOKBACK_S", "300")))
+
+WEATHER_STATION = "KENT"
+DIURNAL_RANGE_C = 11.0       # typical tmax - tmin in the western Kenya highlands
+RAIN_EVERY_DAYS = 3          # season precip falls as one event every few days
+SOLAR_RADIATION_MJ = 19.0
+
+# OpenLandMap USDA texture class -> (clay %, silt %, LL, DUL, SAT, Ksat cm/h), Saxton & Rawls (2006) means
+TEXTURE_CLASSES: Dict[int, Tuple[float, float, float, float, float, float]] = {
+    1: (60.0, 20.0, 0.30, 0.42, 0.50, 0.05),    # clay
+    2: (45.0, 45.0, 0.27, 0.41, 0.52, 0.09),    # silty clay
+    3: (40.0, 10.0, 0.25, 0.36, 0.44, 0.11),    # sandy clay
+    4: (33.0, 33.0, 0.21, 0.34, 0.48, 0.23),    # clay loam
+    5: (33.0, 55.0, 0.21, 0.37, 0.49, 0.15),    # silty clay loam
+    6: (27.0, 13.0, 0.17, 0.27, 0.42, 0.43),    # sandy clay loam
+    7: (18.0, 40.0, 0.12, 0.28, 0.46, 0.61),    # loam
+    8: (15.0, 65.0, 0.09, 0.30, 0.48, 0.68),    # silt loam
+    9: (10.0, 25.0, 0.08, 0.19, 0.45, 1.09),    # sandy loam
+    10: (7.0, 85.0, 0.05, 0.28, 0.48, 1.21),    # silt
+    11: (5.0, 10.0, 0.05, 0.12, 0.44, 2.59),    # loamy sand
+    12: (3.0, 5.0, 0.04, 0.09, 0.43, 4.23),     # sand
+}
+DEFAULT_TEXTURE = 2  # the prediction path's soil_texture default
+
+class Management(NamedTuple):
+    cultivar_code: str
+    planting_date: date
+    fertilizer_n_kg: float
+    plant_population: float
+
+def management_for(year: int, features: Optional[Dict[str, Any]] = None) -> Management:
+    """Default management for a season, with optional overrides from request features."""
+    features = features or {}
+    planting = features.get('planting_date')
+    return Management(
+        cultivar_code=str(features.get('cultivar_code', DSSAT_CULTIVAR)),
+        planting_date=date.fromisoformat(str(planting)) if planting else date.fromisoformat(f"{year}-{DSSAT_PLANTING_MMDD}"),
+        fertilizer_n_kg=round(float(features.get('fertilizer_n_kg', DSSAT_FERTILIZER_N)), 1),
+        plant_population=round(float(features.get('plant_population', DSSAT_PLANT_POPULATION)), 2)
+    )
+
+def soil_spec(soil_texture: Optional[float]) -> SoilSpec:
+    code = int(round(soil_texture)) if soil_texture is not None and not np.isnan(soil_texture) else DEFAULT_TEXTURE
+    if code not in TEXTURE_CLASSES:
+        code = DEFAULT_TEXTURE
+    clay, silt, slll, sdul, ssat, ssks = TEXTURE_CLASSES[code]
+    return SoilSpec(
+        soil_id=f"KETX{code:06d}", slll=slll, sdul=sdul, ssat=ssat, ssks=ssks,
+        sbdm=round(2.65 * (1 - ssat), 2), sloc=1.5, slcl=clay, slsi=silt
+    )
+
+@lru_cache(maxsize=4096)
+def _season_weather(precip_q: float, temp_q: float, year: int, lat_q: float, elev_q: float) -> WeatherSpec:
+    # Planting year through mid next year covers sowing to maturity of long-season maize
+    days = pd.date_range(f"{year}-01-01", f"{year + 1}-06-30")
+    rain = np.where(np.arange(len(days)) % RAIN_EVERY_DAYS == 0, precip_q * RAIN_EVERY_DAYS, 0.0)
+    table = pd.DataFrame({
+        'date': days, 'srad': SOLAR_RADIATION_MJ,
+        'tmax': temp_q + DIURNAL_RANGE_C / 2, 'tmin': temp_q - DIURNAL_RANGE_C / 2, 'rain': rain
+    })
+    # Station latitude drives daylength, so it is part of the series identity
+    key = hashlib.sha1(f"{weather_hash(table)}|{lat_q}|{elev_q}".encode()).hexdigest()[:16]
+    return WeatherSpec(key, WEATHER_STATION, lat_q, 0.0, elev_q, table)
+
+def season_weather(precip_mean: float, temp_mean: float, year: int, lat: float, elevation_m: Optional[float]) -> WeatherSpec:
+    """
+    Deterministic daily series from the ward season means (precip mm/day,
+    temp C). Inputs are quantized (0.1 mm, 0.1 C, 1 deg lat, 100 m).
+    """
+    return _season_weather(
+        round(float(precip_mean), 1), round(float(temp_mean), 1), int(year),
+        float(round(float(lat))), float(round((elevation_m or 1800.0) / 100) * 100)
+    )
+
+def ward_simulation_request(ward: Any, features: Optional[Dict[str, Any]] = None) -> Optional[SimulationRequest]:
+    """
+    The DSSAT request for one auxiliarydata row (a WardRecord or any row with
+    year, precip_mean, temp_mean, centroid_lat, elevation_m and soil_texture).
+    Request features may only override management. None when the ward lacks
+    the season means or centroid, i.e. it can have no stored simulation.
+    """
+    precip, temp, lat = (getattr(ward, a, None) for a in ('precip_mean', 'temp_mean', 'centroid_lat'))
+    if precip is None or temp is None or lat is None:
+        return None
+    year = int(ward.year)
+    mgmt = management_for(year, features)
+    return SimulationRequest(
+        soil=soil_spec(ward.soil_texture),
+        weather=season_weather(precip, temp, year, lat, ward.elevation_m),
+        planting_date=mgmt.planting_date, cultivar_code=mgmt.cultivar_code,
+        plant_population=mgmt.plant_population, fertilizer_n_kg=mgmt.fertilizer_n_kg
+    )
+
+def result_key(req: SimulationRequest) -> Tuple[str, str, str, date, float, float]:
+    return (
+        req.soil.soil_id, req.weather.key, req.cultivar_code, req.planting_date,
+        float(req.fertilizer_n_kg), float(req.plant_population)
+    )
+
+def result_row(req: SimulationRequest, summary: Dict[str, Any]) -> Dict[str, Any]:
+    """dssatresult insert parameters for one DSSAT summary."""
+    soil_id, weather_key, cultivar, planting, fert, pop = result_key(req)
+    return {
+        "soil_id": soil_id, "weather_hash": weather_key, "cultivar_code": cultivar,
+        "planting_date": planting, "fertilizer_n_kg": fert, "plant_population": pop,
+        "yield_kg_ha": summary.get('harwt'), "biomass_kg_ha": summary.get('topwt'),
+        "flowering_dap": summary.get('flo'), "maturity_dap": summary.get('mat'),
+        "season_rain_mm": summary.get('rain'), "season_et_mm": summary.get('cet'),
+        "summary": summary
+    }
+
+_KEY_COLUMNS = [
+    models.DSSATResult.soil_id, models.DSSATResult.weather_hash, models.DSSATResult.cultivar_code,
+    models.DSSATResult.planting_date, models.DSSATResult.fertilizer_n_kg, models.DSSATResult.plant_population
+]
+_RESULT_COLUMNS = [
+    models.DSSATResult.yield_kg_ha, models.DSSATResult.biomass_kg_ha, models.DSSATResult.flowering_dap,
+    models.DSSATResult.maturity_dap, models.DSSATResult.season_rain_mm, models.DSSATResult.season_et_mm
+]
+
+def _row_key(row: Any) -> Tuple[str, str, str, date, float, float]:
+    return (row.soil_id, row.weather_hash, row.cultivar_code, row.planting_date,
+            float(row.fertilizer_n_kg), float(row.plant_population))
+
+def _row_result(row: Any) -> Dict[str, Any]:
+    return {
+        "yield_kg_ha": row.yield_kg_ha, "biomass_kg_ha": row.biomass_kg_ha,
+        "flowering_dap": row.flowering_dap, "maturity_dap": row.maturity_dap,
+        "season_rain_mm": row.season_rain_mm, "season_et_mm": row.season_et_mm
+    }
+
+class SimulationStore:
+    """
+    In-memory copy of dssatresult, loaded at startup and refreshed from rows
+    created past the last watermark, so predictions never query the table.
+    `version` bumps whenever results arrive; caches of ensembles key on it.
+    """
+    def __init__(self, refresh_s: float):
+        self.refresh_s = refresh_s
+        self._results: Dict[Hashable, Dict[str, Any]] = {}
+        self._watermark: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.last_refresh: Optional[datetime] = None
+
+    def refresh(self):
+        with self._refresh_lock:
+            db = SessionLocal()
+            try:
+                query = db.query(*_KEY_COLUMNS, *_RESULT_COLUMNS, models.DSSATResult.created_at)
+                if self._watermark is not None:
+                    query = query.filter(models.DSSATResult.created_at > self._watermark - SIMULATION_LOOKBACK)
+                rows = query.all()
+            finally:
+                db.close()
+
+            changed, watermark = 0, self._watermark
+            with self._lock:
+                for row in rows:
+                    key, result = _row_key(row), _row_result(row)
+                    if self._results.get(key) != result:
+                        self._results[key] = result
+                        changed += 1
+                    if row.created_at is not None and (watermark is None or row.created_at > watermark):
+                        watermark = row.created_at
+                self._watermark = watermark
+                if changed:
+                    self.version += 1
+            self.last_refresh = datetime.utcnow()
+            if changed:
+                logger.info(f"DSSAT results refreshed: {changed} new or re-run, {len(self._results)} total.")
+
+    def get_many(self, requests: Sequence[Optional[SimulationRequest]]) -> List[Optional[Dict[str, Any]]]:
+        """Stored result per request, None where not simulated (or the request is None). Memory only."""
+        with self._lock:
+            found = [self._results.get(result_key(r)) if r is not None else None for r in requests]
+            hits = sum(1 for f in found if f is not None)
+            self.hits += hits
+            self.misses += len(found) - hits
+        return found
+
+    def get(self, request: Optional[SimulationRequest]) -> Optional[Dict[str, Any]]:
+        return self.get_many([request])[0]
+
+    def put_many(self, rows: List[Dict[str, Any]]) -> int:
+        """Upserts result_row() dicts; a re-run of the same key replaces the summary."""
+        if not rows:
+            return 0
+        stmt = insert(models.DSSATResult).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            constraint='pk_dssatresult',
+            set_={c: stmt.excluded[c] for c in (
+                'yield_kg_ha', 'biomass_kg_ha', 'flowering_dap', 'maturity_dap',
+                'season_rain_mm', 'season_et_mm', 'summary', 'created_at'
+            )}
+        )
+        db = SessionLocal()
+        try:
+            db.execute(stmt)
+            db.commit()
+        finally:
+            db.close()
+        return len(rows)
+
+    def existing_keys(self, requests: Sequence[SimulationRequest]) -> set:
+        keys = list({result_key(r) for r in requests})
+        present = set()
+        db = SessionLocal()
+        try:
+            for start in range(0, len(keys), 1000):
+                chunk = keys[start:start + 1000]
+                rows = db.query(*_KEY_COLUMNS).filter(tuple_(*_KEY_COLUMNS).in_(chunk)).all()
+                present.update((r[0], r[1], r[2], r[3], float(r[4]), float(r[5])) for r in rows)
+        finally:
+            db.close()
+        return present
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_s):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"DSSAT result refresh failed: {e}")
+
+    def start(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"DSSAT result initial load failed, ensemble uses the stress model: {e}")
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="dssat-results-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._results),
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "watermark": self._watermark.isoformat() if self._watermark else None,
+                "last_refresh": self.last_refresh.isoformat() if self.last_refresh else None
+            }
+
+simulation_store = SimulationStore(SIMULATION_REFRESH_S)
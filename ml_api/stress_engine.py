@@ -0,0 +1,104 @@
+"""
+Vectorized DSSAT v3 stress engine.
+
+Water and heat stress, attainable yield and the primary limiting factor
+of the DSSAT v3 stress model: stress_point is the scalar form behind
+run_dssat_v3_sim in prediction.py, stress_grid the array form for whole
+precip/temp grids (e.g. every pixel of a predictor-stack window) in one
+pass. tests/test_stress_engine.py checks that the two agree.
+
+    python stress_engine.py
+
+benchmarks a 4096x4096 window.
+"""
+import time
+import argparse
+from typing import Optional, Tuple
+
+import numpy as np
+
+BASE_POTENTIAL = 3.8          # attainable yield with no stress
+WATER_OPTIMUM_MM = 4.5        # precip_mean at which water stress vanishes
+HEAT_THRESHOLD_C = 28.0       # temp_mean above which heat stress starts
+HEAT_SLOPE = 0.1              # stress per degree above the threshold
+LIMITING_STRESS = 0.85        # a factor only "limits" below this
+
+# Limiting-factor codes (uint8 rasters); labels match run_dssat_v3_sim
+LF_OPTIMAL = 0
+LF_WATER = 1
+LF_THERMAL = 2
+LF_NODATA = 255
+LIMITING_FACTOR_LABELS = {
+    LF_OPTIMAL: "None (Optimal)",
+    LF_WATER: "Water Deficit",
+    LF_THERMAL: "Thermal Stress",
+    LF_NODATA: "No Data",
+}
+
+def stress_point(precip: float, temp: float) -> Tuple[float, str]:
+    """(attainable yield, limiting-factor label) for one precip/temp pair."""
+    water_stress = min(1.0, precip / WATER_OPTIMUM_MM)
+    heat_stress = 1.0 - max(0, (temp - HEAT_THRESHOLD_C) * HEAT_SLOPE)
+
+    limiting_factor = LIMITING_FACTOR_LABELS[LF_OPTIMAL]
+    if water_stress < heat_stress and water_stress < LIMITING_STRESS:
+        limiting_factor = LIMITING_FACTOR_LABELS[LF_WATER]
+    elif heat_stress < water_stress and heat_stress < LIMITING_STRESS:
+        limiting_factor = LIMITING_FACTOR_LABELS[LF_THERMAL]
+    return float(BASE_POTENTIAL * water_stress * heat_stress), limiting_factor
+
+def stress_grid(
+    precip: np.ndarray,
+    temp: np.ndarray,
+    nodata: Optional[float] = None,
+    dtype: str = 'float64',
+    yield_nodata: float = np.nan
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Attainable yield and limiting-factor code for same-shaped precip/temp
+    arrays of any dimensionality. Pixels that are NaN or equal to `nodata`
+    in either input get `yield_nodata` and LF_NODATA. Use dtype='float32'
+    for large windows.
+    """
+    precip = np.asarray(precip, dtype=dtype)
+    temp = np.asarray(temp, dtype=dtype)
+    if precip.shape != temp.shape:
+        raise ValueError(f"precip {precip.shape} and temp {temp.shape} must have the same shape")
+
+    invalid = np.isnan(precip) | np.isnan(temp)
+    if nodata is not None:
+        invalid |= (precip == nodata) | (temp == nodata)
+
+    water_stress = np.minimum(1.0, precip / WATER_OPTIMUM_MM)
+    heat_stress = 1.0 - np.maximum(0, (temp - HEAT_THRESHOLD_C) * HEAT_SLOPE)
+
+    codes = np.full(precip.shape, LF_OPTIMAL, dtype='uint8')
+    codes[(water_stress < heat_stress) & (water_stress < LIMITING_STRESS)] = LF_WATER
+    codes[(heat_stress < water_stress) & (heat_stress < LIMITING_STRESS)] = LF_THERMAL
+    codes[invalid] = LF_NODATA
+
+    yields = (BASE_POTENTIAL * water_stress * heat_stress).astype(dtype, copy=False)
+    yields[invalid] = yield_nodata
+    return yields, codes
+
+def limiting_factor_labels(codes: np.ndarray) -> np.ndarray:
+    """Code array -> object array of the human-readable labels."""
+    lookup = np.empty(256, dtype=object)
+    lookup[:] = "Simulation Error"
+    for code, label in LIMITING_FACTOR_LABELS.items():
+        lookup[code] = label
+    return lookup[codes]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark stress_grid on one large window.")
+    parser.add_argument('--size', type=int, default=4096)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    grid = np.random.default_rng(args.seed).uniform(0.0, 12.0, (args.size, args.size)).astype('float32')
+    started = time.perf_counter()
+    stress_grid(grid, grid + 18.0, dtype='float32')
+    print(f"{args.size}x{args.size} float32 window: {time.perf_counter() - started:.2f}s")
+
+if __name__ == "__main__":
+    main()
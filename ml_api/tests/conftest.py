@@ -0,0 +1,5 @@
+import os
+import sys
+
+# ml_api modules import each other as top-level modules (see Dockerfile WORKDIR)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from compiled_model import CompiledForest, _sample_rows
+from model_registry import RF_COLUMNS
+from train import FEATURE_NAMES, build_pipeline
+
+@pytest.fixture(scope="module")
+def pipeline():
+    X = _sample_rows(400, RF_COLUMNS, seed=1)
+    X[:, RF_COLUMNS.index('soil_texture')] = np.random.default_rng(1).integers(1, 6, len(X))
+    frame = pd.DataFrame(X, columns=RF_COLUMNS)
+    y = 2.0 + 3.0 * np.nan_to_num(frame['ndvi_mean']) + 0.1 * np.nan_to_num(frame['precip_mean'])
+    pipe = build_pipeline().set_params(reg__n_estimators=20)
+    return pipe.fit(frame[FEATURE_NAMES], y)
+
+def test_matches_sklearn(pipeline):
+    engine = CompiledForest.from_pipeline(pipeline, RF_COLUMNS)
+    # Includes NaNs and soil classes the encoder never saw
+    X = _sample_rows(2000, RF_COLUMNS, seed=2)
+    expected = pipeline.predict(pd.DataFrame(X, columns=RF_COLUMNS))
+    assert np.max(np.abs(engine.predict(X) - expected)) == pytest.approx(0.0, abs=1e-9)
+
+def test_single_row_and_roundtrip(pipeline, tmp_path):
+    engine = CompiledForest.from_pipeline(pipeline, RF_COLUMNS)
+    path = str(tmp_path / "compiled.joblib")
+    engine.save(path)
+    loaded = CompiledForest.load(path, mmap_mode='r')
+    row = _sample_rows(1, RF_COLUMNS, seed=3)[0]
+    expected = float(pipeline.predict(pd.DataFrame([row], columns=RF_COLUMNS))[0])
+    assert loaded.predict_one(row) == pytest.approx(expected, abs=1e-9)
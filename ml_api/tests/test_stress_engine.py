@@ -0,0 +1,28 @@
+import numpy as np
+
+from stress_engine import (
+    stress_grid, stress_point, limiting_factor_labels,
+    WATER_OPTIMUM_MM, HEAT_THRESHOLD_C, LIMITING_STRESS, LF_NODATA, LF_OPTIMAL
+)
+
+def _cases(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    precip = rng.uniform(0.0, 12.0, n)
+    temp = rng.uniform(10.0, 40.0, n)
+    # Branch edges: stress exactly at the limit, ties between the two stresses, the heat threshold
+    edges_p = np.array([0.0, WATER_OPTIMUM_MM * LIMITING_STRESS, WATER_OPTIMUM_MM, 4.5 * 0.9, 3.0, 9.0])
+    edges_t = np.array([HEAT_THRESHOLD_C, 29.5, 28.0, 29.0, 31.0, 45.0])
+    return np.concatenate([precip, edges_p]), np.concatenate([temp, edges_t])
+
+def test_grid_matches_scalar_engine():
+    precip, temp = _cases(20000)
+    yields, codes = stress_grid(precip.reshape(-1, 1), temp.reshape(-1, 1))
+    labels = limiting_factor_labels(codes).ravel()
+    expected = [stress_point(float(p), float(t)) for p, t in zip(precip, temp)]
+    assert np.array_equal(yields.ravel(), np.array([y for y, _ in expected]))
+    assert list(labels) == [label for _, label in expected]
+
+def test_nodata_pixels():
+    yields, codes = stress_grid(np.array([np.nan, -9999.0, 5.0]), np.array([20.0, 20.0, 20.0]), nodata=-9999.0)
+    assert np.isnan(yields[:2]).all()
+    assert (codes[:2] == LF_NODATA).all() and codes[2] == LF_OPTIMAL
@@ -0,0 +1,159 @@
+import os
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple, NamedTuple
+
+import numpy as np
+import shapely
+from shapely.strtree import STRtree
+from sqlalchemy import func
+
+from shared.database.base import SessionLocal
+from shared.database import models
+
+logger = logging.getLogger(__name__)
+
+WARD_INDEX_REFRESH_S = float(os.getenv("WARD_INDEX_REFRESH_S", "60"))
+# Re-read rows touched slightly before the watermark so commits that
+# landed out of timestamp order are never missed (upserts are idempotent).
+WARD_INDEX_LOOKBACK = timedelta(seconds=float(os.getenv("WARD_INDEX_LOOKBACK_S", "300")))
+
+class WardRecord(NamedTuple):
+    """The auxiliarydata attributes the prediction path reads."""
+    id: int
+    ward_id: Optional[str]
+    ward_name: str
+    county_name: Optional[str]
+    year: int
+    elevation_m: Optional[float]
+    soil_texture: Optional[float]
+    # Season means and centroid latitude: the inputs of the ward's stored DSSAT simulation
+    precip_mean: Optional[float]
+    temp_mean: Optional[float]
+    centroid_lat: Optional[float]
+
+class _Snapshot:
+    """Immutable STRtree over prepared ward polygons, one entry per (ward, year) row."""
+    def __init__(self, rows: Dict[int, Tuple[WardRecord, Any, Optional[datetime]]]):
+        self.rows = rows
+        self.records: List[WardRecord] = [rec for rec, _, _ in rows.values()]
+        geoms = np.array([geom for _, geom, _ in rows.values()], dtype=object)
+        shapely.prepare(geoms)
+        self.tree = STRtree(geoms)
+
+    def lookup_many(self, coords: List[Tuple[float, float, int]]) -> List[Optional[WardRecord]]:
+        """
+        Same semantics as the PostGIS lookup: the containing ward for the
+        requested year, else the most recent year containing the point.
+        """
+        matched: List[Optional[WardRecord]] = [None] * len(coords)
+        if not coords or not self.records:
+            return matched
+        pts = shapely.points([c[0] for c in coords], [c[1] for c in coords])
+        point_idx, tree_idx = self.tree.query(pts, predicate='within')
+        for p, t in zip(point_idx.tolist(), tree_idx.tolist()):
+            rec, target_year, best = self.records[t], coords[p][2], matched[p]
+            if best is None or (best.year != target_year and (rec.year == target_year or rec.year > best.year)):
+                matched[p] = rec
+        return matched
+
+class WardIndex:
+    """
+    In-memory replacement for the per-request ST_Contains queries against
+    auxiliarydata. Loaded at startup, then refreshed incrementally from
+    rows whose updated_at moved past the last watermark.
+    """
+    def __init__(self, refresh_s: float):
+        self.refresh_s = refresh_s
+        self._snapshot: Optional[_Snapshot] = None
+        self._watermark: Optional[datetime] = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.refreshes = 0
+        self.last_refresh: Optional[datetime] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def version(self) -> int:
+        """Bumps on every rebuild; caches derived from ward data key on it."""
+        return self.refreshes
+
+    def refresh(self):
+        with self._refresh_lock:
+            db = SessionLocal()
+            try:
+                query = db.query(
+                    models.AuxiliaryData.id, models.AuxiliaryData.ward_id, models.AuxiliaryData.ward_name,
+                    models.AuxiliaryData.county_name, models.AuxiliaryData.year,
+                    models.AuxiliaryData.elevation_m, models.AuxiliaryData.soil_texture,
+                    models.AuxiliaryData.precip_mean, models.AuxiliaryData.temp_mean,
+                    func.ST_Y(func.ST_Centroid(models.AuxiliaryData.geom)),
+                    models.AuxiliaryData.updated_at, func.ST_AsBinary(models.AuxiliaryData.geom)
+                ).filter(models.AuxiliaryData.geom.isnot(None))
+                if self._watermark is not None:
+                    query = query.filter(models.AuxiliaryData.updated_at > self._watermark - WARD_INDEX_LOOKBACK)
+                changed = query.all()
+            finally:
+                db.close()
+
+            rows = dict(self._snapshot.rows) if self._snapshot is not None else {}
+            fresh = [r for r in changed if r[0] not in rows or rows[r[0]][2] != r[10]]
+            if self._snapshot is not None and not fresh:
+                return
+
+            watermark = self._watermark
+            for r in fresh:
+                rows[r[0]] = (WardRecord(*r[:10]), shapely.from_wkb(bytes(r[11])), r[10])
+                if r[10] is not None and (watermark is None or r[10] > watermark):
+                    watermark = r[10]
+
+            self._snapshot = _Snapshot(rows)
+            self._watermark = watermark
+            self.refreshes += 1
+            self.last_refresh = datetime.utcnow()
+            logger.info(f"Ward index refreshed: {len(fresh)} changed rows, {len(rows)} total.")
+
+    def lookup(self, lon: float, lat: float, year: int) -> Optional[WardRecord]:
+        return self.lookup_many([(lon, lat, year)])[0]
+
+    def lookup_many(self, coords: List[Tuple[float, float, int]]) -> List[Optional[WardRecord]]:
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise RuntimeError("Ward index not loaded")
+        return snapshot.lookup_many(coords)
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_s):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Ward index refresh failed: {e}")
+
+    def start(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Ward index initial load failed, falling back to PostGIS: {e}")
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ward-index-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "ready": snapshot is not None,
+            "rows": len(snapshot.records) if snapshot is not None else 0,
+            "refreshes": self.refreshes,
+            "watermark": self._watermark.isoformat() if self._watermark else None,
+            "last_refresh": self.last_refresh.isoformat() if self.last_refresh else None
+        }
+
+ward_index = WardIndex(WARD_INDEX_REFRESH_S)
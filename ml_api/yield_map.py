@@ -0,0 +1,257 @@
+"""
+Wall-to-wall yield map generation.
+
+Reads an ingested PredictorStack COG in block-aligned windows, runs the RF
+model and the vectorized DSSAT stress engine on every pixel, writes a
+two-band COG (ensemble yield, limiting-factor code), uploads it to MinIO
+and catalogs it as a 'YieldMap' RasterAsset covering the same extent.
+
+    python yield_map.py --asset-id 12 [--year 2024] [--workers 4]
+    python yield_map.py --latest
+"""
+import os
+import time
+import logging
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import rasterio
+import rasterio.shutil
+from rasterio.windows import Window
+import boto3
+from botocore.config import Config
+from boto3.s3.transfer import TransferConfig
+
+from shared.database.base import SessionLocal
+from shared.database import models
+from model_registry import model_registry, LoadedModel, RF_COLUMNS
+from stress_engine import stress_grid
+
+logger = logging.getLogger(__name__)
+
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minio_user")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minio_password")
+S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "dss-cogs")
+
+YIELD_MAP_ASSET_TYPE = "YieldMap"
+YIELD_MAP_BANDS = ["yield", "limiting_factor"]
+YIELD_MAP_WORKERS = int(os.getenv("YIELD_MAP_WORKERS", str(os.cpu_count() or 2)))
+# Memory the workers' model copies may take together; caps the worker count
+YIELD_MAP_MEMORY_MB = int(os.getenv("YIELD_MAP_MEMORY_MB", "4096"))
+# Unpickled RF size relative to its joblib file
+MODEL_MEMORY_FACTOR = 1.5
+# Windows are one block row high and this many columns wide
+YIELD_MAP_STRIP_COLS = int(os.getenv("YIELD_MAP_STRIP_COLS", "2048"))
+YIELD_NODATA = -9999.0
+BLOCK_SIZE = 256
+OVERVIEW_COUNT = 4  # 2x .. 16x
+
+# Predictor stack band order written by the GEE extractor (matches geo_api BAND_NAMES)
+STACK_BANDS = ['ndvi_mean', 'precip_mean', 'et_mean', 'elevation_mean', 'soil_texture', 'temp_mean']
+
+# Per-worker state, set by _init_worker
+_src: Any = None
+_model: Optional[LoadedModel] = None
+_band_index: Dict[str, int] = {}
+_year = 0
+
+def stack_band_index(bands: Optional[List[str]]) -> Dict[str, int]:
+    """1-based band index per feature, from the cataloged band names when they match."""
+    names = list(bands or [])
+    if all(name in names for name in STACK_BANDS):
+        return {name: names.index(name) + 1 for name in STACK_BANDS}
+    return {name: i + 1 for i, name in enumerate(STACK_BANDS)}
+
+def _init_worker(asset_url: str, model_version: Optional[str], band_index: Dict[str, int], year: int):
+    global _src, _model, _band_index, _year
+    _src = rasterio.open(asset_url)
+    # predict_block uses the sklearn pipeline, so every worker holds its own copy
+    _model = model_registry.load_version(model_version) if model_version else None
+    _band_index, _year = band_index, year
+
+def predict_block(bands: Dict[str, np.ndarray], nodata: Optional[float], model: Optional[LoadedModel], year: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Yield and limiting-factor code for one window of stack bands, same
+    ensemble as /predict: mean of RF and DSSAT where DSSAT is positive.
+    """
+    shape = bands['ndvi_mean'].shape
+    valid = np.ones(shape, dtype=bool)
+    for arr in bands.values():
+        valid &= ~np.isnan(arr)
+        if nodata is not None:
+            valid &= arr != nodata
+
+    dssat, codes = stress_grid(bands['precip_mean'], bands['temp_mean'], nodata=nodata)
+
+    rf = np.zeros(shape, dtype='float64')
+    if model is not None and valid.any():
+        columns = {name: bands[name][valid] for name in STACK_BANDS}
+        columns['year'] = np.full(int(valid.sum()), year, dtype='float64')
+        matrix = np.column_stack([columns[c] for c in RF_COLUMNS]).astype('float64')
+        rf[valid] = model.pipeline.predict(pd.DataFrame(matrix, columns=RF_COLUMNS))
+
+    ensemble = np.where(dssat > 0, (rf + dssat) / 2, rf)
+    out_yield = np.where(valid, ensemble, YIELD_NODATA).astype('float32')
+    # The band shares the dataset nodata; LF_NODATA would read as a valid code
+    codes = np.where(valid, codes, YIELD_NODATA).astype('float32')
+    return out_yield, codes
+
+def worker_count(requested: int, model: Optional[LoadedModel]) -> int:
+    """Requested workers, capped so the per-worker pipeline copies fit YIELD_MAP_MEMORY_MB."""
+    if model is None or not os.path.exists(model.pipeline_path):
+        return max(1, requested)
+    per_worker_mb = os.path.getsize(model.pipeline_path) * MODEL_MEMORY_FACTOR / 2**20
+    return max(1, min(requested, int(YIELD_MAP_MEMORY_MB // max(per_worker_mb, 1.0))))
+
+def _process_window(window: Window) -> Tuple[Window, np.ndarray, np.ndarray]:
+    bands = {
+        name: _src.read(idx, window=window).astype('float64')
+        for name, idx in _band_index.items()
+    }
+    out_yield, codes = predict_block(bands, _src.nodata, _model, _year)
+    return window, out_yield, codes
+
+def _windows(width: int, height: int) -> Iterator[Window]:
+    strip_cols = max(BLOCK_SIZE, YIELD_MAP_STRIP_COLS // BLOCK_SIZE * BLOCK_SIZE)
+    for row_off in range(0, height, BLOCK_SIZE):
+        for col_off in range(0, width, strip_cols):
+            yield Window(col_off, row_off, min(strip_cols, width - col_off), min(BLOCK_SIZE, height - row_off))
+
+def _output_profile(src: Any) -> Dict[str, Any]:
+    """Tiled GTiff the windows are written into before the COG copy."""
+    profile = src.profile.copy()
+    profile.update(
+        driver='GTiff', count=len(YIELD_MAP_BANDS), dtype='float32', nodata=YIELD_NODATA,
+        tiled=True, blockxsize=BLOCK_SIZE, blockysize=BLOCK_SIZE,
+        compress='DEFLATE', predictor=3, interleave='pixel', bigtiff='IF_SAFER', num_threads='ALL_CPUS'
+    )
+    return profile
+
+def render_yield_map(asset_url: str, bands: Optional[List[str]], year: int, out_path: str,
+                     model_version: Optional[str], workers: int) -> int:
+    """Writes the yield COG for one stack to out_path; returns the number of windows processed."""
+    band_index = stack_band_index(bands)
+    with rasterio.open(asset_url) as src:
+        profile = _output_profile(src)
+        windows = list(_windows(src.width, src.height))
+
+    raw_path = f"{out_path}.raw.tif"
+    try:
+        done = _render_windows(asset_url, band_index, year, raw_path, profile, windows, model_version, workers)
+        _write_cog(raw_path, out_path)
+    finally:
+        if os.path.exists(raw_path): os.remove(raw_path)
+    return done
+
+def _render_windows(asset_url: str, band_index: Dict[str, int], year: int, raw_path: str, profile: Dict[str, Any],
+                    windows: List[Window], model_version: Optional[str], workers: int) -> int:
+    done = 0
+    with rasterio.open(raw_path, 'w', **profile) as dst, ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(asset_url, model_version, band_index, year)
+    ) as pool:
+        for window, out_yield, codes in pool.map(_process_window, windows):
+            # Both bands in one call: pixel-interleaved blocks are written whole
+            dst.write(np.stack([out_yield, codes]), window=window)
+            done += 1
+            if done % 100 == 0:
+                logger.info(f"Yield map: {done}/{len(windows)} windows.")
+        for i, name in enumerate(YIELD_MAP_BANDS, start=1):
+            dst.set_band_description(i, name)
+    return done
+
+def _write_cog(raw_path: str, out_path: str):
+    """
+    COG driver copy: overviews and the tile index ahead of the full-resolution
+    tiles, so HTTP range reads (geo_api, COG viewers) find them in the header.
+    """
+    with rasterio.Env(GDAL_NUM_THREADS='ALL_CPUS'):
+        rasterio.shutil.copy(
+            raw_path, out_path, driver='COG', blocksize=BLOCK_SIZE, compress='DEFLATE', predictor='YES',
+            # Nearest keeps limiting-factor codes categorical in the overviews
+            overview_resampling='NEAREST', overview_count=OVERVIEW_COUNT,
+            bigtiff='IF_SAFER', num_threads='ALL_CPUS'
+        )
+
+def _upload(path: str, object_name: str) -> str:
+    s3 = boto3.client(
+        's3', endpoint_url=MINIO_ENDPOINT,
+        aws_access_key_id=MINIO_ACCESS_KEY, aws_secret_access_key=MINIO_SECRET_KEY,
+        config=Config(signature_version='s3v4', max_pool_connections=8)
+    )
+    s3.upload_file(path, S3_BUCKET_NAME, object_name, Config=TransferConfig(max_concurrency=8))
+    return f"{MINIO_ENDPOINT}/{S3_BUCKET_NAME}/{object_name}"
+
+def generate_yield_map(asset_id: Optional[int] = None, year: Optional[int] = None,
+                       workers: int = YIELD_MAP_WORKERS) -> Tuple[str, int]:
+    """Full stage for one PredictorStack (default: the latest). Returns (asset_url, new asset id)."""
+    db = SessionLocal()
+    try:
+        query = db.query(models.RasterAsset).filter(models.RasterAsset.asset_type == 'PredictorStack')
+        stack = query.filter(models.RasterAsset.id == asset_id).first() if asset_id is not None \
+            else query.order_by(models.RasterAsset.datetime.desc()).first()
+        if stack is None:
+            raise ValueError(f"PredictorStack {asset_id if asset_id is not None else '(latest)'} not found")
+
+        model = model_registry.load_version()
+        model_version = model.version if model else None
+        if model_version is None:
+            logger.warning("No trained model available; yield map will hold DSSAT-only values.")
+        map_year = year or stack.datetime.year
+        capped = worker_count(workers, model)
+        if capped < workers:
+            logger.warning(f"Yield map: {capped} workers instead of {workers}; each holds a copy of model "
+                           f"{model_version} and YIELD_MAP_MEMORY_MB is {YIELD_MAP_MEMORY_MB}.")
+        workers = capped
+
+        started = time.perf_counter()
+        fd, out_path = tempfile.mkstemp(suffix="_yield.tif")
+        os.close(fd)
+        try:
+            windows = render_yield_map(str(stack.asset_url), stack.bands, map_year, out_path, model_version, workers)
+            logger.info(f"Yield map rendered: {windows} windows in {time.perf_counter() - started:.1f}s.")
+
+            stack_name = os.path.splitext(os.path.basename(str(stack.asset_url)))[0]
+            object_name = f"{YIELD_MAP_ASSET_TYPE}/{datetime.now().strftime('%Y%m%d')}_{stack_name}_{map_year}_yield.tif"
+            asset_url = _upload(out_path, object_name)
+        finally:
+            if os.path.exists(out_path): os.remove(out_path)
+
+        new_asset = models.RasterAsset(
+            asset_url=asset_url,
+            datetime=stack.datetime,
+            asset_type=YIELD_MAP_ASSET_TYPE,
+            bands=YIELD_MAP_BANDS,
+            bbox=stack.bbox
+        )
+        db.add(new_asset)
+        db.commit()
+        db.refresh(new_asset)
+        logger.info(f"Yield map from PredictorStack {stack.id} (model {model_version}) cataloged as RasterAsset {new_asset.id}: {asset_url}")
+        return asset_url, int(new_asset.id)
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a wall-to-wall yield COG from a PredictorStack.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--asset-id', type=int, help="RasterAsset id of the PredictorStack")
+    target.add_argument('--latest', action='store_true', help="Use the most recent PredictorStack")
+    parser.add_argument('--year', type=int, help="Season year fed to the model (default: stack year)")
+    parser.add_argument('--workers', type=int, default=YIELD_MAP_WORKERS)
+    args = parser.parse_args()
+    asset_url, asset_id = generate_yield_map(args.asset_id, args.year, args.workers)
+    print(f"{asset_id} {asset_url}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,85 @@
+from typing import Any, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# auxiliarydata columns summarised per (county, year)
+AGGREGATE_VARIABLES = ['ndvi', 'precip', 'temp', 'et']
+PERCENTILES = [0.1, 0.5, 0.9]
+
+def _stat_columns(var: str) -> List[str]:
+    return [f"{var}_mean", f"{var}_std", f"{var}_p10", f"{var}_p50", f"{var}_p90"]
+
+STAT_COLUMNS = [c for var in AGGREGATE_VARIABLES for c in _stat_columns(var)]
+
+def _stat_selects(var: str, labeled: bool = False) -> str:
+    src = f"a.{var}_mean"
+    pct = f"percentile_cont(ARRAY{PERCENTILES}) WITHIN GROUP (ORDER BY {src})"
+    exprs = [f"avg({src})", f"stddev_samp({src})", f"({pct})[1]", f"({pct})[2]", f"({pct})[3]"]
+    if labeled:
+        exprs = [f"{e} AS {c}" for e, c in zip(exprs, _stat_columns(var))]
+    return ", ".join(exprs)
+
+_REFRESH_SQL = text(f"""
+    WITH pairs AS (
+        SELECT DISTINCT county_name, year
+        FROM unnest(CAST(:counties AS VARCHAR[]), CAST(:years AS INTEGER[])) AS p(county_name, year)
+    ),
+    fresh AS (
+        SELECT a.county_name, a.year, count(*) AS ward_count,
+               {', '.join(_stat_selects(v) for v in AGGREGATE_VARIABLES)}
+        FROM auxiliarydata a
+        JOIN pairs p ON p.county_name = a.county_name AND p.year = a.year
+        GROUP BY a.county_name, a.year
+    ),
+    gone AS (
+        -- Pairs whose last ward moved away or was removed
+        DELETE FROM countyyearstats s USING pairs p
+        WHERE s.county_name = p.county_name AND s.year = p.year
+          AND NOT EXISTS (SELECT 1 FROM fresh f WHERE f.county_name = p.county_name AND f.year = p.year)
+    )
+    INSERT INTO countyyearstats (county_name, year, ward_count, {', '.join(STAT_COLUMNS)}, updated_at)
+    SELECT *, now() FROM fresh
+    ON CONFLICT (county_name, year) DO UPDATE SET
+        ward_count = EXCLUDED.ward_count,
+        {', '.join(f"{c} = EXCLUDED.{c}" for c in STAT_COLUMNS)},
+        updated_at = now()
+""")
+
+def refresh_county_year_stats(db: Session, pairs: Iterable[Tuple[Optional[str], int]]) -> int:
+    """
+    Recomputes the countyyearstats rows for the given (county, year) pairs
+    from auxiliarydata, inside the caller's transaction. Returns the number
+    of pairs refreshed.
+    """
+    unique = {(c, int(y)) for c, y in pairs if c is not None and y is not None}
+    if not unique:
+        return 0
+    counties, years = zip(*sorted(unique))
+    db.execute(_REFRESH_SQL, {"counties": list(counties), "years": list(years)})
+    return len(unique)
+
+_MISSING_PAIRS_SQL = text("""
+    SELECT DISTINCT a.county_name, a.year
+    FROM auxiliarydata a
+    LEFT JOIN countyyearstats s ON s.county_name = a.county_name AND s.year = a.year
+    WHERE s.county_name IS NULL AND a.county_name IS NOT NULL
+""")
+
+def backfill_county_year_stats(db: Session) -> int:
+    """
+    Computes the rows missing for any (county, year) in auxiliarydata, e.g.
+    data loaded before countyyearstats existed. Caller commits.
+    """
+    return refresh_county_year_stats(db, [tuple(r) for r in db.execute(_MISSING_PAIRS_SQL).fetchall()])
+
+_LIVE_SQL = text(f"""
+    SELECT count(*) AS ward_count, {', '.join(_stat_selects(v, labeled=True) for v in AGGREGATE_VARIABLES)}
+    FROM auxiliarydata a
+    WHERE a.county_name = :county_name AND a.year = :year
+""")
+
+def live_county_year_stats(db: Session, county_name: Optional[str], year: int) -> Optional[Any]:
+    """Read-only equivalent of one countyyearstats row, computed from auxiliarydata."""
+    row = db.execute(_LIVE_SQL, {"county_name": county_name, "year": int(year)}).first()
+    return row if row is not None and row.ward_count else None
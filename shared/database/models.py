@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Date, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, Date, JSON, Text, UniqueConstraint, PrimaryKeyConstraint, func
 from shared.database.base import Base
 from geoalchemy2 import Geometry
 
@@ -51,6 +51,8 @@ class AuxiliaryData(Base):
     RECALIBRATED: Now includes 'year' to support multi-temporal analysis.
     """
     __tablename__ = "auxiliarydata"
+    # Upsert key for DIS ward statistics
+    __table_args__ = (UniqueConstraint('ward_id', 'year', name='uq_auxiliary_ward_year'),)
     id = Column(Integer, primary_key=True, index=True)
     ward_name = Column(String(100), nullable=False)
     ward_id = Column(String(50))
@@ -65,4 +67,95 @@ class AuxiliaryData(Base):
     elevation_m = Column(Float)
     soil_texture = Column(Float)
     
-    geom = Column(Geometry(geometry_type='MULTIPOLYGON', srid=SRID), nullable=False)
\ No newline at end of file
+    geom = Column(Geometry(geometry_type='MULTIPOLYGON', srid=SRID), nullable=False)
+
+    # Change watermark for consumers that refresh incrementally (ml_api ward index)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+
+class IngestJob(Base):
+    """
+    Background raster ingestion jobs run by the DIS process pool.
+    Persisted so progress survives the request and can be polled.
+    """
+    __tablename__ = "ingestjob"
+    id = Column(String(36), primary_key=True)
+    status = Column(String(20), nullable=False, default="queued", index=True) # queued | running | succeeded | failed
+    stage = Column(String(50))
+    progress = Column(Float, nullable=False, default=0.0)
+    filename = Column(String(255))
+    job_metadata = Column(JSON)
+    asset_id = Column(Integer)
+    asset_url = Column(String(512))
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class CountyYearStats(Base):
+    """
+    Per (county, year) distribution of the ward biophysical means, kept in
+    sync by DIS on every ward upsert. Baseline for ward anomaly stats.
+    """
+    __tablename__ = "countyyearstats"
+    county_name = Column(String(100), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    ward_count = Column(Integer, nullable=False, default=0)
+
+    ndvi_mean = Column(Float)
+    ndvi_std = Column(Float)
+    ndvi_p10 = Column(Float)
+    ndvi_p50 = Column(Float)
+    ndvi_p90 = Column(Float)
+    precip_mean = Column(Float)
+    precip_std = Column(Float)
+    precip_p10 = Column(Float)
+    precip_p50 = Column(Float)
+    precip_p90 = Column(Float)
+    temp_mean = Column(Float)
+    temp_std = Column(Float)
+    temp_p10 = Column(Float)
+    temp_p50 = Column(Float)
+    temp_p90 = Column(Float)
+    et_mean = Column(Float)
+    et_std = Column(Float)
+    et_p10 = Column(Float)
+    et_p50 = Column(Float)
+    et_p90 = Column(Float)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class DataVersion(Base):
+    """
+    Monotonic per-dataset version, bumped by DIS in the same transaction as
+    each write. Readers key caches and ETags on it instead of rescanning tables.
+    """
+    __tablename__ = "dataversion"
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class DSSATResult(Base):
+    """
+    Memoized DSSAT simulation summaries. A run is a pure function of the
+    soil profile, the weather series and the management, so the key is
+    exactly those; ml_api reads the yield from here instead of re-simulating.
+    """
+    __tablename__ = "dssatresult"
+    __table_args__ = (PrimaryKeyConstraint(
+        'soil_id', 'weather_hash', 'cultivar_code', 'planting_date', 'fertilizer_n_kg', 'plant_population',
+        name='pk_dssatresult'
+    ),)
+    soil_id = Column(String(10), nullable=False)
+    weather_hash = Column(String(16), nullable=False)
+    cultivar_code = Column(String(6), nullable=False)
+    planting_date = Column(Date, nullable=False)
+    fertilizer_n_kg = Column(Float, nullable=False)
+    plant_population = Column(Float, nullable=False)
+
+    yield_kg_ha = Column(Float)       # HWAM
+    biomass_kg_ha = Column(Float)     # CWAM
+    flowering_dap = Column(Integer)
+    maturity_dap = Column(Integer)
+    season_rain_mm = Column(Float)
+    season_et_mm = Column(Float)
+    summary = Column(JSON)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -0,0 +1,22 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from shared.database.models import DataVersion
+
+# Dataset names
+AUXILIARY_DATA = "auxiliarydata"
+
+BUMP_SQL = text("""
+    INSERT INTO dataversion (name, version, updated_at) VALUES (:name, 1, now())
+    ON CONFLICT (name) DO UPDATE SET version = dataversion.version + 1, updated_at = now()
+    RETURNING version
+""")
+
+def bump_version(db: Session, name: str) -> int:
+    """Increments the dataset version inside the caller's transaction (visible on commit)."""
+    return int(db.execute(BUMP_SQL, {"name": name}).scalar())
+
+def get_version(db: Session, name: str) -> int:
+    """Current dataset version; 0 until the first ingestion. One primary-key lookup."""
+    version = db.query(DataVersion.version).filter(DataVersion.name == name).scalar()
+    return int(version or 0)
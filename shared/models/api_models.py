@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import date, datetime
 
 # --- General Models ---
 
@@ -18,6 +18,10 @@ class QueryPointRequest(BaseModel):
     point: Point
     date_range: DateRange
 
+class QueryPointsRequest(BaseModel):
+    points: List[Point] = Field(..., description="Farm points to query in a single pass.")
+    date_range: DateRange
+
 class Feature(BaseModel):
     name: str
     value: float
@@ -33,15 +37,52 @@ class QueryPointResponse(BaseModel):
 
 # --- ml_api Models ---
 
+def check_management(features: Dict[str, Any]) -> Dict[str, Any]:
+    """Rejects management overrides the DSSAT lookup cannot parse, so clients get a 422 rather than a 500."""
+    planting = features.get('planting_date')
+    if planting:
+        try:
+            date.fromisoformat(str(planting))
+        except ValueError:
+            raise ValueError(f"planting_date must be YYYY-MM-DD, got {planting!r}")
+    for name in ('fertilizer_n_kg', 'plant_population'):
+        if name in features:
+            try:
+                float(features[name])
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} must be a number, got {features[name]!r}")
+    return features
+
 class PredictRequest(BaseModel):
     # Updated to use Dict[str, Any] for better Pylance support
     features: Dict[str, Any] = Field(..., description="Dictionary of features for prediction.")
 
+    @field_validator('features')
+    @classmethod
+    def _management(cls, features: Dict[str, Any]) -> Dict[str, Any]:
+        return check_management(features)
+
 class PredictResponse(BaseModel):
     predicted_yield: float
     # FIX: Added metadata field to support ISO-19157 traceability (RF vs DSSAT stats)
     metadata: Optional[Dict[str, Any]] = Field(None, description="Optional metadata about the prediction ensemble.")
 
+class PredictBatchRequest(BaseModel):
+    items: List[Dict[str, Any]] = Field(..., description="Feature dictionaries, one per point.")
+
+    @field_validator('items')
+    @classmethod
+    def _management(cls, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for i, features in enumerate(items):
+            try:
+                check_management(features)
+            except ValueError as e:
+                raise ValueError(f"items[{i}]: {e}")
+        return items
+
+class PredictBatchResponse(BaseModel):
+    predictions: List[PredictResponse]
+
 # --- DIS Models ---
 
 class IngestMetadata(BaseModel):
@@ -52,4 +93,15 @@ class IngestMetadata(BaseModel):
 class IngestResponse(BaseModel):
     message: str
     asset_url: str
-    asset_id: int
\ No newline at end of file
+    asset_id: int
+
+class IngestJobResponse(BaseModel):
+    job_id: str
+    status: str = Field(..., description="queued | running | succeeded | failed")
+    stage: Optional[str] = None
+    progress: float = Field(0.0, description="0.0 - 1.0")
+    asset_url: Optional[str] = None
+    asset_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
\ No newline at end of file
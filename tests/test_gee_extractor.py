@@ -0,0 +1,89 @@
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+import gee_stub
+import gee_extractor
+from gee_extractor import init_ee, make_shards, run_extraction, synthetic_wards, _transient
+
+@pytest.fixture
+def stub(monkeypatch):
+    """The offline client with no latency or random failures, and no backoff sleeps."""
+    monkeypatch.setattr(gee_stub, "LATENCY_S", 0.0)
+    monkeypatch.setattr(gee_stub, "PER_FEATURE_S", 0.0)
+    monkeypatch.setattr(gee_stub, "FAILURE_RATE", 0.0)
+    monkeypatch.setattr(gee_extractor.time, "sleep", lambda s: None)
+    init_ee(stub=True)
+    return gee_stub
+
+def _fail_first(monkeypatch, n: int, message: str):
+    """Makes the first n getInfo calls raise `message`; returns the call counter."""
+    get_info = gee_stub.FeatureCollection.getInfo
+    lock, state = threading.Lock(), {"calls": 0}
+
+    def flaky(self):
+        with lock:
+            state["calls"] += 1
+            fail = state["calls"] <= n
+        if fail:
+            raise gee_stub.EEException(message)
+        return get_info(self)
+
+    monkeypatch.setattr(gee_stub.FeatureCollection, "getInfo", flaky)
+    return state
+
+def test_checkpoints_every_shard(stub, tmp_path):
+    shards = make_shards(synthetic_wards(25), [2023, 2024], 10)
+    counts = run_extraction(shards, str(tmp_path), workers=4)
+
+    assert counts["extracted"] == len(shards) == 6
+    assert counts["failed"] == 0 and counts["rows"] == 50
+    for shard in shards:
+        df = pd.read_parquet(tmp_path / f"{shard.shard_id}.parquet")
+        assert list(df["ward_id"]) == [u.unit_id for u in shard.units]
+        assert (df["year"] == shard.year).all()
+        assert df[gee_extractor.MEAN_BANDS + gee_extractor.MODE_BANDS].notna().all().all()
+    assert not [p for p in os.listdir(tmp_path) if p.endswith(".tmp")]
+
+def test_rerun_skips_checkpointed_shards(stub, tmp_path):
+    shards = make_shards(synthetic_wards(25), [2024], 10)
+    run_extraction(shards, str(tmp_path), workers=2)
+    calls = stub.calls
+
+    counts = run_extraction(shards, str(tmp_path), workers=2)
+    assert counts["skipped"] == counts["shards"] == len(shards)
+    assert counts["extracted"] == 0
+    assert stub.calls == calls
+
+def test_retries_transient_errors(stub, tmp_path, monkeypatch):
+    state = _fail_first(monkeypatch, 3, "Too many concurrent aggregations.")
+    shards = make_shards(synthetic_wards(20), [2024], 10)
+    counts = run_extraction(shards, str(tmp_path), workers=1)
+
+    assert counts["retries"] == 3
+    assert counts["extracted"] == len(shards) and counts["failed"] == 0
+    assert state["calls"] == len(shards) + 3
+
+def test_does_not_retry_permanent_errors(stub, tmp_path, monkeypatch):
+    state = _fail_first(monkeypatch, 1, "Invalid GeoJSON geometry.")
+    shards = make_shards(synthetic_wards(20), [2024], 10)
+    counts = run_extraction(shards, str(tmp_path), workers=1)
+
+    assert counts["failed"] == 1 and counts["extracted"] == len(shards) - 1
+    assert counts["retries"] == 0
+    assert state["calls"] == len(shards)
+    assert len(list(tmp_path.glob("*.parquet"))) == len(shards) - 1
+
+@pytest.mark.parametrize("message, transient", [
+    ("Too many concurrent aggregations.", True),
+    ("Computation timed out.", True),
+    ("Quota exceeded: too many requests", True),
+    ("Service unavailable", True),
+    ("Failed to generate the image", False),
+    ("Cannot iterate over a null collection", False),
+    ("User memory limit exceeded.", False),
+])
+def test_transient_classification(message, transient):
+    assert _transient(gee_stub.EEException(message)) is transient